@@ -0,0 +1,179 @@
+"""
+Benchmark the visitor middleware, decorator and log writes.
+
+Usage:
+
+    python -m benchmarks.run [--iterations N] [--save FILE] [--compare FILE]
+
+Runs against a throwaway SQLite test database by default - set the
+VISITOR_BENCH_DATABASE_URL environment variable to run against PostgreSQL.
+
+Results are printed, and can be saved as a JSON baseline (--save). If a
+baseline is passed (--compare), any scenario whose median latency has
+regressed by more than --tolerance (default 20%) is flagged, and the
+script exits with a non-zero status.
+
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+django.setup()
+
+from django.contrib.auth.models import AnonymousUser  # noqa: E402
+from django.contrib.sessions.backends.signed_cookies import SessionStore  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.http import HttpRequest, HttpResponse  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from visitors.decorators import user_is_visitor  # noqa: E402
+from visitors.middleware import (  # noqa: E402
+    VisitorRequestMiddleware,
+    VisitorSessionMiddleware,
+)
+from visitors.models import Visitor, VisitorLog  # noqa: E402
+from visitors.settings import VISITOR_SESSION_KEY  # noqa: E402
+
+factory = RequestFactory()
+
+
+def view(request: HttpRequest) -> HttpResponse:
+    return HttpResponse("OK")
+
+
+decorated_view = user_is_visitor(view, scope="bench", log_visit=False)
+logged_view = user_is_visitor(view, scope="bench")
+middleware = VisitorRequestMiddleware(VisitorSessionMiddleware(view))
+
+
+def make_request(path: str = "/", visitor: Visitor | None = None) -> HttpRequest:
+    request = factory.get(path)
+    request.user = AnonymousUser()
+    request.session = SessionStore()
+    request.visitor = visitor
+    request.user.is_visitor = visitor is not None
+    return request
+
+
+def scenarios(visitor: Visitor) -> dict[str, Callable[[], object]]:
+    """Return the benchmark scenarios - each is a zero-arg callable."""
+    token_path = visitor.tokenise("/")
+
+    def session_request() -> HttpRequest:
+        request = make_request()
+        request.session[VISITOR_SESSION_KEY] = visitor.session_data
+        return request
+
+    return {
+        "middleware_anonymous": lambda: middleware(make_request()),
+        "middleware_token": lambda: middleware(make_request(token_path)),
+        "middleware_session": lambda: middleware(session_request()),
+        "view_undecorated": lambda: view(make_request(visitor=visitor)),
+        "view_decorated": lambda: decorated_view(make_request(visitor=visitor)),
+        "view_decorated_logged": lambda: logged_view(make_request(visitor=visitor)),
+        "create_log": lambda: VisitorLog.objects.create_log(
+            make_request(visitor=visitor), 200
+        ),
+    }
+
+
+def measure(func: Callable[[], object], iterations: int) -> dict[str, float]:
+    """Run func repeatedly and return throughput and latency percentiles."""
+    for _ in range(min(iterations // 10, 100)):  # warm up
+        func()
+    timings = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(timings, n=100)
+    return {
+        "iterations": iterations,
+        "requests_per_second": round(iterations / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 4),
+        "p90_ms": round(quantiles[89] * 1000, 4),
+        "p99_ms": round(quantiles[98] * 1000, 4),
+    }
+
+
+def run(iterations: int) -> dict:
+    visitor = Visitor.objects.create(email="bench@example.com", scope="bench")
+    results = {
+        name: measure(func, iterations) for name, func in scenarios(visitor).items()
+    }
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        },
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return a description of each scenario that has regressed."""
+    regressions = []
+    for name, result in results["results"].items():
+        if not (base := baseline["results"].get(name)):
+            continue
+        if result["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {result['p50_ms']}ms vs baseline {base['p50_ms']}ms"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--save", help="Save results as JSON to this file.")
+    parser.add_argument("--compare", help="Compare results to this JSON baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        results = run(args.iterations)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    for name, result in results["results"].items():
+        print(  # noqa: T201
+            f"{name:<24} {result['requests_per_second']:>10} req/s  "
+            f"p50={result['p50_ms']}ms p90={result['p90_ms']}ms "
+            f"p99={result['p99_ms']}ms"
+        )
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")  # noqa: T201
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 
 from visitors.models import Visitor
 
+pytest_plugins = ["visitors.pytest_plugin"]
+
 
 @pytest.fixture
 def visitor() -> Visitor:
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import datetime
+import uuid
+from unittest import mock
+
+import pytest
+from django.contrib.admin.sites import site
+from django.test import Client, RequestFactory
+from django.urls import reverse
+from django.utils.timezone import now as tz_now
+
+from visitors.admin import EstimatedCountPaginator, VisitorLogAdmin, VisitorsAdmin
+from visitors.models import Referer, UserAgent, Visitor, VisitorLog
+
+
+@pytest.mark.django_db
+class TestVisitorsAdmin:
+    def test_is_valid(self, rf: RequestFactory, visitor: Visitor) -> None:
+        Visitor.objects.create(
+            email="ginger@example.com",
+            expires_at=tz_now() - datetime.timedelta(days=1),
+        )
+        Visitor.objects.create(email="bob@example.com", is_active=False)
+        admin = VisitorsAdmin(Visitor, site)
+        qs = admin.get_queryset(rf.get("/")).order_by("id")
+        assert [admin._is_valid(v) for v in qs] == [True, False, False]
+        assert [v.is_valid for v in qs] == [True, False, False]
+
+    @pytest.mark.parametrize(
+        "search_term,count",
+        [
+            ("fred@example.com", 1),
+            ("FRED@example.com", 1),
+            ("fred@ex", 1),
+            ("ed@example.com", 0),
+            ("fre", 1),
+            ("Fred", 1),
+            ("foo", 1),
+            ("bar", 0),
+            ("fo", 1),
+            ("oo", 0),
+            ("f%", 0),
+            ("", 1),
+        ],
+    )
+    def test_search(
+        self, rf: RequestFactory, visitor: Visitor, search_term: str, count: int
+    ) -> None:
+        admin = VisitorsAdmin(Visitor, site)
+        qs, _ = admin.get_search_results(
+            rf.get("/"), Visitor.objects.all(), search_term
+        )
+        assert qs.count() == count
+
+    def test_search__uuid(self, rf: RequestFactory, visitor: Visitor) -> None:
+        admin = VisitorsAdmin(Visitor, site)
+        qs, _ = admin.get_search_results(
+            rf.get("/"), Visitor.objects.all(), str(visitor.uuid)
+        )
+        assert list(qs) == [visitor]
+
+    @mock.patch.object(VisitorsAdmin, "message_user")
+    def test_reactivate__conflict(
+        self, mock_message, rf: RequestFactory, visitor: Visitor
+    ) -> None:
+        duplicate = Visitor.objects.create(
+            email=visitor.email.upper(), scope=visitor.scope, is_active=False
+        )
+        other = Visitor.objects.create(email="bob@example.com", is_active=False)
+        admin = VisitorsAdmin(Visitor, site)
+        admin.reactivate(rf.post("/"), Visitor.objects.filter(is_active=False))
+        duplicate.refresh_from_db()
+        other.refresh_from_db()
+        assert not duplicate.is_active
+        assert other.is_active
+        assert mock_message.call_count == 2
+        assert "1 passes have been activated" in mock_message.call_args_list[0][0][1]
+        assert "1 passes could not be activated" in mock_message.call_args[0][1]
+
+    def test_search__sql(self, rf: RequestFactory) -> None:
+        admin = VisitorsAdmin(Visitor, site)
+        for term in ("fred@example.com", "foo", str(uuid.uuid4())):
+            qs, _ = admin.get_search_results(rf.get("/"), Visitor.objects.all(), term)
+            # no (un-indexable) UPPER(col) lookups, or leading wildcards
+            assert "UPPER(" not in str(qs.query)
+            assert "%foo" not in str(qs.query)
+            assert "%fred" not in str(qs.query)
+
+
+@pytest.mark.django_db
+class TestVisitorLogAdmin:
+    def test_search(self, rf: RequestFactory, visitor: Visitor) -> None:
+        log = VisitorLog.objects.create(
+            visitor=visitor, request_uri="/", session_key="abc", remote_addr="1.2.3.4"
+        )
+        admin = VisitorLogAdmin(VisitorLog, site)
+        logs = VisitorLog.objects.all()
+        assert list(
+            admin.get_search_results(rf.get("/"), logs, str(visitor.uuid))[0]
+        ) == [log]
+        assert not admin.get_search_results(rf.get("/"), logs, str(uuid.uuid4()))[0]
+        assert not admin.get_search_results(rf.get("/"), logs, "1.2.3.4")[0]
+        assert list(admin.get_search_results(rf.get("/"), logs, "")[0]) == [log]
+
+
+@pytest.mark.django_db
+class TestEstimatedCountPaginator:
+    def test_count(self, visitor: Visitor) -> None:
+        paginator = EstimatedCountPaginator(Visitor.objects.order_by("id"), 10)
+        assert paginator.count == 1
+
+    @mock.patch("visitors.admin.estimated_count", return_value=1_000_000)
+    def test_count__estimated(self, mock_estimate, visitor: Visitor) -> None:
+        assert (
+            EstimatedCountPaginator(Visitor.objects.order_by("id"), 10).count
+            == 1_000_000
+        )
+        # filtered querysets are always counted
+        qs = Visitor.objects.filter(scope="foo").order_by("id")
+        assert EstimatedCountPaginator(qs, 10).count == 1
+        mock_estimate.assert_called_once_with(Visitor, using="default")
+
+
+@pytest.mark.django_db
+def test_visitor_log_changelist(
+    admin_client: Client, visitor: Visitor, django_assert_max_num_queries
+) -> None:
+    """Check that the number of queries does not grow with the number of rows."""
+    for i in range(20):
+        VisitorLog.objects.create(
+            visitor=visitor,
+            request_uri="/",
+            interned_user_agent_id=UserAgent.objects.intern(f"Mozilla/{i}"),
+        )
+    url = reverse("admin:visitors_visitorlog_changelist")
+    with django_assert_max_num_queries(10):
+        response = admin_client.get(url)
+    assert response.status_code == 200
+    # interned headers are shown
+    assert "Mozilla/19" in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_visitor_log_change(admin_client: Client, visitor: Visitor) -> None:
+    log = VisitorLog.objects.create(
+        visitor=visitor,
+        request_uri="/",
+        interned_user_agent_id=UserAgent.objects.intern("Mozilla/5.0"),
+        interned_referer_id=Referer.objects.intern("https://example.com/foo"),
+    )
+    url = reverse("admin:visitors_visitorlog_change", args=[log.pk])
+    response = admin_client.get(url)
+    assert response.status_code == 200
+    assert "Mozilla/5.0" in response.content.decode()
+    assert "https://example.com/foo" in response.content.decode()
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import datetime
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.timezone import now as tz_now
+
+from visitors import partitions
+from visitors.models import Visitor, VisitorLog, token_cache_key
+
+JAN = datetime.datetime(2024, 1, 15, tzinfo=datetime.UTC)
+
+
+def _visitor(email: str, scope: str = "foo", logs: int = 3) -> Visitor:
+    visitor = Visitor.objects.create(
+        email=email,
+        scope=scope,
+        first_name="Fred",
+        last_name="Flintstone",
+        context={"foo": "bar"},
+    )
+    for _ in range(logs):
+        VisitorLog.objects.create(
+            visitor=visitor,
+            session_key="abc",
+            remote_addr="127.0.0.1",
+            http_user_agent="Mozilla/5.0",
+            http_referer="https://example.com/",
+            query_string="vuid=123",
+        )
+    return visitor
+
+
+@pytest.mark.django_db
+class TestAnonymise:
+    def test_anonymise(self, django_assert_max_num_queries) -> None:
+        visitors = [_visitor(f"{i}@example.com") for i in range(5)]
+        other = _visitor("other@example.com", scope="bar")
+        Visitor.objects.get_cached(visitors[0].uuid)
+        # list the partition tables, then per batch: select visitors, (select
+        # + update) per batch of logs, a final empty select of logs, and update
+        # visitors - plus a final empty select of visitors: 1 + 9 + 9 + 7 + 1
+        with django_assert_max_num_queries(27):
+            batches = list(Visitor.objects.filter(scope="foo").iter_anonymise(2))
+        assert batches == [(2, 6), (2, 6), (1, 3)]
+        for visitor in Visitor.objects.filter(scope="foo"):
+            assert visitor.email == visitor.first_name == visitor.last_name == ""
+            assert visitor.context is None
+            assert not visitor.is_active
+        assert not VisitorLog.objects.filter(visitor__scope="foo").exclude(
+            session_key="",
+            remote_addr="",
+            http_user_agent="",
+            http_referer="",
+            query_string="",
+        )
+        other.refresh_from_db()
+        assert other.email == "other@example.com"
+        assert (
+            VisitorLog.objects.filter(visitor=other, remote_addr="127.0.0.1").count()
+            == 3
+        )
+        assert cache.get(token_cache_key(visitors[0].uuid)) is None
+
+    def test_anonymise_totals(self) -> None:
+        _visitor("fred@example.com")
+        assert Visitor.objects.anonymise() == (1, 3)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_anonymise_partitions() -> None:
+    visitor = _visitor("fred@example.com", logs=0)
+    other = _visitor("ginger@example.com", logs=0)
+    table = partitions.create_partition(JAN)
+    try:
+        Partition = partitions.get_partition_model(table)
+        for v in (visitor, other):
+            Partition.objects.create(
+                visitor_id=v.pk,
+                session_key="abc",
+                http_method="GET",
+                request_uri="/",
+                remote_addr="127.0.0.1",
+                http_user_agent="Mozilla/5.0",
+                http_referer="https://example.com/",
+                query_string="vuid=123",
+                timestamp=JAN,
+            )
+        assert Visitor.objects.filter(pk=visitor.pk).anonymise() == (1, 1)
+        assert Partition.objects.get(visitor_id=visitor.pk).remote_addr == ""
+        row = Partition.objects.filter(visitor_id=visitor.pk).values().get()
+        assert row["session_key"] == row["http_referer"] == row["query_string"] == ""
+        assert Partition.objects.get(visitor_id=other.pk).remote_addr == "127.0.0.1"
+    finally:
+        partitions.drop_partitions_before(datetime.date(9999, 1, 1))
+
+
+@pytest.mark.django_db
+class TestAnonymiseCommand:
+    def test_no_selection(self) -> None:
+        with pytest.raises(CommandError):
+            call_command("anonymise_visitors")
+
+    def test_email(self) -> None:
+        _visitor("Fred@example.com")
+        _visitor("fred@example.com", scope="bar")
+        _visitor("ginger@example.com")
+        out = StringIO()
+        call_command("anonymise_visitors", emails=["FRED@example.com"], stdout=out)
+        assert "2 visitor passes, 6 logs anonymised" in out.getvalue()
+        assert Visitor.objects.exclude(email="").get().email == "ginger@example.com"
+
+    def test_scope_and_days(self) -> None:
+        old = _visitor("fred@example.com")
+        Visitor.objects.filter(pk=old.pk).update(
+            created_at=tz_now() - datetime.timedelta(days=40)
+        )
+        _visitor("ginger@example.com")
+        _visitor("harry@example.com", scope="bar")
+        call_command("anonymise_visitors", scope="foo", days=30, stdout=StringIO())
+        assert list(Visitor.objects.filter(email="").values_list("pk", flat=True)) == [
+            old.pk
+        ]
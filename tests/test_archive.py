@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import datetime
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.timezone import now as tz_now
+
+from visitors.archive import (
+    VisitorArchive,
+    _email_shard,
+    _uuid_shard,
+    archive_visitors,
+)
+from visitors.models import Visitor, VisitorLog
+
+YESTERDAY = tz_now() - datetime.timedelta(days=1)
+
+
+def _expired(email: str, scope: str = "foo") -> Visitor:
+    visitor = Visitor.objects.create(email=email, scope=scope, expires_at=YESTERDAY)
+    VisitorLog.objects.create(
+        visitor=visitor, http_method="GET", request_uri="/", remote_addr="127.0.0.1"
+    )
+    return visitor
+
+
+@pytest.mark.django_db
+class TestArchive:
+    def test_archive_visitors(self, tmp_path, visitor: Visitor) -> None:
+        expired = [_expired(f"{i}@example.com") for i in range(5)]
+        batches = list(
+            archive_visitors(
+                Visitor.objects.filter(expires_at__lt=tz_now()), tmp_path, batch_size=2
+            )
+        )
+        assert batches == [2, 2, 1]
+        assert list(Visitor.objects.all()) == [visitor]
+        assert not VisitorLog.objects.exists()
+        assert len(list(tmp_path.glob("segment-*.jsonl.gz"))) == 3
+        archive = VisitorArchive(tmp_path)
+        record = archive.get(expired[3].uuid)
+        assert record["visitor"]["email"] == "3@example.com"
+        assert len(record["logs"]) == 1
+        assert record["logs"][0]["request_uri"] == "/"
+
+    def test_lookup(self, tmp_path) -> None:
+        _expired("Fred@example.com")
+        _expired("fred@example.com", scope="bar")
+        list(archive_visitors(Visitor.objects.all(), tmp_path))
+        archive = VisitorArchive(tmp_path)
+        assert len(archive.filter_email("FRED@example.com")) == 2
+        assert archive.get("68201321-9dd2-4fb3-92b1-24367f38a7d6") is None
+
+    def test_lookup__sharded(self, tmp_path) -> None:
+        visitors = [_expired(f"{i}@example.com") for i in range(20)]
+        list(archive_visitors(Visitor.objects.all(), tmp_path))
+        visitor = visitors[7]
+        uuid_shard = tmp_path / _uuid_shard(str(visitor.uuid))
+        email_shard = tmp_path / _email_shard(visitor.email)
+        # lookups only read the one shard for the key
+        for shard in (tmp_path / "index").glob("*/*.jsonl"):
+            if shard not in (uuid_shard, email_shard):
+                shard.unlink()
+        archive = VisitorArchive(tmp_path)
+        assert archive.get(visitor.uuid)["visitor"]["id"] == visitor.id
+        assert len(archive.filter_email("7@example.com")) == 1
+
+    def test_lookup__anonymised(self, tmp_path) -> None:
+        visitor = _expired("")
+        list(archive_visitors(Visitor.objects.all(), tmp_path))
+        archive = VisitorArchive(tmp_path)
+        assert archive.get(visitor.uuid)
+        assert archive.filter_email("") == []
+
+    def test_empty_archive(self, tmp_path) -> None:
+        assert VisitorArchive(tmp_path).filter_email("fred@example.com") == []
+
+    def test_command(self, tmp_path, visitor: Visitor) -> None:
+        _expired("ginger@example.com")
+        call_command("archive_visitors", path=str(tmp_path))
+        assert list(Visitor.objects.all()) == [visitor]
+        assert VisitorArchive(tmp_path).filter_email("ginger@example.com")
+
+    def test_command__no_path(self) -> None:
+        with pytest.raises(CommandError):
+            call_command("archive_visitors")
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.sessions.backends.db import SessionStore
+
+from visitors.asgi import (
+    CLOSE_CODE_INVALID_PASS,
+    VisitorWebSocketMiddleware,
+    resolve_visitor,
+)
+from visitors.models import Visitor
+from visitors.settings import VISITOR_SESSION_KEY
+
+
+def _scope(query_string: str = "", cookie: str = "") -> dict:
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    return {
+        "type": "websocket",
+        "path": "/ws/",
+        "query_string": query_string.encode(),
+        "headers": headers,
+    }
+
+
+@pytest.mark.django_db
+class TestResolveVisitor:
+    def test_token(self, visitor: Visitor) -> None:
+        assert resolve_visitor(_scope(f"vuid={visitor.uuid}")) == visitor
+
+    def test_invalid_token(self, visitor: Visitor) -> None:
+        visitor.deactivate()
+        assert resolve_visitor(_scope(f"vuid={visitor.uuid}")) is None
+        assert resolve_visitor(_scope(f"vuid={uuid.uuid4()}")) is None
+        assert resolve_visitor(_scope("vuid=123")) is None
+
+    def test_session(self, visitor: Visitor) -> None:
+        session = SessionStore()
+        session[VISITOR_SESSION_KEY] = visitor.session_data
+        session.create()
+        scope = _scope(cookie=f"foo=bar; sessionid={session.session_key}")
+        assert resolve_visitor(scope) == visitor
+
+    def test_no_visitor(self) -> None:
+        assert resolve_visitor(_scope()) is None
+        assert resolve_visitor(_scope(cookie="sessionid=nope")) is None
+
+
+@pytest.mark.django_db
+class TestVisitorWebSocketMiddleware:
+    def run(self, app, scope: dict, interval: float = 0) -> list[dict]:
+        sent: list[dict] = []
+
+        async def receive() -> dict:
+            return {"type": "websocket.connect"}
+
+        async def send(message: dict) -> None:
+            sent.append(message)
+
+        middleware = VisitorWebSocketMiddleware(app, revalidate_interval=interval)
+        async_to_sync(middleware)(scope, receive, send)
+        return sent
+
+    def test_visitor(self, visitor: Visitor) -> None:
+        scopes = []
+
+        async def app(scope, receive, send) -> None:
+            scopes.append(scope)
+
+        self.run(app, _scope(f"vuid={visitor.uuid}"))
+        assert scopes[0]["visitor"] == visitor
+
+    def test_http_passthrough(self) -> None:
+        scopes = []
+
+        async def app(scope, receive, send) -> None:
+            scopes.append(scope)
+
+        self.run(app, {"type": "http"})
+        assert "visitor" not in scopes[0]
+
+    def test_revalidate(self, visitor: Visitor) -> None:
+        scopes = []
+
+        async def app(scope, receive, send) -> None:
+            scopes.append(scope)
+            await Visitor.objects.filter(pk=visitor.pk).aupdate(is_active=False)
+            await asyncio.sleep(0.05)
+
+        sent = self.run(app, _scope(f"vuid={visitor.uuid}"), interval=0.01)
+        assert sent == [{"type": "websocket.close", "code": CLOSE_CODE_INVALID_PASS}]
+        assert scopes[0]["visitor"] is None
+
+    def test_revalidate_still_valid(self, visitor: Visitor) -> None:
+        async def app(scope, receive, send) -> None:
+            await asyncio.sleep(0.05)
+
+        assert self.run(app, _scope(f"vuid={visitor.uuid}"), interval=0.01) == []
+
+    def test_revalidate_session__expired(self, visitor: Visitor) -> None:
+        # session visitors only need to be active - as on connect
+        Visitor.objects.filter(pk=visitor.pk).update(expires_at=visitor.created_at)
+        session = SessionStore()
+        session[VISITOR_SESSION_KEY] = visitor.session_data
+        session.create()
+        scopes = []
+
+        async def app(scope, receive, send) -> None:
+            scopes.append(scope)
+            await asyncio.sleep(0.05)
+
+        scope = _scope(cookie=f"sessionid={session.session_key}")
+        assert self.run(app, scope, interval=0.01) == []
+        assert scopes[0]["visitor"] == visitor
+
+    def test_revalidate_token__expired(self, visitor: Visitor) -> None:
+        async def app(scope, receive, send) -> None:
+            await Visitor.objects.filter(pk=visitor.pk).aupdate(
+                expires_at=visitor.created_at
+            )
+            await asyncio.sleep(0.05)
+
+        sent = self.run(app, _scope(f"vuid={visitor.uuid}"), interval=0.01)
+        assert sent == [{"type": "websocket.close", "code": CLOSE_CODE_INVALID_PASS}]
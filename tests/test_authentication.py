@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import uuid
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import HttpRequest, HttpResponse
+from django.test import RequestFactory
+
+from visitors.authentication import (
+    VisitorTokenAuthentication,
+    authenticate_token,
+    get_header_token,
+)
+from visitors.decorators import user_is_visitor
+from visitors.middleware import VisitorRequestMiddleware, VisitorSessionMiddleware
+from visitors.models import Visitor, token_cache_key
+
+
+@pytest.fixture(autouse=True)
+def clear_cache() -> Iterator[None]:
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def _request(rf: RequestFactory, authorization: str = "") -> HttpRequest:
+    request = rf.get("/", HTTP_AUTHORIZATION=authorization)
+    request.user = AnonymousUser()
+    request.session = mock.MagicMock(session_key="")
+    return request
+
+
+@pytest.mark.parametrize(
+    "header,token",
+    [
+        ("", ""),
+        ("Visitor abc", "abc"),
+        ("visitor  abc ", "abc"),
+        ("Bearer abc", ""),
+        ("Visitor", ""),
+    ],
+)
+def test_get_header_token(rf: RequestFactory, header: str, token: str) -> None:
+    assert get_header_token(_request(rf, header)) == token
+
+
+@pytest.mark.django_db
+@mock.patch("visitors.models.VISITOR_TOKEN_CACHE_TIMEOUT", 60)
+class TestGetCached:
+    def test_cached(self, visitor: Visitor) -> None:
+        assert Visitor.objects.get_cached(str(visitor.uuid)) == visitor
+        assert cache.get(token_cache_key(visitor.uuid)) == visitor
+
+    def test_save_clears_cache(self, visitor: Visitor) -> None:
+        Visitor.objects.get_cached(visitor.uuid)
+        visitor.deactivate()
+        assert cache.get(token_cache_key(visitor.uuid)) is None
+        assert not Visitor.objects.get_cached(visitor.uuid).is_active
+
+    def test_delete_clears_cache(self, visitor: Visitor) -> None:
+        Visitor.objects.get_cached(visitor.uuid)
+        visitor.delete()
+        assert cache.get(token_cache_key(visitor.uuid)) is None
+        assert authenticate_token(str(visitor.uuid)) is None
+
+    def test_queryset_update_clears_cache(self, visitor: Visitor) -> None:
+        Visitor.objects.get_cached(visitor.uuid)
+        Visitor.objects.filter(is_active=True).update(is_active=False)
+        assert cache.get(token_cache_key(visitor.uuid)) is None
+        assert authenticate_token(str(visitor.uuid)) is None
+
+    def test_queryset_delete_clears_cache(self, visitor: Visitor) -> None:
+        Visitor.objects.get_cached(visitor.uuid)
+        Visitor.objects.all().delete()
+        assert cache.get(token_cache_key(visitor.uuid)) is None
+
+    def test_disabled(self, visitor: Visitor) -> None:
+        with mock.patch("visitors.models.VISITOR_TOKEN_CACHE_TIMEOUT", 0):
+            assert Visitor.objects.get_cached(visitor.uuid) == visitor
+        assert cache.get(token_cache_key(visitor.uuid)) is None
+
+    def test_does_not_exist(self) -> None:
+        with pytest.raises(Visitor.DoesNotExist):
+            Visitor.objects.get_cached(uuid.uuid4())
+
+    def test_malformed(self) -> None:
+        with pytest.raises(ValidationError):
+            Visitor.objects.get_cached("123")
+
+
+@pytest.mark.django_db
+class TestAuthenticateToken:
+    def test_valid(self, visitor: Visitor) -> None:
+        assert authenticate_token(str(visitor.uuid)) == visitor
+
+    def test_invalid(self, visitor: Visitor) -> None:
+        visitor.deactivate()
+        assert authenticate_token(str(visitor.uuid)) is None
+
+    def test_does_not_exist(self) -> None:
+        assert authenticate_token(str(uuid.uuid4())) is None
+
+
+@pytest.mark.django_db
+class TestMiddleware:
+    def middleware(self, request: HttpRequest) -> HttpResponse:
+        return VisitorRequestMiddleware(
+            VisitorSessionMiddleware(lambda r: HttpResponse())
+        )(request)
+
+    def test_valid(self, rf: RequestFactory, visitor: Visitor) -> None:
+        request = _request(rf, f"Visitor {visitor.uuid}")
+        self.middleware(request)
+        assert request.visitor == visitor
+        assert request.user.is_visitor
+        assert not request.session.mock_calls
+
+    def test_invalid(self, rf: RequestFactory) -> None:
+        request = _request(rf, f"Visitor {uuid.uuid4()}")
+        self.middleware(request)
+        assert request.visitor is None
+        assert not request.user.is_visitor
+        assert not request.session.mock_calls
+
+    def test_malformed(self, rf: RequestFactory) -> None:
+        response = self.middleware(_request(rf, "Visitor 123"))
+        assert response.status_code == 400
+
+    def test_decorator(self, rf: RequestFactory, visitor: Visitor) -> None:
+        view = user_is_visitor(lambda r: HttpResponse("OK"), scope="foo")
+        response = VisitorRequestMiddleware(VisitorSessionMiddleware(view))(
+            _request(rf, f"Visitor {visitor.uuid}")
+        )
+        assert response.status_code == 200
+
+
+@pytest.mark.django_db
+class TestVisitorTokenAuthentication:
+    def test_no_header(self, rf: RequestFactory) -> None:
+        assert VisitorTokenAuthentication().authenticate(_request(rf)) is None
+
+    def test_valid(self, rf: RequestFactory, visitor: Visitor) -> None:
+        request = _request(rf, f"Visitor {visitor.uuid}")
+        # DRF wraps the HttpRequest
+        wrapper = mock.Mock(_request=request)
+        user, auth = VisitorTokenAuthentication().authenticate(wrapper)
+        assert auth == visitor
+        assert user.is_visitor
+        assert request.visitor == visitor
+
+    @pytest.mark.parametrize("token", ["123", str(uuid.uuid4())])
+    def test_invalid(self, rf: RequestFactory, token: str) -> None:
+        with pytest.raises(PermissionDenied):
+            VisitorTokenAuthentication().authenticate(_request(rf, f"Visitor {token}"))
+
+    def test_authenticate_header(self, rf: RequestFactory) -> None:
+        header = VisitorTokenAuthentication().authenticate_header(_request(rf))
+        assert header == "Visitor"
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from unittest import mock
+
+import pytest
+from django.test import RequestFactory
+
+from visitors.backends import (
+    DatabaseBackend,
+    JsonLinesBackend,
+    LoggingBackend,
+    get_log_backend,
+)
+from visitors.models import Visitor, VisitorLog
+
+
+@pytest.fixture
+def record(rf: RequestFactory, visitor: Visitor) -> dict:
+    request = rf.get("/foo?bar=baz", HTTP_USER_AGENT="Mozilla/5.0")
+    request.visitor = visitor
+    request.session = mock.Mock(session_key="abc")
+    return VisitorLog.objects.build_record(request, 200)
+
+
+@pytest.mark.django_db
+class TestDatabaseBackend:
+    def test_write(self, record: dict) -> None:
+        DatabaseBackend().write([record, record])
+        assert VisitorLog.objects.filter(request_uri="/foo").count() == 2
+
+    def test_write_one(self, record: dict) -> None:
+        log = DatabaseBackend().write_one(record)
+        assert log == VisitorLog.objects.get()
+        assert log.query_string == "bar=baz"
+
+
+@pytest.mark.django_db
+class TestJsonLinesBackend:
+    def test_write(self, tmp_path, record: dict) -> None:
+        backend = JsonLinesBackend(path=str(tmp_path / "log-{pid}.jsonl"))
+        backend.write([record, record])
+        assert backend.write_one(record) is None
+        backend.close()
+        path = tmp_path / f"log-{os.getpid()}.jsonl"
+        lines = path.read_text().splitlines()
+        assert len(lines) == 3
+        assert json.loads(lines[0])["visitor_uuid"] == record["visitor_uuid"]
+        assert not VisitorLog.objects.exists()
+
+    def test_rotate(self, tmp_path, record: dict) -> None:
+        path = tmp_path / "log.jsonl"
+        backend = JsonLinesBackend(
+            path=str(path), max_bytes=1, backup_count=2, sync="fsync"
+        )
+        for _ in range(4):
+            backend.write([record])
+        backend.close()
+        assert len(path.read_text().splitlines()) == 1
+        assert (tmp_path / "log.jsonl.1").exists()
+        assert (tmp_path / "log.jsonl.2").exists()
+        assert not (tmp_path / "log.jsonl.3").exists()
+
+    def test_size__non_ascii(self, tmp_path, record: dict) -> None:
+        path = tmp_path / "log.jsonl"
+        backend = JsonLinesBackend(path=str(path))
+        backend.write([record | {"http_user_agent": "Mözilla/5.0 (日本語)"}])
+        backend.write([record | {"query_string": "q=café"}])
+        assert backend.size == path.stat().st_size
+        backend.close()
+
+    def test_invalid_sync(self, tmp_path) -> None:
+        with pytest.raises(ValueError):
+            JsonLinesBackend(path=str(tmp_path / "log.jsonl"), sync="sometimes")
+
+
+@pytest.mark.django_db
+def test_logging_backend(caplog, record: dict) -> None:
+    with caplog.at_level(logging.INFO, logger="visitors.log"):
+        LoggingBackend().write([record])
+    assert caplog.records[0].visitor_log == record
+    assert json.loads(caplog.records[0].message)["status_code"] == 200
+
+
+@pytest.mark.django_db
+def test_create_log__backend(rf: RequestFactory, visitor: Visitor) -> None:
+    request = rf.get("/")
+    request.visitor = visitor
+    request.session = mock.Mock(session_key="abc")
+    backend = mock.Mock()
+    with mock.patch("visitors.backends.get_log_backend", return_value=backend):
+        log = VisitorLog.objects.create_log(request, 200)
+    assert log == backend.write_one.return_value
+    assert backend.write_one.call_args[0][0]["visitor_id"] == visitor.id
+
+
+def test_get_log_backend() -> None:
+    assert isinstance(get_log_backend(), DatabaseBackend)
+    assert get_log_backend() is get_log_backend()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import datetime
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from django.utils.timezone import now as tz_now
+
+from visitors.dashboard import (
+    DASHBOARD_CACHE_KEY,
+    DASHBOARD_REFRESH_LOCK_KEY,
+    _refresh_in_background,
+    compute_dashboard,
+    get_dashboard,
+)
+from visitors.models import Visitor
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.delete_many([DASHBOARD_CACHE_KEY, DASHBOARD_REFRESH_LOCK_KEY])
+    yield
+    cache.delete_many([DASHBOARD_CACHE_KEY, DASHBOARD_REFRESH_LOCK_KEY])
+
+
+@pytest.mark.django_db
+class TestDashboard:
+    def test_compute_dashboard(self, visitor: Visitor, temp_visitor: Visitor) -> None:
+        Visitor.objects.create(
+            email="ginger@example.com",
+            scope="bar",
+            expires_at=tz_now() - datetime.timedelta(days=1),
+        )
+        temp = Visitor.objects.create_temp_visitor(scope="foo", redirect_to="/")
+        temp.activate(email="bob@example.com")
+        stats = compute_dashboard()
+        counts = {
+            row["scope"]: (row["valid"], row["expired"], row["inactive"])
+            for row in stats["scopes"]
+        }
+        assert counts == {"bar": (0, 1, 0), "foo": (2, 0, 1)}
+        assert stats["self_service"] == {"created": 2, "activated": 1}
+
+    def test_get_dashboard__cached(
+        self, visitor: Visitor, django_assert_num_queries
+    ) -> None:
+        stats = get_dashboard()
+        with django_assert_num_queries(0):
+            assert get_dashboard() == stats
+
+    def test_compute_dashboard__blank_email(self) -> None:
+        temp = Visitor.objects.create_temp_visitor(scope="foo", redirect_to="/")
+        # e.g. an anonymised pass
+        Visitor.objects.filter(pk=temp.pk).update(email="")
+        assert compute_dashboard()["self_service"] == {"created": 1, "activated": 0}
+
+    @mock.patch("visitors.dashboard.threading.Thread")
+    def test_get_dashboard__stale(self, mock_thread, visitor: Visitor) -> None:
+        stats = get_dashboard()
+        with mock.patch(
+            "visitors.dashboard.tz_now",
+            return_value=tz_now() + datetime.timedelta(days=1),
+        ):
+            # the stale stats are returned, and refreshed in the background
+            assert get_dashboard() == stats
+            assert get_dashboard() == stats
+        mock_thread.assert_called_once_with(target=_refresh_in_background, daemon=True)
+        mock_thread.return_value.start.assert_called_once()
+        assert cache.get(DASHBOARD_REFRESH_LOCK_KEY)
+
+    def test_command(self, visitor: Visitor) -> None:
+        get_dashboard()
+        Visitor.objects.create(email="ginger@example.com", scope="bar")
+        call_command("refresh_visitor_dashboard")
+        assert len(get_dashboard()["scopes"]) == 2
+
+    def test_admin_view(self, admin_client: Client, visitor: Visitor) -> None:
+        response = admin_client.get(reverse("admin:visitors_visitor_dashboard"))
+        assert response.status_code == 200
+        assert response.context["stats"]["scopes"][0]["scope"] == "foo"
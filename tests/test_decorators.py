@@ -8,10 +8,41 @@ from django.http import HttpRequest, HttpResponse
 from django.test import RequestFactory
 from django.urls import reverse
 
-from visitors.decorators import user_is_visitor
+from visitors.decorators import ScopeMatcher, user_is_visitor
 from visitors.models import Visitor, VisitorLog
 
 
+@pytest.mark.parametrize(
+    "scopes,visitor_scopes,match",
+    [
+        ("foo", ["foo"], True),
+        ("foo", ["bar"], False),
+        ("foo", ["bar", "foo"], True),
+        (["foo", "bar"], ["bar"], True),
+        ("*", ["bar"], True),
+        ("reference:*", ["reference:123"], True),
+        ("reference:*", ["reference"], False),
+        (["foo", "ref?"], ["refs"], True),
+        (["foo", "ref?"], ["refs:1"], False),
+    ],
+)
+def test_scope_matcher(scopes, visitor_scopes, match) -> None:
+    assert ScopeMatcher(scopes)(visitor_scopes) == match
+
+
+@pytest.mark.parametrize("scopes", ["", [], ["foo", ""]])
+def test_scope_matcher__empty(scopes) -> None:
+    with pytest.raises(ValueError):
+        ScopeMatcher(scopes)
+
+
+def test_scope_matcher__default_scope() -> None:
+    assert ScopeMatcher(["ref:*", "foo", "bar"]).default_scope == "foo"
+    assert ScopeMatcher(["ref:*"]).default_scope == ""
+    with pytest.raises(ValueError):
+        user_is_visitor(lambda r: r, scope="ref:*", self_service=True)
+
+
 @pytest.mark.django_db
 class TestDecorators:
     def _request(
@@ -56,6 +87,17 @@ class TestDecorators:
         assert response.status_code == 200
         assert response.content == b"OK"
 
+    def test_extra_scopes(self, visitor: Visitor) -> None:
+        visitor.extra_scopes = ["reference:123"]
+        request = self._request(visitor=visitor)
+
+        @user_is_visitor(scope=["bar", "reference:*"])
+        def view(request: HttpRequest) -> HttpResponse:
+            return HttpResponse("OK")
+
+        response = view(request)
+        assert response.status_code == 200
+
     def test_any_scope(self, visitor: Visitor) -> None:
         request = self._request(visitor=visitor)
 
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+
+import pytest
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from visitors.admin import VisitorsAdmin
+from visitors.export import filter_logs, iter_csv, iter_jsonl, iter_logs
+from visitors.models import Visitor, VisitorLog
+
+
+def _log(visitor: Visitor, **kwargs: object) -> VisitorLog:
+    return VisitorLog.objects.create(
+        visitor=visitor,
+        http_method="GET",
+        request_uri="/",
+        remote_addr="127.0.0.1",
+        status_code=200,
+        **kwargs,
+    )
+
+
+@pytest.mark.django_db
+class TestExport:
+    def test_iter_logs(self, visitor: Visitor) -> None:
+        logs = [_log(visitor) for _ in range(5)]
+        rows = list(iter_logs(VisitorLog.objects.all(), chunk_size=2))
+        assert [r["id"] for r in rows] == [log.id for log in logs]
+        assert rows[0]["visitor_uuid"] == visitor.uuid
+        assert rows[0]["scope"] == "foo"
+
+    def test_iter_logs__num_queries(
+        self, visitor: Visitor, django_assert_num_queries
+    ) -> None:
+        for _ in range(5):
+            _log(visitor)
+        # two full chunks, one partial, and one empty
+        with django_assert_num_queries(4):
+            assert len(list(iter_logs(VisitorLog.objects.all(), chunk_size=2))) == 5
+
+    def test_filter_logs(self, visitor: Visitor) -> None:
+        other = Visitor.objects.create(email="ginger@example.com", scope="bar")
+        _log(visitor)
+        log = _log(other)
+        assert list(filter_logs(scope="bar")) == [log]
+        assert list(filter_logs(visitor_uuid=str(other.uuid))) == [log]
+        assert not filter_logs(since=log.timestamp, until=log.timestamp).exists()
+
+    def test_iter_csv(self, visitor: Visitor) -> None:
+        _log(visitor, http_user_agent="Mozilla/5.0")
+        lines = list(iter_csv(iter_logs(VisitorLog.objects.all())))
+        rows = list(csv.DictReader(io.StringIO("".join(lines))))
+        assert len(rows) == 1
+        assert rows[0]["http_user_agent"] == "Mozilla/5.0"
+
+    def test_iter_jsonl(self, visitor: Visitor) -> None:
+        _log(visitor)
+        lines = list(iter_jsonl(iter_logs(VisitorLog.objects.all())))
+        assert json.loads(lines[0])["visitor_email"] == "fred@example.com"
+
+    def test_command(self, visitor: Visitor) -> None:
+        _log(visitor)
+        out = io.StringIO()
+        call_command("export_visitor_logs", format="jsonl", scope="foo", stdout=out)
+        assert json.loads(out.getvalue())["scope"] == "foo"
+
+    def test_admin_action(self, rf: RequestFactory, visitor: Visitor) -> None:
+        _log(visitor)
+        admin = VisitorsAdmin(Visitor, site)
+        response = admin.export_logs(rf.get("/"), Visitor.objects.all())
+        content = b"".join(response.streaming_content).decode()
+        assert len(content.splitlines()) == 2
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import os
+import uuid
+from unittest import mock
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory
+
+from visitors import metrics
+from visitors.decorators import user_is_visitor
+from visitors.middleware import VisitorRequestMiddleware
+from visitors.models import Visitor
+from visitors.views import metrics_view
+
+
+def test_counter() -> None:
+    counter = metrics.Counter("foo_total", "Foo.", ("result",))
+    counter.inc(result="hit")
+    counter.inc(2, result="hit")
+    counter.inc(result='m"ss')
+    assert counter.render() == (
+        "# HELP foo_total Foo.\n"
+        "# TYPE foo_total counter\n"
+        'foo_total{result="hit"} 3\n'
+        'foo_total{result="m\\"ss"} 1\n'
+    )
+
+
+def test_histogram() -> None:
+    histogram = metrics.Histogram("foo_seconds", "Foo.", buckets=(0.1, 1.0))
+    histogram.observe(0.1)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    with histogram.time():
+        pass
+    assert histogram.render().splitlines()[2:] == [
+        'foo_seconds_bucket{le="0.1"} 2.0',
+        'foo_seconds_bucket{le="1.0"} 3.0',
+        'foo_seconds_bucket{le="+Inf"} 4.0',
+        f"foo_seconds_sum {histogram.collect()[((), 'sum')]}",
+        "foo_seconds_count 4.0",
+    ]
+
+
+class TestMmapStore:
+    def test_inc(self, tmp_path) -> None:
+        store = metrics.MmapStore(str(tmp_path))
+        store.inc("foo", 1)
+        store.inc("foo", 2.5)
+        store.inc("bar", 1)
+        assert store.read() == {"foo": 3.5, "bar": 1}
+        assert list(tmp_path.iterdir()) == [tmp_path / f"metrics-{os.getpid()}.db"]
+
+    def test_grow(self, tmp_path) -> None:
+        store = metrics.MmapStore(str(tmp_path))
+        store.INITIAL_SIZE = 64
+        for i in range(100):
+            store.inc(f"key-{i}", i)
+        assert store.read() == {f"key-{i}": i for i in range(100)}
+
+    def test_multi_process(self, tmp_path) -> None:
+        """Check that values from each process's file are summed."""
+        for pid in (1001, 1002):
+            with mock.patch("os.getpid", return_value=pid):
+                store = metrics.MmapStore(str(tmp_path))
+                store.inc("foo", pid)
+        assert len(list(tmp_path.iterdir())) == 2
+        assert metrics.MmapStore(str(tmp_path)).read() == {"foo": 2003}
+
+    def test_fork(self, tmp_path) -> None:
+        """Check that a new file is used if the pid changes."""
+        store = metrics.MmapStore(str(tmp_path))
+        store.inc("foo", 1)
+        with mock.patch("os.getpid", return_value=1001):
+            store.inc("foo", 1)
+        assert len(list(tmp_path.iterdir())) == 2
+        assert store.read() == {"foo": 2}
+
+    def test_reopen(self, tmp_path) -> None:
+        """Check that existing values are picked up by a restarted process."""
+        metrics.MmapStore(str(tmp_path)).inc("foo", 1)
+        store = metrics.MmapStore(str(tmp_path))
+        store.inc("foo", 1)
+        assert store.read() == {"foo": 2}
+
+
+def test_registry__mmap(tmp_path) -> None:
+    registry = metrics.MetricsRegistry(directory=str(tmp_path))
+    registry.counter("foo_total", "Foo.", ("result",)).inc(result="hit")
+    registry.histogram("foo_seconds", "Foo.").observe(0.5)
+    output = registry.render()
+    assert 'foo_total{result="hit"} 1.0' in output
+    assert 'foo_seconds_bucket{le="0.5"} 1.0' in output
+    assert "foo_seconds_count 1.0" in output
+
+
+def test_registry__disabled() -> None:
+    registry = metrics.MetricsRegistry(enabled=False)
+    counter = registry.counter("foo_total", "Foo.")
+    assert counter is metrics.NULL_METRIC
+    counter.inc()
+    with registry.histogram("foo_seconds", "Foo.").time():
+        pass
+    assert registry.render() == ""
+
+
+@pytest.mark.django_db
+class TestInstrumentation:
+    @pytest.fixture
+    def lookups(self) -> metrics.Counter:
+        counter = metrics.Counter("lookups", "", ("result",))
+        with mock.patch.object(metrics, "TOKEN_LOOKUPS", counter):
+            yield counter
+
+    @pytest.mark.parametrize(
+        "token,result",
+        [("valid", "hit"), (str(uuid.uuid4()), "miss"), ("123", "malformed")],
+    )
+    def test_token_lookups(
+        self,
+        rf: RequestFactory,
+        visitor: Visitor,
+        lookups: metrics.Counter,
+        token: str,
+        result: str,
+    ) -> None:
+        if token == "valid":
+            token = str(visitor.uuid)
+        request = rf.get(f"/?vuid={token}")
+        request.user = AnonymousUser()
+        VisitorRequestMiddleware(lambda r: r)(request)
+        assert lookups.get(result=result) == 1
+
+
+@pytest.mark.django_db
+def test_access_denied(rf: RequestFactory) -> None:
+    request = rf.get("/")
+    request.user = AnonymousUser()
+    request.user.is_visitor = False
+    counter = metrics.Counter("denied", "", ("scope",))
+    view = user_is_visitor(lambda r: HttpResponse(), scope="foo")
+    with mock.patch.object(metrics, "ACCESS_DENIED", counter):
+        with pytest.raises(PermissionDenied):
+            view(request)
+    assert counter.get(scope="foo") == 1
+
+
+def test_metrics_view(rf: RequestFactory) -> None:
+    registry = metrics.MetricsRegistry()
+    registry.counter("foo_total", "Foo.").inc()
+    with mock.patch.object(metrics, "registry", registry):
+        response = metrics_view(rf.get("/"))
+    assert response["Content-Type"] == "text/plain; version=0.0.4"
+    assert b"foo_total 1" in response.content
+
+
+def test_metrics_view__disabled(rf: RequestFactory) -> None:
+    with pytest.raises(Http404):
+        metrics_view(rf.get("/"))
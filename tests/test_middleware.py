@@ -1,12 +1,19 @@
 import uuid
 from typing import Optional
+from unittest import mock
 
 import pytest
 from django.contrib.auth.models import AnonymousUser, User
 from django.http.request import HttpRequest
-from django.test import RequestFactory
-
-from visitors.middleware import VisitorRequestMiddleware, VisitorSessionMiddleware
+from django.test import RequestFactory, override_settings
+
+from visitors.decorators import is_visitor
+from visitors.middleware import (
+    VisitorDebugMiddleware,
+    VisitorRequestMiddleware,
+    VisitorSessionMiddleware,
+    excluded_path_matcher,
+)
 from visitors.models import Visitor
 from visitors.settings import VISITOR_SESSION_KEY
 
@@ -133,3 +140,52 @@ class TestVisitorSessionMiddleware(TestVisitorMiddlewareBase):
         middleware = VisitorSessionMiddleware(lambda r: r)
         middleware(request)
         assert request.session.expiry == 327
+
+
+class TestExcludedPaths(TestVisitorMiddlewareBase):
+    def test_excluded_path_matcher(self) -> None:
+        is_excluded = excluded_path_matcher(["/static/", "/health"], [r"/api/v\d+/"])
+        assert is_excluded("/static/app.css")
+        assert is_excluded("/healthz")
+        assert is_excluded("/api/v2/things")
+        assert not is_excluded("/api/docs/")
+        assert not is_excluded("/foo/static/")
+
+    def test_excluded_path_matcher_empty(self) -> None:
+        assert not excluded_path_matcher([], [])("/")
+
+    @mock.patch("visitors.middleware.VISITOR_EXCLUDED_PATHS", ["/static/"])
+    def test_request_middleware(self) -> None:
+        request = self.request("/static/?vuid=123")
+        request.GET = mock.Mock()
+        middleware = VisitorRequestMiddleware(lambda r: r)
+        middleware(request)
+        assert request.visitor is None
+        request.GET.get.assert_not_called()
+        assert not hasattr(request.user, "is_visitor")
+
+    @mock.patch("visitors.middleware.VISITOR_EXCLUDED_PATH_PATTERNS", [r".*\.js$"])
+    def test_session_middleware(self) -> None:
+        request = self.request("/app.js")
+        request.session = mock.Mock()
+        middleware = VisitorSessionMiddleware(lambda r: r)
+        middleware(request)
+        assert request.visitor is None
+        assert not request.session.mock_calls
+
+    @override_settings(DEBUG=True)
+    @mock.patch("visitors.middleware.VISITOR_EXCLUDED_PATHS", ["/static/"])
+    def test_debug_middleware(self) -> None:
+        request = self.request("/static/app.css")
+        middleware = VisitorRequestMiddleware(
+            VisitorSessionMiddleware(VisitorDebugMiddleware(lambda r: r))
+        )
+        middleware(request)
+        assert request.visitor is None
+        assert not hasattr(request.user, "is_visitor")
+
+    @mock.patch("visitors.middleware.VISITOR_EXCLUDED_PATHS", ["/static/"])
+    def test_is_visitor(self) -> None:
+        request = self.request("/static/app.css")
+        VisitorRequestMiddleware(VisitorSessionMiddleware(lambda r: r))(request)
+        assert not is_visitor(request.user)
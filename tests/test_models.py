@@ -1,10 +1,23 @@
 import datetime
 import uuid
+from io import StringIO
+from unittest import mock
 
 import pytest
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import RequestFactory
 from django.utils.timezone import now as tz_now
 
-from visitors.models import InvalidVisitorPass, Visitor
+from visitors.models import (
+    InvalidVisitorPass,
+    Referer,
+    UserAgent,
+    Visitor,
+    VisitorLog,
+    VisitorScope,
+)
+from visitors.signals import visitor_link_shared
 
 TEST_UUID: str = "68201321-9dd2-4fb3-92b1-24367f38a7d6"
 
@@ -54,6 +67,42 @@ def test_reactivate():
     assert visitor.is_valid
 
 
+@pytest.mark.django_db
+def test_deactivate__update_fields():
+    visitor = Visitor.objects.create(email="foo@bar.com")
+    visitor.first_name = "Fred"
+    visitor.deactivate()
+    visitor.refresh_from_db()
+    assert not visitor.is_active
+    # only the activation fields are written
+    assert visitor.first_name == ""
+
+
+@pytest.mark.django_db
+def test_activate():
+    visitor = Visitor.objects.create(email="foo@bar.com", is_active=False)
+    # a second (stale) copy of the same pass, e.g. from a double submit
+    stale = Visitor.objects.get(pk=visitor.pk)
+    assert visitor.activate(first_name="Fred")
+    assert visitor.is_active
+    assert visitor.first_name == "Fred"
+    assert not stale.activate(first_name="Ginger")
+    assert not stale.is_active
+    visitor.refresh_from_db()
+    assert visitor.is_active
+    assert visitor.first_name == "Fred"
+
+
+@pytest.mark.django_db
+def test_activate__expired():
+    visitor = Visitor.objects.create(
+        email="foo@bar.com", is_active=False, expires_at=YESTERDAY
+    )
+    assert not visitor.activate()
+    visitor.refresh_from_db()
+    assert not visitor.is_active
+
+
 @pytest.mark.parametrize(
     "is_active,expires_at,is_valid",
     (
@@ -108,3 +157,241 @@ def test_has_expired(expires_at, has_expired):
     visitor = Visitor()
     visitor.expires_at = expires_at
     assert visitor.has_expired == has_expired
+
+
+@pytest.mark.django_db
+@mock.patch(
+    "visitors.models.VISITOR_SHARING_THRESHOLDS",
+    {"session": 2, "ip": 3, "user_agent": 0},
+)
+def test_record_fingerprints():
+    visitor = Visitor.objects.create(email="foo@bar.com")
+    receiver = mock.Mock()
+    visitor_link_shared.connect(receiver)
+    try:
+        assert not visitor.record_fingerprints(session="s1", ip="1.1.1.1")
+        assert len(visitor.fingerprints["session"]) == 1
+        # repeat values are ignored, as are kinds without a threshold
+        assert not visitor.record_fingerprints(session="s1", user_agent="ua")
+        assert "user_agent" not in visitor.fingerprints
+        assert not Visitor.objects.suspected_shared().exists()
+        assert visitor.record_fingerprints(session="s2", ip="1.1.1.1")
+        receiver.assert_called_once_with(
+            sender=Visitor, signal=visitor_link_shared, visitor=visitor
+        )
+        # already flagged - and the list of fingerprints is capped
+        assert not visitor.record_fingerprints(session="s3")
+        assert len(visitor.fingerprints["session"]) == 2
+    finally:
+        visitor_link_shared.disconnect(receiver)
+    assert Visitor.objects.suspected_shared().get() == visitor
+
+
+@pytest.mark.django_db
+@mock.patch(
+    "visitors.models.VISITOR_SHARING_THRESHOLDS",
+    {"session": 0, "ip": 2, "user_agent": 0},
+)
+def test_record_fingerprints__concurrent():
+    visitor = Visitor.objects.create(email="foo@bar.com")
+    # two workers, each with its own (e.g. cached) copy of the pass
+    first = Visitor.objects.get(pk=visitor.pk)
+    second = Visitor.objects.get(pk=visitor.pk)
+    assert not first.record_fingerprints(ip="1.1.1.1")
+    # second is stale - the update is retried with the current fingerprints
+    assert second.record_fingerprints(ip="2.2.2.2")
+    visitor.refresh_from_db()
+    assert len(visitor.fingerprints["ip"]) == 2
+    assert visitor.shared_suspected
+    # first is now stale, and the pass has already been flagged
+    assert not first.record_fingerprints(ip="3.3.3.3")
+
+
+@pytest.mark.django_db
+class TestGetOrIssue:
+    def test_create(self):
+        visitor, created = Visitor.objects.get_or_issue(
+            "fred@example.com", "foo", first_name="Fred"
+        )
+        assert created
+        assert visitor.first_name == "Fred"
+
+    def test_existing(self):
+        existing = Visitor.objects.create(email="Fred@example.com", scope="foo")
+        assert Visitor.objects.get_or_issue("fred@EXAMPLE.com", "foo") == (
+            existing,
+            False,
+        )
+
+    def test_expired(self):
+        expired = Visitor.objects.create(
+            email="fred@example.com", scope="foo", expires_at=YESTERDAY
+        )
+        visitor, created = Visitor.objects.get_or_issue("fred@example.com", "foo")
+        assert created
+        expired.refresh_from_db()
+        assert not expired.is_active
+
+    def test_race(self):
+        existing = Visitor.objects.create(email="fred@example.com", scope="foo")
+        # simulate another request issuing the pass after our lookup
+        with mock.patch.object(Visitor.objects, "_active_for") as active_for:
+            active_for.side_effect = [
+                Visitor.objects.none(),
+                Visitor.objects.filter(pk=existing.pk),
+            ]
+            assert Visitor.objects.get_or_issue("fred@example.com", "foo") == (
+                existing,
+                False,
+            )
+
+    def test_unique_constraint(self):
+        Visitor.objects.create(email="fred@example.com", scope="foo")
+        Visitor.objects.create(email="fred@example.com", scope="foo", is_active=False)
+        Visitor.objects.create(email="fred@example.com", scope="bar")
+        with pytest.raises(IntegrityError):
+            Visitor.objects.create(email="FRED@example.com", scope="foo")
+
+    def test_bulk(self, django_assert_num_queries):
+        existing = Visitor.objects.create(email="fred@example.com", scope="foo")
+        expired = Visitor.objects.create(
+            email="ginger@example.com", scope="foo", expires_at=YESTERDAY
+        )
+        # select, update, insert (plus savepoint)
+        with django_assert_num_queries(5):
+            visitors = Visitor.objects.bulk_get_or_issue(
+                ["Fred@example.com", "ginger@example.com", "harry@example.com"],
+                "foo",
+            )
+        assert set(visitors) == {
+            "fred@example.com",
+            "ginger@example.com",
+            "harry@example.com",
+        }
+        assert visitors["fred@example.com"] == existing
+        assert visitors["ginger@example.com"] != expired
+        assert all(v.pk for v in visitors.values())
+        assert Visitor.objects.filter(is_active=True).count() == 3
+
+
+@pytest.mark.django_db
+class TestEmailHistory:
+    def test_for_email(self):
+        visitor = Visitor.objects.create(email="Fred@Example.com", scope="foo")
+        Visitor.objects.create(email="ginger@example.com", scope="foo")
+        assert list(Visitor.objects.for_email("fred@example.COM")) == [visitor]
+
+    def test_history_for_email(self):
+        visitors = [
+            Visitor.objects.create(email="fred@example.com", scope=f"scope{i}")
+            for i in range(5)
+        ]
+        # two passes with the same created_at are ordered by id
+        Visitor.objects.filter(pk=visitors[1].pk).update(
+            created_at=visitors[2].created_at
+        )
+        Visitor.objects.create(email="ginger@example.com", scope="foo")
+        pages = []
+        after = None
+        while page := list(
+            Visitor.objects.history_for_email("FRED@example.com", after=after, limit=2)
+        ):
+            pages.append([v.scope for v in page])
+            after = (page[-1].created_at, page[-1].id)
+        assert pages == [["scope4", "scope3"], ["scope2", "scope1"], ["scope0"]]
+
+
+@pytest.mark.django_db
+def test_extra_scopes():
+    visitor = Visitor.objects.create(scope="foo", extra_scopes=["bar", "baz", "bar"])
+    other = Visitor.objects.create(scope="bar")
+    assert visitor.scopes == ["foo", "bar", "baz", "bar"]
+    assert VisitorScope.objects.filter(visitor=visitor).count() == 2
+    assert set(Visitor.objects.with_scope("bar")) == {visitor, other}
+    assert list(Visitor.objects.with_scope("foo")) == [visitor]
+    # only updated if extra_scopes changes
+    visitor = Visitor.objects.get(pk=visitor.pk)
+    with mock.patch.object(Visitor, "update_scope_index") as update_scope_index:
+        visitor.save()
+        visitor.extra_scopes = ["baz"]
+        visitor.save(update_fields=["is_active"])
+        update_scope_index.assert_not_called()
+    visitor.save()
+    assert not Visitor.objects.with_scope("bar").filter(pk=visitor.pk).exists()
+    assert Visitor.objects.with_scope("baz").get() == visitor
+
+
+@pytest.mark.django_db
+class TestInternedValues:
+    def test_intern(self, django_capture_on_commit_callbacks) -> None:
+        UserAgent.objects.clear_cache()
+        assert UserAgent.objects.intern("") is None
+        with django_capture_on_commit_callbacks(execute=True):
+            pk = UserAgent.objects.intern("Mozilla/5.0")
+        assert UserAgent.objects.intern("Mozilla/5.0") == pk
+        assert UserAgent.objects.count() == 1
+        # the cache is per model
+        assert UserAgent.objects._cache
+        assert not Referer.objects._cache
+        UserAgent.objects.clear_cache()
+
+    def test_intern__cached(self, django_capture_on_commit_callbacks) -> None:
+        with django_capture_on_commit_callbacks(execute=True):
+            pk = Referer.objects.intern("https://example.com")
+        Referer.objects.all().delete()
+        # cached value is returned without hitting the database
+        assert Referer.objects.intern("https://example.com") == pk
+        Referer.objects.clear_cache()
+
+    @pytest.mark.parametrize("intern_headers", [True, False])
+    def test_create_log(self, rf: RequestFactory, intern_headers: bool) -> None:
+        request = rf.get("/", HTTP_USER_AGENT="Mozilla/5.0", HTTP_REFERER="/foo")
+        request.session = mock.Mock(session_key="abc")
+        request.visitor = Visitor.objects.create(email="foo@bar.com")
+        with mock.patch("visitors.models.VISITOR_LOG_INTERN_HEADERS", intern_headers):
+            log = VisitorLog.objects.create_log(request, 200)
+        log.refresh_from_db()
+        assert log.user_agent == "Mozilla/5.0"
+        assert log.referer == "/foo"
+        assert bool(log.interned_user_agent_id) == intern_headers
+        assert bool(log.http_user_agent) != intern_headers
+
+    def test_intern_headers(self, visitor: Visitor) -> None:
+        logs = [
+            VisitorLog.objects.create(
+                visitor=visitor,
+                request_uri="/",
+                http_user_agent="Mozilla/5.0",
+                http_referer=referer,
+            )
+            for referer in ("/foo", "", "/foo")
+        ]
+        interned = VisitorLog.objects.create(
+            visitor=visitor,
+            request_uri="/",
+            interned_user_agent_id=UserAgent.objects.intern("curl/8.0"),
+        )
+        assert list(VisitorLog.objects.iter_intern_headers(batch_size=2)) == [2, 1]
+        for log in logs:
+            log.refresh_from_db()
+            assert log.http_user_agent == log.http_referer == ""
+            assert log.user_agent == "Mozilla/5.0"
+        assert [log.referer for log in logs] == ["/foo", "", "/foo"]
+        assert UserAgent.objects.count() == 2
+        assert Referer.objects.count() == 1
+        interned.refresh_from_db()
+        assert interned.user_agent == "curl/8.0"
+        # converted logs are skipped when re-run
+        assert not list(VisitorLog.objects.iter_intern_headers())
+        UserAgent.objects.clear_cache()
+        Referer.objects.clear_cache()
+
+    def test_intern_headers__command(self, visitor: Visitor) -> None:
+        VisitorLog.objects.create(
+            visitor=visitor, request_uri="/", http_user_agent="Mozilla/5.0"
+        )
+        out = StringIO()
+        call_command("intern_visitor_log_headers", stdout=out)
+        assert "Done - 1 logs converted" in out.getvalue()
+        assert VisitorLog.objects.get().interned_user_agent.value == "Mozilla/5.0"
+        UserAgent.objects.clear_cache()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import datetime
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.utils.timezone import now as tz_now
+
+from visitors import partitions
+from visitors.backends import PartitionedDatabaseBackend
+from visitors.models import Visitor, VisitorLog
+
+JAN = datetime.datetime(2024, 1, 15, tzinfo=datetime.UTC)
+FEB = datetime.datetime(2024, 2, 15, tzinfo=datetime.UTC)
+MAR = datetime.datetime(2024, 3, 15, tzinfo=datetime.UTC)
+
+
+@pytest.fixture
+def cleanup():
+    yield
+    partitions.drop_partitions_before(datetime.date(9999, 1, 1))
+
+
+def test_add_months():
+    assert partitions.add_months(datetime.date(2024, 11, 1), 3) == datetime.date(
+        2025, 2, 1
+    )
+    assert partitions.add_months(datetime.date(2024, 1, 1), -1) == datetime.date(
+        2023, 12, 1
+    )
+
+
+def test_partition_table():
+    assert partitions.partition_table(JAN) == "visitors_visitorlog_202401"
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures("cleanup")
+class TestPartitions:
+    def _record(self, rf: RequestFactory, timestamp: datetime.datetime) -> dict:
+        request = rf.get("/")
+        request.visitor, _ = Visitor.objects.get_or_issue("fred@example.com", "foo")
+        request.session = mock.Mock(session_key="abc")
+        record = VisitorLog.objects.build_record(request, 200)
+        record["timestamp"] = timestamp
+        return record
+
+    def test_backend(self, rf: RequestFactory) -> None:
+        backend = PartitionedDatabaseBackend()
+        backend.write([self._record(rf, JAN), self._record(rf, FEB)])
+        assert backend.write_one(self._record(rf, FEB)) is None
+        assert list(partitions.existing_partitions().values()) == [
+            "visitors_visitorlog_202401",
+            "visitors_visitorlog_202402",
+        ]
+        assert not VisitorLog.objects.exists()
+        counts = [qs.count() for qs in partitions.partitioned_logs()]
+        assert counts == [1, 2]
+
+    def test_partitioned_logs(self, rf: RequestFactory) -> None:
+        PartitionedDatabaseBackend().write(
+            [self._record(rf, ts) for ts in (JAN, FEB, MAR)]
+        )
+        qs = list(partitions.partitioned_logs(since=FEB, until=MAR))
+        # only the Feb and Mar partitions are queried
+        assert [q.model._meta.db_table[-6:] for q in qs] == ["202402", "202403"]
+        assert [q.count() for q in qs] == [1, 0]
+
+    def test_drop_partitions_before(self) -> None:
+        for ts in (JAN, FEB, MAR):
+            partitions.create_partition(ts)
+        assert partitions.drop_partitions_before(MAR) == [
+            "visitors_visitorlog_202401",
+            "visitors_visitorlog_202402",
+        ]
+        assert list(partitions.existing_partitions()) == [datetime.date(2024, 3, 1)]
+
+    def test_command(self) -> None:
+        partitions.create_partition(JAN)
+        call_command("visitor_log_partitions", create_ahead=2, keep=1)
+        this_month = partitions.month_start(tz_now())
+        assert list(partitions.existing_partitions()) == [
+            this_month,
+            partitions.add_months(this_month, 1),
+            partitions.add_months(this_month, 2),
+        ]
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest, HttpResponse
+from django.test import Client, RequestFactory
+from django.urls import reverse
+
+from visitors import profiling
+from visitors.decorators import user_is_visitor
+from visitors.middleware import (
+    VisitorProfilingMiddleware,
+    VisitorRequestMiddleware,
+    VisitorSessionMiddleware,
+)
+from visitors.models import Visitor
+
+
+@pytest.fixture(autouse=True)
+def clear_profiles():
+    profiling.profiles.clear()
+    yield
+    profiling.profiles.clear()
+
+
+def _stack() -> VisitorProfilingMiddleware:
+    @user_is_visitor(scope="foo")
+    def view(request: HttpRequest) -> HttpResponse:
+        return HttpResponse("OK")
+
+    return VisitorProfilingMiddleware(
+        VisitorRequestMiddleware(VisitorSessionMiddleware(view))
+    )
+
+
+def _request(rf: RequestFactory, url: str) -> HttpRequest:
+    request = rf.get(url)
+    request.user = AnonymousUser()
+    request.session = mock.MagicMock(session_key="abc")
+    return request
+
+
+def test_disabled() -> None:
+    with pytest.raises(MiddlewareNotUsed):
+        VisitorProfilingMiddleware(lambda r: r)
+
+
+def test_section__not_profiling() -> None:
+    with profiling.section("foo"):
+        pass
+    profiling.record_cache(hit=True)
+    assert profiling.current_profile.get() is None
+
+
+@pytest.mark.django_db
+@mock.patch("visitors.middleware.VISITOR_PROFILING_SAMPLE_RATE", 1.0)
+class TestVisitorProfilingMiddleware:
+    def test_profile(self, rf: RequestFactory, visitor: Visitor) -> None:
+        response = _stack()(_request(rf, visitor.tokenise("/")))
+        assert response.status_code == 200
+        profile = profiling.profiles[0]
+        assert profile.path == "/"
+        assert set(profile.sections) == {
+            "VisitorRequestMiddleware",
+            "VisitorSessionMiddleware",
+            "user_is_visitor",
+        }
+        # token lookup, log insert, fingerprint update
+        assert profile.query_count == 3
+        assert profile.total_time >= profile.visitor_time
+        assert profiling.current_profile.get() is None
+
+    @mock.patch("visitors.models.VISITOR_TOKEN_CACHE_TIMEOUT", 60)
+    def test_token_cache(self, rf: RequestFactory, visitor: Visitor) -> None:
+        for _ in range(3):
+            request = _request(rf, "/")
+            request.META["HTTP_AUTHORIZATION"] = f"Visitor {visitor.uuid}"
+            assert _stack()(request).status_code == 200
+        # the first visit records new fingerprints, which clears the cache
+        assert [(p.cache_hits, p.cache_misses) for p in profiling.profiles] == [
+            (0, 1),
+            (0, 1),
+            (1, 0),
+        ]
+
+    @mock.patch("visitors.middleware.random.random", return_value=0.5)
+    def test_sampling(self, mock_random, rf: RequestFactory) -> None:
+        with mock.patch("visitors.middleware.VISITOR_PROFILING_SAMPLE_RATE", 0.1):
+            VisitorProfilingMiddleware(lambda r: HttpResponse())(rf.get("/"))
+        assert not profiling.profiles
+
+    def test_slowest(self) -> None:
+        for total in (1, 3, 2):
+            profiling.profiles.append(
+                profiling.RequestProfile("GET", "/", total_time=total)
+            )
+        assert [p.total_time for p in profiling.slowest()] == [3, 2, 1]
+        assert [p.total_time for p in profiling.slowest("foo")] == [3, 2, 1]
+
+
+@pytest.mark.django_db
+def test_admin_view(admin_client: Client) -> None:
+    profiling.profiles.append(profiling.RequestProfile("GET", "/foo", total_time=1))
+    response = admin_client.get(reverse("admin:visitors_visitor_profiling"))
+    assert response.status_code == 200
+    assert b"GET /foo" in response.content
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse
+from django.test import RequestFactory
+
+from visitors.decorators import user_is_visitor
+from visitors.middleware import VisitorRequestMiddleware, VisitorSessionMiddleware
+from visitors.models import Visitor
+from visitors.scopes import scope_registry
+from visitors.settings import VISITOR_SESSION_KEY
+from visitors.testing import QueryBudgetExceeded, query_budget
+from visitors.views import SelfServiceRequest
+
+
+def _request(rf: RequestFactory, url: str = "/") -> HttpRequest:
+    request = rf.get(url)
+    request.user = AnonymousUser()
+    request.session = mock.MagicMock(session_key="abc")
+    request.session.get.return_value = ""
+    return request
+
+
+def _header_request(rf: RequestFactory, visitor: Visitor) -> HttpRequest:
+    request = _request(rf)
+    request.META["HTTP_AUTHORIZATION"] = f"Visitor {visitor.uuid}"
+    return request
+
+
+def _middleware(request: HttpRequest) -> HttpResponse:
+    return VisitorRequestMiddleware(VisitorSessionMiddleware(lambda r: HttpResponse()))(
+        request
+    )
+
+
+@pytest.fixture(autouse=True)
+def warm_scope_registry(db) -> None:
+    # the registry is loaded once per process (and on change), not per request
+    scope_registry.refresh()
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    def test_anonymous_request(self, rf: RequestFactory, visitor_query_budget) -> None:
+        with visitor_query_budget("anonymous_request"):
+            _middleware(_request(rf))
+
+    def test_first_token_request(
+        self, rf: RequestFactory, visitor: Visitor, visitor_query_budget
+    ) -> None:
+        request = _request(rf, visitor.tokenise("/"))
+        with visitor_query_budget("first_token_request"):
+            _middleware(request)
+        assert request.visitor == visitor
+
+    def test_session_request(
+        self, rf: RequestFactory, visitor: Visitor, visitor_query_budget
+    ) -> None:
+        request = _request(rf)
+        request.session.get.side_effect = {
+            VISITOR_SESSION_KEY: visitor.session_data
+        }.get
+        with visitor_query_budget("session_request"):
+            _middleware(request)
+        assert request.visitor == visitor
+
+    @mock.patch("visitors.models.VISITOR_TOKEN_CACHE_TIMEOUT", 60)
+    def test_header_token_request(
+        self, rf: RequestFactory, visitor: Visitor, visitor_query_budget
+    ) -> None:
+        cache.clear()
+        with visitor_query_budget("header_token_request"):
+            _middleware(_header_request(rf, visitor))
+        with visitor_query_budget(0):
+            request = _header_request(rf, visitor)
+            _middleware(request)
+        assert request.visitor == visitor
+        request.session.get.assert_not_called()
+
+    def test_decorated_view_logged(
+        self, rf: RequestFactory, visitor: Visitor, visitor_query_budget
+    ) -> None:
+        @user_is_visitor(scope="foo")
+        def view(request: HttpRequest) -> HttpResponse:
+            return HttpResponse()
+
+        request = _request(rf)
+        request.visitor = visitor
+        request.user.is_visitor = True
+        with visitor_query_budget("decorated_view_logged"):
+            view(request)
+
+    @mock.patch("visitors.views.render", return_value=HttpResponse())
+    def test_self_service_get(
+        self,
+        mock_render,
+        rf: RequestFactory,
+        temp_visitor: Visitor,
+        visitor_query_budget,
+    ) -> None:
+        with visitor_query_budget("self_service_get"):
+            SelfServiceRequest().dispatch(rf.get("/"), temp_visitor.uuid)
+
+    def test_self_service_post(
+        self, rf: RequestFactory, temp_visitor: Visitor, visitor_query_budget
+    ) -> None:
+        request = rf.post(
+            "/",
+            {
+                "vuid": temp_visitor.uuid,
+                "first_name": "Henry",
+                "last_name": "Root",
+                "email": "henry@altavista.com",
+            },
+        )
+        with visitor_query_budget("self_service_post"):
+            response = SelfServiceRequest().dispatch(request, temp_visitor.uuid)
+        assert response.status_code == 302
+
+
+@pytest.mark.django_db
+def test_query_budget_exceeded(visitor: Visitor) -> None:
+    with pytest.raises(QueryBudgetExceeded) as ex:
+        with query_budget(1):
+            Visitor.objects.count()
+            Visitor.objects.exists()
+    assert "2 queries executed, budget is 1" in str(ex.value)
+    assert 'SELECT COUNT(*) AS "__count"' in str(ex.value)
+
+
+@pytest.mark.django_db
+def test_query_budget_savepoints(visitor: Visitor) -> None:
+    with query_budget(1):
+        with transaction.atomic():
+            Visitor.objects.count()
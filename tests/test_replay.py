@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import datetime
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils.timezone import now as tz_now
+
+from visitors.models import Visitor, VisitorLog
+from visitors.replay import (
+    SessionClients,
+    default_host,
+    replay,
+    replay_path,
+    summarise,
+)
+
+
+def row(**kwargs: object) -> dict:
+    return {
+        "id": 1,
+        "timestamp": tz_now(),
+        "scope": "foo",
+        "visitor_uuid": None,
+        "session_key": "abc",
+        "http_method": "GET",
+        "request_uri": "/foo/",
+        "query_string": "",
+        "http_user_agent": "",
+        "http_referer": "",
+        "remote_addr": "127.0.0.1",
+        "status_code": 200,
+    } | kwargs
+
+
+def test_session_clients() -> None:
+    clients = SessionClients(max_size=2)
+    client, created = clients.get("a")
+    assert created
+    assert clients.get("a") == (client, False)
+    clients.get("b")
+    clients.get("c")
+    assert list(clients.clients) == ["b", "c"]
+
+
+@pytest.mark.parametrize(
+    "allowed_hosts,host",
+    [
+        (["example.com", "www.example.com"], "example.com"),
+        ([".example.com"], "example.com"),
+        (["*"], "localhost"),
+        ([], "localhost"),
+    ],
+)
+def test_default_host(allowed_hosts: list[str], host: str) -> None:
+    with override_settings(ALLOWED_HOSTS=allowed_hosts):
+        assert default_host() == host
+
+
+class TestReplayPath:
+    def test_new_session(self) -> None:
+        assert replay_path(row(visitor_uuid="123"), True) == "/foo/?vuid=123"
+
+    def test_existing_session(self) -> None:
+        assert replay_path(row(visitor_uuid="123"), False) == "/foo/"
+
+    def test_query_string(self) -> None:
+        assert (
+            replay_path(row(query_string="a=1&vuid=456", visitor_uuid="123"), True)
+            == "/foo/?a=1&vuid=456"
+        )
+
+
+@pytest.mark.django_db
+class TestReplay:
+    def test_replay(self, visitor: Visitor) -> None:
+        rows = [
+            row(id=1, visitor_uuid=visitor.uuid),
+            row(id=2, visitor_uuid=visitor.uuid),
+            row(id=3, scope=None, session_key="xyz", status_code=403),
+        ]
+        results = list(replay(rows))
+        assert [r.status_code for r in results] == [200, 200, 403]
+        # first request looks up the visitor, second uses the session
+        assert results[0].queries > 0
+        summary = summarise(results)
+        assert summary["foo"]["requests"] == 2
+        assert summary["foo"]["status_mismatches"] == 0
+        assert summary[""]["requests"] == 1
+
+    # NB the test runner adds "testserver" to ALLOWED_HOSTS - this replaces it
+    @override_settings(ALLOWED_HOSTS=[".example.com"])
+    def test_replay__allowed_hosts(self, visitor: Visitor) -> None:
+        rows = [row(visitor_uuid=visitor.uuid)]
+        assert [r.status_code for r in replay(rows)] == [200]
+        assert [r.status_code for r in replay(rows, host="other.org")] == [400]
+
+    def test_pacing(self) -> None:
+        delays: list[float] = []
+        start = tz_now()
+        rows = [
+            row(id=1, timestamp=start),
+            row(id=2, timestamp=start + datetime.timedelta(seconds=100)),
+        ]
+        list(replay(rows, speed=10, sleep=delays.append))
+        assert len(delays) == 1
+        assert 9 < delays[0] <= 10
+
+    def test_command(self, visitor: Visitor) -> None:
+        VisitorLog.objects.create(
+            visitor=visitor, session_key="abc", request_uri="/foo/", status_code=200
+        )
+        out = StringIO()
+        with override_settings(ALLOWED_HOSTS=["example.com"]):
+            call_command("replay_visitor_logs", json=True, stdout=out)
+        summary = json.loads(out.getvalue())
+        assert summary[visitor.scope]["requests"] == 1
+        assert summary[visitor.scope]["status_mismatches"] == 0
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import datetime
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.test import RequestFactory
+
+from visitors.decorators import user_is_visitor
+from visitors.models import ScopePolicy, Visitor, VisitorLog
+from visitors.scopes import (
+    LOG_NONE,
+    LOG_SAMPLED,
+    ScopeConfig,
+    ScopeRegistry,
+    scope_registry,
+)
+from visitors.settings import VISITOR_SESSION_EXPIRY, VISITOR_TOKEN_EXPIRY
+
+
+@pytest.fixture(autouse=True)
+def registry() -> Iterator[ScopeRegistry]:
+    scope_registry.invalidate()
+    with mock.patch.object(
+        scope_registry, "definitions", {"foo": {"token_expiry": 60}}
+    ):
+        yield scope_registry
+    scope_registry.invalidate()
+
+
+class TestScopeConfig:
+    def test_should_log(self) -> None:
+        assert ScopeConfig("foo").should_log()
+        assert not ScopeConfig("foo", log_mode=LOG_NONE).should_log()
+        assert not ScopeConfig(
+            "foo", log_mode=LOG_SAMPLED, log_sample_rate=0
+        ).should_log()
+        assert ScopeConfig("foo", log_mode=LOG_SAMPLED, log_sample_rate=1).should_log()
+
+
+@pytest.mark.django_db
+class TestScopeRegistry:
+    def test_settings(self, registry: ScopeRegistry) -> None:
+        assert registry.get("foo") == ScopeConfig("foo", token_expiry=60)
+        assert registry.get("bar") == ScopeConfig("bar")
+        assert registry.get("bar").token_expiry == VISITOR_TOKEN_EXPIRY
+
+    def test_policy(self, registry: ScopeRegistry) -> None:
+        ScopePolicy.objects.create(scope="foo", session_expiry=10)
+        ScopePolicy.objects.create(scope="bar", log_mode=LOG_NONE)
+        assert registry.get("foo") == ScopeConfig(
+            "foo", token_expiry=60, session_expiry=10
+        )
+        assert registry.get("bar") == ScopeConfig("bar", log_mode=LOG_NONE)
+
+    def test_cached(self, registry: ScopeRegistry, django_assert_num_queries) -> None:
+        registry.get("foo")
+        with django_assert_num_queries(0):
+            registry.get("foo")
+            registry.get("bar")
+
+    def test_invalidate(
+        self, registry: ScopeRegistry, django_capture_on_commit_callbacks
+    ) -> None:
+        policy = ScopePolicy.objects.create(scope="foo", token_expiry=10)
+        assert registry.get("foo").token_expiry == 10
+        with django_capture_on_commit_callbacks(execute=True):
+            policy.delete()
+        assert registry.get("foo").token_expiry == 60
+
+    def test_invalidate__on_commit(
+        self, registry: ScopeRegistry, django_capture_on_commit_callbacks
+    ) -> None:
+        registry.get("foo")
+        with mock.patch.object(registry, "invalidate") as invalidate:
+            with django_capture_on_commit_callbacks() as callbacks:
+                policy = ScopePolicy.objects.create(scope="foo", token_expiry=10)
+                policy.delete()
+            # not until the transaction commits
+            invalidate.assert_not_called()
+            for callback in callbacks:
+                callback()
+            assert invalidate.call_count == 2
+
+    def test_version(self, registry: ScopeRegistry) -> None:
+        registry.get("foo")
+        # simulate a change in another process
+        ScopePolicy.objects.bulk_create([ScopePolicy(scope="foo", token_expiry=10)])
+        cache.incr("visitors:scopes:version")
+        assert registry.get("foo").token_expiry == 60
+        registry.checked_at = 0
+        assert registry.get("foo").token_expiry == 10
+
+
+@pytest.mark.django_db
+class TestVisitorScopePolicy:
+    def test_defaults(self) -> None:
+        ScopePolicy.objects.create(scope="foo", session_expiry=10)
+        visitor = Visitor.objects.create(scope="foo")
+        assert visitor.expires_at == visitor.created_at + datetime.timedelta(seconds=60)
+        assert visitor.session_expiry == 10
+        visitor = Visitor.objects.get()
+        assert visitor.session_expiry == 10
+
+    def test_no_policy(self) -> None:
+        visitor = Visitor.objects.create(scope="bar")
+        assert visitor.expires_at == visitor.created_at + Visitor.DEFAULT_TOKEN_EXPIRY
+        assert visitor.session_expiry == VISITOR_SESSION_EXPIRY
+
+    def test_explicit(self) -> None:
+        visitor = Visitor.objects.create(scope="foo", session_expiry=99)
+        assert visitor.session_expiry == 99
+
+    def test_temp_visitor(self) -> None:
+        ScopePolicy.objects.create(scope="foo", session_expiry=10)
+        visitor = Visitor.objects.create_temp_visitor(scope="foo", redirect_to="/")
+        assert visitor.session_expiry == 10
+
+    def test_reactivate(self) -> None:
+        visitor = Visitor.objects.create(scope="foo")
+        visitor.reactivate()
+        assert visitor.expires_at < visitor.created_at + datetime.timedelta(seconds=120)
+
+    def test_logging(
+        self, rf: RequestFactory, visitor: Visitor, django_capture_on_commit_callbacks
+    ) -> None:
+        with django_capture_on_commit_callbacks(execute=True):
+            ScopePolicy.objects.create(scope="foo", log_mode=LOG_NONE)
+
+        @user_is_visitor(scope="foo")
+        def view(request: HttpRequest) -> HttpResponse:
+            return HttpResponse("OK")
+
+        request = rf.get("/")
+        request.user = mock.Mock(is_visitor=True)
+        request.visitor = visitor
+        assert view(request).status_code == 200
+        assert not VisitorLog.objects.exists()
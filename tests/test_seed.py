@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from visitors.management.commands.seed_visitors import parse_scopes
+from visitors.models import Visitor, VisitorLog
+
+
+def test_parse_scopes() -> None:
+    assert parse_scopes("foo:3,bar") == {"foo": 3.0, "bar": 1.0}
+    with pytest.raises(CommandError):
+        parse_scopes("foo:x")
+
+
+@pytest.mark.django_db
+class TestSeedVisitors:
+    def seed(self, **options: object) -> list[tuple]:
+        call_command("seed_visitors", stdout=None, **options)
+        return list(
+            Visitor.objects.order_by("id").values_list(
+                "uuid", "scope", "expires_at", "is_active"
+            )
+        )
+
+    def test_seed(self) -> None:
+        rows = self.seed(
+            visitors=50,
+            scopes={"foo": 1, "bar": 1},
+            batch_size=20,
+            self_service_ratio=0.5,
+        )
+        assert len(rows) == 50
+        assert {r[1] for r in rows} == {"foo", "bar"}
+        assert Visitor.objects.filter(context__has_key="self-service").exists()
+        assert VisitorLog.objects.exists()
+        for log in VisitorLog.objects.select_related("visitor")[:20]:
+            assert log.timestamp >= log.visitor.created_at
+
+    def test_deterministic(self) -> None:
+        first = self.seed(visitors=20, seed=1)
+        logs = VisitorLog.objects.count()
+        Visitor.objects.all().delete()
+        second = self.seed(visitors=20, seed=1)
+        assert [r[:2] + r[3:] for r in first] == [r[:2] + r[3:] for r in second]
+        assert VisitorLog.objects.count() == logs
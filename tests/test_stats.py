@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import datetime
+
+import pytest
+from django.core.management import call_command
+from django.utils.timezone import localdate, now as tz_now
+
+from visitors.models import Visitor, VisitorDailyStats, VisitorLog
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def _log(
+    visitor: Visitor,
+    status_code: int = 200,
+    session_key: str = "abc",
+    remote_addr: str = "127.0.0.1",
+    timestamp: datetime.datetime | None = None,
+) -> VisitorLog:
+    return VisitorLog.objects.create(
+        visitor=visitor,
+        session_key=session_key,
+        http_method="GET",
+        request_uri="/",
+        remote_addr=remote_addr,
+        status_code=status_code,
+        timestamp=timestamp or tz_now(),
+    )
+
+
+@pytest.mark.django_db
+class TestVisitorDailyStats:
+    def test_update_from_logs(self, visitor: Visitor) -> None:
+        _log(visitor)
+        _log(visitor, session_key="def", remote_addr="10.0.0.1")
+        _log(visitor, status_code=404)
+        days = VisitorDailyStats.objects.update_from_logs()
+        assert days == [localdate()]
+        ok = VisitorDailyStats.objects.get(status_class=2)
+        assert ok.scope == "foo"
+        assert ok.visit_count == 2
+        assert ok.distinct_sessions == 2
+        assert ok.distinct_ips == 2
+        assert VisitorDailyStats.objects.get(status_class=4).visit_count == 1
+        assert VisitorDailyStats.objects.watermark() == VisitorLog.objects.last().id
+
+    def test_update_from_logs__incremental(self, visitor: Visitor) -> None:
+        _log(visitor, timestamp=tz_now() - ONE_DAY)
+        assert len(VisitorDailyStats.objects.update_from_logs()) == 1
+        # nothing new - nothing rebuilt
+        assert VisitorDailyStats.objects.update_from_logs() == []
+        _log(visitor)
+        _log(visitor)
+        assert VisitorDailyStats.objects.update_from_logs() == [localdate()]
+        assert VisitorDailyStats.objects.get(date=localdate()).visit_count == 2
+        assert VisitorDailyStats.objects.count() == 2
+
+    def test_query_helpers(self, visitor: Visitor) -> None:
+        other = Visitor.objects.create(email="ginger@example.com", scope="bar")
+        _log(visitor, timestamp=tz_now() - ONE_DAY)
+        _log(visitor)
+        _log(other, status_code=500)
+        VisitorDailyStats.objects.update_from_logs()
+        assert list(VisitorDailyStats.objects.visits_by_scope()) == [
+            {"scope": "bar", "visits": 1},
+            {"scope": "foo", "visits": 2},
+        ]
+        assert list(VisitorDailyStats.objects.status_distribution()) == [
+            {"status_class": 2, "visits": 2},
+            {"status_class": 5, "visits": 1},
+        ]
+        today = VisitorDailyStats.objects.for_period(start=localdate())
+        assert [r["visits"] for r in today.visits_by_day()] == [2]
+
+    def test_command(self, visitor: Visitor) -> None:
+        _log(visitor)
+        call_command("update_visitor_stats")
+        VisitorDailyStats.objects.update(visit_count=0)
+        call_command("update_visitor_stats", days=[localdate().isoformat()])
+        assert VisitorDailyStats.objects.get().visit_count == 1
@@ -5,8 +5,9 @@ from unittest import mock
 from uuid import uuid4
 
 import pytest
+from django.db import IntegrityError
 from django.http import Http404
-from django.test import RequestFactory
+from django.test import Client, RequestFactory
 from django.urls import reverse
 from django.utils.timezone import now as tz_now
 
@@ -110,6 +111,126 @@ class TestSelfService:
             kwargs={"visitor_uuid": temp_visitor.uuid},
         )
 
+    def test_post_double_submit(
+        self, rf: RequestFactory, temp_visitor: Visitor
+    ) -> None:
+        data = {
+            "vuid": temp_visitor.uuid,
+            "first_name": "Henry",
+            "last_name": "Root",
+            "email": "henry@altavista.com",
+        }
+        # both requests load (and validate) the pass before either activates it
+        first, second = SelfServiceRequest(), SelfServiceRequest()
+        first.visitor = Visitor.objects.get(pk=temp_visitor.pk)
+        second.visitor = Visitor.objects.get(pk=temp_visitor.pk)
+        with mock.patch("visitors.views.self_service_visitor_created") as signal:
+            resp = first.post(rf.post("/", data), visitor_uuid=temp_visitor.uuid)
+            assert resp.status_code == 302
+            with pytest.raises(InvalidVisitorPass):
+                second.post(rf.post("/", data), visitor_uuid=temp_visitor.uuid)
+        signal.send.assert_called_once()
+
+    def test_post_existing_pass(self, client: Client, temp_visitor: Visitor) -> None:
+        existing = Visitor.objects.create(email="Henry@altavista.com", scope="foo")
+        url = reverse(
+            "visitors:self-service", kwargs={"visitor_uuid": temp_visitor.uuid}
+        )
+        data = {
+            "vuid": temp_visitor.uuid,
+            "first_name": "Henry",
+            "last_name": "Root",
+            "email": "henry@altavista.com",
+        }
+        with (
+            mock.patch("visitors.views.self_service_visitor_created") as created,
+            mock.patch("visitors.views.self_service_visitor_exists") as exists,
+        ):
+            resp = client.post(url, data, follow=True)
+        # the requester gets the same success page, but never the existing pass
+        assert resp.redirect_chain == [
+            (
+                reverse(
+                    "visitors:self-service-success",
+                    kwargs={"visitor_uuid": temp_visitor.uuid},
+                ),
+                302,
+            )
+        ]
+        assert str(existing.uuid) not in resp.content.decode()
+        created.send.assert_not_called()
+        exists.send.assert_called_once_with(sender=SelfServiceRequest, visitor=existing)
+        temp_visitor.refresh_from_db()
+        assert not temp_visitor.is_active
+
+    def test_post_existing_pass__race(
+        self, rf: RequestFactory, temp_visitor: Visitor
+    ) -> None:
+        expired = Visitor.objects.create(
+            email="henry@altavista.com",
+            scope="foo",
+            expires_at=tz_now() - timedelta(days=1),
+        )
+        request = rf.post(
+            "/",
+            {
+                "vuid": temp_visitor.uuid,
+                "first_name": "Henry",
+                "last_name": "Root",
+                "email": "henry@altavista.com",
+            },
+        )
+        # another request replaces the expired pass before this one can
+        winner = Visitor(email="henry@altavista.com", scope="foo")
+        with (
+            mock.patch.object(
+                Visitor, "activate", side_effect=[IntegrityError, IntegrityError]
+            ),
+            mock.patch.object(
+                SelfServiceRequest, "get_existing_pass", side_effect=[expired, winner]
+            ),
+            mock.patch("visitors.views.self_service_visitor_created") as created,
+            mock.patch("visitors.views.self_service_visitor_exists") as exists,
+        ):
+            resp = SelfServiceRequest().dispatch(
+                request, visitor_uuid=temp_visitor.uuid
+            )
+        assert resp.status_code == 302
+        assert resp.url == reverse(
+            "visitors:self-service-success",
+            kwargs={"visitor_uuid": temp_visitor.uuid},
+        )
+        created.send.assert_not_called()
+        exists.send.assert_called_once_with(sender=SelfServiceRequest, visitor=winner)
+
+    def test_post_existing_pass__expired(
+        self, rf: RequestFactory, temp_visitor: Visitor
+    ) -> None:
+        existing = Visitor.objects.create(
+            email="Henry@altavista.com",
+            scope="foo",
+            expires_at=tz_now() - timedelta(days=1),
+        )
+        request = rf.post(
+            "/",
+            {
+                "vuid": temp_visitor.uuid,
+                "first_name": "Henry",
+                "last_name": "Root",
+                "email": "henry@altavista.com",
+            },
+        )
+        view = SelfServiceRequest()
+        with mock.patch("visitors.views.self_service_visitor_created") as signal:
+            resp = view.dispatch(request, visitor_uuid=temp_visitor.uuid)
+        assert resp.status_code == 302
+        signal.send.assert_called_once()
+        # the expired pass is replaced
+        existing.refresh_from_db()
+        temp_visitor.refresh_from_db()
+        assert not existing.is_active
+        assert temp_visitor.is_active
+
     def test_post_invalid(self, rf: RequestFactory, temp_visitor: Visitor) -> None:
         assert not temp_visitor.is_active
         request = rf.post(
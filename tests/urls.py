@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from . import views
+
 admin.autodiscover()
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("visitors", include("visitors.urls")),
+    path("foo/", views.foo),
 ]
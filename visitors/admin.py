@@ -1,13 +1,26 @@
 from __future__ import annotations
 
 import json
+import uuid
+from typing import Any
 
 from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Model, Q
+from django.db.models.functions import Lower
 from django.db.models.query import QuerySet
+from django.http import HttpResponse, StreamingHttpResponse
 from django.http.request import HttpRequest
+from django.template.response import TemplateResponse
+from django.urls import URLPattern, path
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 
-from .models import Visitor, VisitorLog
+from . import profiling
+from .dashboard import get_dashboard
+from .export import iter_csv, iter_logs
+from .models import ScopePolicy, Visitor, VisitorLog
 
 
 def pretty_print(data: dict | None) -> str:
@@ -19,6 +32,66 @@ def pretty_print(data: dict | None) -> str:
     return format_html("<pre><code>%s</code></pre>", html)
 
 
+def estimated_count(model: type[Model], using: str = "default") -> int | None:
+    """Return the planner's estimate of the table row count (PostgreSQL only)."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE relname = %s",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 for tables that have never been analyzed
+    return int(row[0]) if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids COUNT(*) on large, unfiltered, tables.
+
+    If the queryset is unfiltered, and the database can provide an estimate
+    of the table size that is above ESTIMATE_THRESHOLD, then that is used in
+    place of an exact count. Filtered querysets are always counted.
+
+    """
+
+    ESTIMATE_THRESHOLD = 10_000
+
+    @cached_property
+    def count(self) -> int:
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and not qs.query.where:
+            estimate = estimated_count(qs.model, using=qs.db)
+            if estimate and estimate > self.ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def search_prefix(queryset: QuerySet, search_term: str) -> QuerySet:
+    """
+    Return Visitor queryset filtered on exact uuid, or email / scope prefix.
+
+    Each lookup can use an index - the uuid is unique, the email prefix
+    (case-insensitive) is lower(email) LIKE 'term%', served by the pattern
+    ops index added in migration 0018, and the scope prefix (case-sensitive)
+    is served by the scope "_like" index. The admin's own search_fields
+    lookups (istartswith) compile to UPPER(col) LIKE UPPER(...), which
+    cannot use a btree index.
+
+    """
+    term = search_term.strip()
+    try:
+        return queryset.filter(uuid=uuid.UUID(term))
+    except ValueError:
+        pass
+    prefix = Q(email_lower__startswith=term.lower())
+    if "@" not in term:
+        prefix |= Q(scope__startswith=term)
+    return queryset.alias(email_lower=Lower("email")).filter(prefix)
+
+
 @admin.register(Visitor)
 class VisitorsAdmin(admin.ModelAdmin):
     """Admin model for Visitor objects."""
@@ -36,17 +109,47 @@ class VisitorsAdmin(admin.ModelAdmin):
 
     def reactivate(self, request: HttpRequest, queryset: QuerySet) -> None:
         """Reactivate all selected Visitor objects."""
-        count = queryset.count()
+        count = 0
+        conflicts = []
         for obj in queryset:
-            obj.reactivate()
+            try:
+                with transaction.atomic():
+                    obj.reactivate()
+            except IntegrityError:
+                # there is already another active pass for this email & scope
+                conflicts.append(obj)
+            else:
+                count += 1
         self.message_user(
             request, f"{count} passes have been activated.", messages.SUCCESS
         )
+        if conflicts:
+            emails = ", ".join(sorted({f"{v.email} ({v.scope})" for v in conflicts}))
+            self.message_user(
+                request,
+                f"{len(conflicts)} passes could not be activated as there is "
+                f"already an active pass for the same email and scope: {emails}",
+                messages.WARNING,
+            )
 
     reactivate.short_description = "Reactivate selected Visitor passes"  # type: ignore
 
-    actions = (deactivate, reactivate)
-    list_filter = ("scope",)
+    def export_logs(
+        self, request: HttpRequest, queryset: QuerySet
+    ) -> StreamingHttpResponse:
+        """Stream the VisitorLog records for the selected visitors as CSV."""
+        logs = VisitorLog.objects.filter(visitor__in=queryset)
+        return StreamingHttpResponse(
+            iter_csv(iter_logs(logs)),
+            content_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="visitor_logs.csv"'},
+        )
+
+    export_logs.short_description = "Export logs for selected Visitor passes"  # type: ignore
+
+    actions = (deactivate, reactivate, export_logs)
+    date_hierarchy = "created_at"
+    list_filter = ("scope", "shared_suspected")
     list_display = (
         "scope",
         "email",
@@ -63,19 +166,66 @@ class VisitorsAdmin(admin.ModelAdmin):
         "is_active",
         "expires_at",
         "session_expiry",
+        "shared_suspected",
     )
-    search_fields = (
-        "first_name",
-        "last_name",
-        "email",
-        "scope",
-        "created_at",
-    )
+    # NB searches are handled by get_search_results (see search_prefix) -
+    # search_fields must be set for the admin to show the search box.
+    search_fields = ("uuid", "email", "scope")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        return super().get_queryset(request).with_validity()
+
+    def get_urls(self) -> list[URLPattern]:
+        return [
+            path(
+                "dashboard/",
+                self.admin_site.admin_view(self.dashboard_view),
+                name="visitors_visitor_dashboard",
+            ),
+            path(
+                "profiling/",
+                self.admin_site.admin_view(self.profiling_view),
+                name="visitors_visitor_profiling",
+            ),
+            *super().get_urls(),
+        ]
 
-    def _is_valid(self, obj: Visitor) -> bool:
-        return obj.is_valid
+    def dashboard_view(self, request: HttpRequest) -> HttpResponse:
+        """Render the (cached) visitor pass stats."""
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Visitor pass dashboard",
+            "stats": get_dashboard(),
+        }
+        return TemplateResponse(request, "admin/visitors/dashboard.html", context)
+
+    def profiling_view(self, request: HttpRequest) -> HttpResponse:
+        """Render the most recent visitor-layer request profiles."""
+        order_by = request.GET.get("o", "total")
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Visitor request profiles",
+            "order_by": order_by,
+            "profiles": profiling.slowest(order_by),
+        }
+        return TemplateResponse(request, "admin/visitors/profiling.html", context)
+
+    def get_search_results(
+        self, request: HttpRequest, queryset: QuerySet, search_term: str
+    ) -> tuple[QuerySet, bool]:
+        if not search_term.strip():
+            return queryset, False
+        return search_prefix(queryset, search_term), False
+
+    def _is_valid(self, obj: Any) -> bool:
+        return obj.is_valid_now
 
     _is_valid.boolean = True  # type: ignore
+    _is_valid.admin_order_field = "is_valid_now"  # type: ignore
 
     def _context(self, obj: Visitor) -> str:
         return pretty_print(obj.context)
@@ -85,13 +235,59 @@ class VisitorsAdmin(admin.ModelAdmin):
 
 @admin.register(VisitorLog)
 class VisitorLogAdmin(admin.ModelAdmin):
+    date_hierarchy = "timestamp"
     list_display = (
         "visitor",
         "session_key",
         "remote_addr",
         "request_uri",
         "status_code",
+        "user_agent",
         "timestamp",
     )
-    readonly_fields = [f.name for f in VisitorLog._meta.fields]
-    pass
+    list_select_related = ("visitor", "interned_user_agent")
+    # user_agent / referer read the header from wherever it is stored (see
+    # VISITOR_LOG_INTERN_HEADERS) - the raw fields are blank for interned logs
+    readonly_fields = [
+        *(f.name for f in VisitorLog._meta.fields),
+        "user_agent",
+        "referer",
+    ]
+    # NB searches are handled by get_search_results - search_fields must be
+    # set for the admin to show the search box.
+    search_fields = ("visitor__uuid",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(
+        self, request: HttpRequest, queryset: QuerySet, search_term: str
+    ) -> tuple[QuerySet, bool]:
+        """
+        Search logs by exact visitor uuid only.
+
+        The admin's "=visitor__uuid" lookup is iexact, which compiles to a
+        (non-indexed) LIKE, and session_key and remote_addr are not indexed
+        on what is usually the largest table - use the export command for
+        these instead.
+
+        """
+        if not (term := search_term.strip()):
+            return queryset, False
+        try:
+            return queryset.filter(visitor__uuid=uuid.UUID(term)), False
+        except ValueError:
+            return queryset.none(), False
+
+
+@admin.register(ScopePolicy)
+class ScopePolicyAdmin(admin.ModelAdmin):
+    list_display = (
+        "scope",
+        "token_expiry",
+        "session_expiry",
+        "log_mode",
+        "log_sample_rate",
+        "last_updated_at",
+    )
+    search_fields = ("scope",)
+    readonly_fields = ("last_updated_at",)
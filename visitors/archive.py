@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.query import QuerySet
+from django.utils.timezone import now as tz_now
+
+from .export import iter_logs
+from .models import Visitor, VisitorLog
+
+# default number of visitors archived per segment file
+ARCHIVE_BATCH_SIZE = 500
+
+# the index is sharded by key - each visitor has an entry in the shard for
+# the first INDEX_SHARD_CHARS characters of its uuid, and of the hash of its
+# email - so that a lookup reads a single (small) shard file rather than an
+# index of the whole archive.
+INDEX_DIRNAME = "index"
+INDEX_SHARD_CHARS = 2
+
+
+def _uuid_shard(uuid: str) -> str:
+    """Return the index shard (path) for a visitor uuid."""
+    return f"{INDEX_DIRNAME}/uuid/{uuid[:INDEX_SHARD_CHARS]}.jsonl"
+
+
+def _email_shard(email: str) -> str:
+    """Return the index shard (path) for a (lowercased) email."""
+    digest = hashlib.blake2b(email.encode(), digest_size=16).hexdigest()
+    return f"{INDEX_DIRNAME}/email/{digest[:INDEX_SHARD_CHARS]}.jsonl"
+
+
+def _fsync_write(path: Path, data: bytes, mode: str = "wb") -> None:
+    with open(path, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def archive_visitors(
+    queryset: QuerySet, path: str | Path, batch_size: int = ARCHIVE_BATCH_SIZE
+) -> Iterator[int]:
+    """
+    Move visitors (and their logs) out of the database into archive files.
+
+    Visitors are processed in primary key batches. Each batch is written
+    to a gzipped JSON Lines "segment" file (one line per visitor, with
+    their logs embedded), and an entry for each visitor is appended to
+    its uuid and email index shards (used to look up visitors by uuid or
+    email) before the batch is deleted from the database. Files are
+    fsync'd before the delete, so a failure can at worst leave a visitor
+    in both places.
+
+    Yields the number of visitors archived in each batch.
+
+    """
+    path = Path(path)
+    for kind in ("uuid", "email"):
+        (path / INDEX_DIRNAME / kind).mkdir(parents=True, exist_ok=True)
+    qs = queryset.order_by("id")
+    last_id = 0
+    while ids := list(
+        qs.filter(id__gt=last_id).values_list("id", flat=True)[:batch_size]
+    ):
+        visitors = list(Visitor.objects.filter(id__in=ids).order_by("id").values())
+        logs: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        for log in iter_logs(VisitorLog.objects.filter(visitor_id__in=ids)):
+            logs[str(log["visitor_uuid"])].append(log)
+        segment = f"segment-{tz_now():%Y%m%d%H%M%S}-{ids[0]}.jsonl.gz"
+        lines = [
+            json.dumps(
+                {"visitor": v, "logs": logs[str(v["uuid"])]}, cls=DjangoJSONEncoder
+            )
+            for v in visitors
+        ]
+        _fsync_write(path / segment, gzip.compress("\n".join(lines).encode()))
+        shards: dict[str, list[str]] = defaultdict(list)
+        for v in visitors:
+            uuid, email = str(v["uuid"]), v["email"].lower()
+            entry = json.dumps({"uuid": uuid, "email": email, "segment": segment})
+            shards[_uuid_shard(uuid)].append(entry + "\n")
+            # anonymised passes have no email to look up
+            if email:
+                shards[_email_shard(email)].append(entry + "\n")
+        for shard, entries in shards.items():
+            _fsync_write(path / shard, "".join(entries).encode(), mode="ab")
+        with transaction.atomic():
+            VisitorLog.objects.filter(visitor_id__in=ids).delete()
+            Visitor.objects.filter(id__in=ids).delete()
+        last_id = ids[-1]
+        yield len(ids)
+
+
+class VisitorArchive:
+    """
+    Read-only access to archived visitor passes.
+
+    Lookups read a single index shard to find the relevant segment file,
+    so only that segment is decompressed - nothing is restored to the
+    database.
+
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def _index(self, shard: str) -> Iterator[dict[str, str]]:
+        index = self.path / shard
+        if not index.exists():
+            return
+        with open(index) as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _read(self, segment: str, uuid: str) -> dict[str, Any] | None:
+        with gzip.open(self.path / segment, "rt") as f:
+            for line in f:
+                if (record := json.loads(line))["visitor"]["uuid"] == uuid:
+                    return record
+        return None
+
+    def get(self, uuid: str) -> dict[str, Any] | None:
+        """Return the archived visitor (and logs) with the given uuid."""
+        uuid = str(uuid)
+        for entry in self._index(_uuid_shard(uuid)):
+            if entry["uuid"] == uuid:
+                return self._read(entry["segment"], uuid)
+        return None
+
+    def filter_email(self, email: str) -> list[dict[str, Any]]:
+        """Return all archived visitors (and logs) with the given email."""
+        email = email.lower()
+        return [
+            record
+            for entry in self._index(_email_shard(email))
+            if entry["email"] == email
+            and (record := self._read(entry["segment"], entry["uuid"]))
+        ]
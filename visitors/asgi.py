@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from http.cookies import SimpleCookie
+from importlib import import_module
+from typing import Any, Awaitable, Callable
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .models import InvalidVisitorPass, Visitor
+from .settings import (
+    VISITOR_QUERYSTRING_KEY,
+    VISITOR_SESSION_KEY,
+    VISITOR_WEBSOCKET_REVALIDATE_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# for typing
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+# close code sent when a visitor pass is revoked, or expires, mid-connection
+# (4000-4999 are reserved for application use)
+CLOSE_CODE_INVALID_PASS = 4403
+
+
+def _cookie(scope: Scope, name: str) -> str:
+    for key, value in scope.get("headers", []):
+        if key == b"cookie":
+            cookie = SimpleCookie(value.decode("latin-1"))
+            if name in cookie:
+                return cookie[name].value
+    return ""
+
+
+def get_token_visitor(visitor_uuid: str) -> Visitor | None:
+    """Return valid Visitor from a querystring token."""
+    try:
+        visitor = Visitor.objects.get(uuid=visitor_uuid)
+        visitor.validate()
+    except (Visitor.DoesNotExist, ValidationError, InvalidVisitorPass) as ex:
+        logger.debug("Invalid websocket visitor token: %s", ex)
+        return None
+    return visitor
+
+
+def get_session_visitor(session_key: str) -> Visitor | None:
+    """Return the active Visitor stashed in a session."""
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    if not (visitor_uuid := session.get(VISITOR_SESSION_KEY)):
+        return None
+    try:
+        return Visitor.objects.get(uuid=visitor_uuid, is_active=True)
+    except (Visitor.DoesNotExist, ValidationError):
+        return None
+
+
+def get_querystring_token(scope: Scope) -> str:
+    """Return the visitor token from the connection querystring, or ''."""
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get(VISITOR_QUERYSTRING_KEY, [""])[0]
+
+
+def resolve_visitor(scope: Scope) -> Visitor | None:
+    """
+    Return the Visitor for a connection scope, or None.
+
+    Mirrors the HTTP middleware - a token on the querystring takes
+    precedence over a visitor stashed in the session.
+
+    """
+    if visitor_uuid := get_querystring_token(scope):
+        return get_token_visitor(visitor_uuid)
+    if session_key := _cookie(scope, settings.SESSION_COOKIE_NAME):
+        return get_session_visitor(session_key)
+    return None
+
+
+def is_still_valid(visitor: Visitor, check_expiry: bool = True) -> bool:
+    """
+    Return True if the pass is still valid (in the db).
+
+    Passes must be active, and unless check_expiry is False, unexpired. The
+    same rules apply as when the visitor was resolved - a session visitor
+    only needs to be active, as with the HTTP session middleware.
+
+    """
+    visitors = Visitor.objects.valid() if check_expiry else Visitor.objects.all()
+    return visitors.filter(pk=visitor.pk, is_active=True).exists()
+
+
+class VisitorWebSocketMiddleware:
+    """
+    Authenticate visitors on WebSocket connections.
+
+    The visitor is resolved once, when the connection is opened, from the
+    `vuid` querystring param or the session cookie, and is stored as
+    scope["visitor"] (None if there is no valid visitor). While the
+    connection is open the pass is re-checked every `revalidate_interval`
+    seconds - not on each message - and if it is no longer valid
+    scope["visitor"] is set to None, and the connection is closed with code
+    4403. The same rules are used as on connect: a querystring token must be
+    active and unexpired, a session visitor need only be active.
+
+    Other connection types are passed through untouched.
+
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        revalidate_interval: float = VISITOR_WEBSOCKET_REVALIDATE_INTERVAL,
+    ):
+        self.app = app
+        self.revalidate_interval = revalidate_interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "websocket":
+            return await self.app(scope, receive, send)
+        visitor = await sync_to_async(resolve_visitor)(scope)
+        scope = dict(scope, visitor=visitor)
+        if not (visitor and self.revalidate_interval):
+            return await self.app(scope, receive, send)
+        check_expiry = bool(get_querystring_token(scope))
+        task = asyncio.create_task(self.revalidate(scope, send, check_expiry))
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            task.cancel()
+
+    async def revalidate(
+        self, scope: Scope, send: Send, check_expiry: bool = True
+    ) -> None:
+        """Close the connection once the visitor pass is no longer valid."""
+        visitor = scope["visitor"]
+        while True:
+            await asyncio.sleep(self.revalidate_interval)
+            if not await sync_to_async(is_still_valid)(visitor, check_expiry):
+                logger.debug("Closing websocket - invalid visitor: %s", visitor)
+                scope["visitor"] = None
+                await send({"type": "websocket.close", "code": CLOSE_CODE_INVALID_PASS})
+                return
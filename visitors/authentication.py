@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http.request import HttpRequest
+
+from . import metrics
+from .models import InvalidVisitorPass, Visitor
+
+logger = logging.getLogger(__name__)
+
+# Authorization header scheme - "Authorization: Visitor <token>"
+AUTHORIZATION_SCHEME = "Visitor"
+
+
+def get_header_token(request: HttpRequest) -> str:
+    """Return the visitor token from the Authorization header, or ''."""
+    scheme, _, token = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if scheme.lower() != AUTHORIZATION_SCHEME.lower():
+        return ""
+    return token.strip()
+
+
+def authenticate_token(token: str) -> Visitor | None:
+    """
+    Return the valid Visitor for a header token, or None.
+
+    The Visitor is fetched using Visitor.objects.get_cached, so repeat calls
+    with the same token do not hit the database. Raises ValidationError if
+    the token is malformed.
+
+    """
+    try:
+        visitor = Visitor.objects.get_cached(token)
+        visitor.validate()
+    except Visitor.DoesNotExist:
+        metrics.TOKEN_LOOKUPS.inc(result="miss")
+        logger.debug("Visitor pass does not exist: %s", token)
+        return None
+    except InvalidVisitorPass as ex:
+        metrics.TOKEN_LOOKUPS.inc(result="invalid")
+        logger.debug("Invalid access request: %s", ex)
+        return None
+    metrics.TOKEN_LOOKUPS.inc(result="hit")
+    return visitor
+
+
+class VisitorTokenAuthentication:
+    """
+    Authenticate API requests using the "Authorization: Visitor" header.
+
+    This implements the Django REST Framework authentication class interface
+    (it can be added to DEFAULT_AUTHENTICATION_CLASSES, or a view's
+    authentication_classes) without depending on DRF. On success it sets
+    `request.visitor` and `request.user.is_visitor` on the underlying
+    HttpRequest, so the `user_is_visitor` decorator works unchanged. The
+    session is not used.
+
+    """
+
+    def authenticate(self, request: Any) -> tuple[Any, Visitor] | None:
+        # DRF passes its own Request object, which wraps the HttpRequest
+        http_request = getattr(request, "_request", request)
+        if not (token := get_header_token(http_request)):
+            return None
+        try:
+            visitor = authenticate_token(token)
+        except ValidationError as ex:
+            raise PermissionDenied("Malformed visitor token.") from ex
+        if not visitor:
+            raise PermissionDenied("Invalid visitor token.")
+        user = getattr(http_request, "user", None) or AnonymousUser()
+        user.is_visitor = True
+        http_request.visitor = visitor
+        return user, visitor
+
+    def authenticate_header(self, request: Any) -> str:
+        return AUTHORIZATION_SCHEME
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import datetime
+import functools
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import IO, Any
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils.module_loading import import_string
+
+from . import partitions
+from .models import VisitorLog
+from .settings import VISITOR_LOG_BACKEND, VISITOR_LOG_BACKEND_OPTIONS
+
+# for typing - a single log record, as returned by VisitorLog.objects.build_record
+LogRecord = dict[str, Any]
+
+
+class BaseLogBackend:
+    """
+    Base class for VisitorLog storage backends.
+
+    Backends receive records (dicts) with the same schema as VisitorLog
+    (plus the visitor uuid), in batches. Subclasses must implement the
+    `write` method.
+
+    """
+
+    def write(self, records: list[LogRecord]) -> None:
+        """Store a batch of log records."""
+        raise NotImplementedError
+
+    def write_one(self, record: LogRecord) -> VisitorLog | None:
+        """Store a single log record."""
+        self.write([record])
+        return None
+
+    def close(self) -> None:
+        """Release any resources held by the backend."""
+
+
+class DatabaseBackend(BaseLogBackend):
+    """Store log records as VisitorLog objects (the default)."""
+
+    def write(self, records: list[LogRecord]) -> None:
+        VisitorLog.objects.bulk_create(
+            [VisitorLog.objects.from_record(r) for r in records]
+        )
+
+    def write_one(self, record: LogRecord) -> VisitorLog:
+        log = VisitorLog.objects.from_record(record)
+        log.save(force_insert=True)
+        return log
+
+
+class PartitionedDatabaseBackend(BaseLogBackend):
+    """
+    Store log records in monthly VisitorLog partition tables.
+
+    Each record is routed to the table for its (UTC) month - see
+    visitors.partitions. Partitions should be created ahead of time with
+    the `visitor_log_partitions` command, but missing partitions will be
+    created on demand. Retention is then a matter of dropping whole tables
+    rather than deleting rows.
+
+    """
+
+    def __init__(self) -> None:
+        self.known_tables: set[str] = set()
+
+    def _get_model(self, timestamp: datetime.datetime) -> type[models.Model]:
+        table = partitions.partition_table(timestamp)
+        if table not in self.known_tables:
+            partitions.create_partition(timestamp)
+            self.known_tables.add(table)
+        return partitions.get_partition_model(table)
+
+    def write(self, records: list[LogRecord]) -> None:
+        batches: dict[type[models.Model], list[models.Model]] = defaultdict(list)
+        for record in records:
+            log = VisitorLog.objects.from_record(record)
+            model = self._get_model(log.timestamp)
+            batches[model].append(
+                model(
+                    **{
+                        f.attname: getattr(log, f.attname)
+                        for f in VisitorLog._meta.concrete_fields
+                        if not f.primary_key
+                    }
+                )
+            )
+        for model, objs in batches.items():
+            model.objects.bulk_create(objs)
+
+
+class JsonLinesBackend(BaseLogBackend):
+    """
+    Append log records to a size-rotated JSON Lines file.
+
+    The `path` may contain a `{pid}` placeholder, which is replaced with the
+    process id - rotation is not safe across processes, so in a multi-process
+    server each process should write to its own file.
+
+    The `sync` option controls durability:
+
+    * "never": writes are buffered (`buffer_size` bytes) and reach the file
+      when the buffer is full, or the backend is closed
+    * "flush": each batch is flushed to the OS (the default)
+    * "fsync": each batch is flushed and fsync'd to disk
+
+    """
+
+    SYNC_OPTIONS = ("never", "flush", "fsync")
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        buffer_size: int = 64 * 1024,
+        sync: str = "flush",
+    ) -> None:
+        if sync not in self.SYNC_OPTIONS:
+            raise ValueError(f"Invalid sync option: {sync}")
+        self.path = path.format(pid=os.getpid())
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self.sync = sync
+        self.lock = threading.Lock()
+        self.stream: IO[str] | None = None
+        self.size = 0
+
+    def _open(self) -> IO[str]:
+        if not self.stream:
+            self.stream = open(
+                self.path, "a", buffering=self.buffer_size, encoding="utf-8"
+            )
+            self.size = self.stream.tell()
+        return self.stream
+
+    def _rotate(self) -> None:
+        self.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, records: list[LogRecord]) -> None:
+        data = "".join(json.dumps(r, cls=DjangoJSONEncoder) + "\n" for r in records)
+        with self.lock:
+            stream = self._open()
+            # max_bytes is a byte limit - count the encoded size, not characters
+            size = len(data.encode("utf-8"))
+            if self.size and self.size + size > self.max_bytes:
+                self._rotate()
+                stream = self._open()
+            stream.write(data)
+            self.size += size
+            if self.sync != "never":
+                stream.flush()
+            if self.sync == "fsync":
+                os.fsync(stream.fileno())
+
+    def close(self) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+
+class LoggingBackend(BaseLogBackend):
+    """
+    Emit log records via the stdlib logging module.
+
+    Each record is logged as a JSON message, and is also available to
+    handlers / formatters as the `visitor_log` attribute of the LogRecord.
+
+    """
+
+    def __init__(self, logger: str = "visitors.log", level: int = logging.INFO):
+        self.logger = logging.getLogger(logger)
+        self.level = level
+
+    def write(self, records: list[LogRecord]) -> None:
+        if not self.logger.isEnabledFor(self.level):
+            return
+        for record in records:
+            self.logger.log(
+                self.level,
+                json.dumps(record, cls=DjangoJSONEncoder),
+                extra={"visitor_log": record},
+            )
+
+
+@functools.cache
+def get_log_backend() -> BaseLogBackend:
+    """Return the configured VisitorLog backend (created once per process)."""
+    return import_string(VISITOR_LOG_BACKEND)(**VISITOR_LOG_BACKEND_OPTIONS)
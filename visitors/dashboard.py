@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import datetime
+import threading
+from typing import Any
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Q
+from django.db.models.functions import Now
+from django.utils.timezone import localdate, now as tz_now
+
+from .models import Visitor, VisitorDailyStats, valid_q
+from .settings import VISITOR_DASHBOARD_CACHE_TIMEOUT
+
+DASHBOARD_CACHE_KEY = "visitors:dashboard"
+
+# held while the stats are being refreshed in the background
+DASHBOARD_REFRESH_LOCK_KEY = "visitors:dashboard:refreshing"
+DASHBOARD_REFRESH_LOCK_TIMEOUT = 300
+
+# number of days covered by the self-service and visit volume stats
+DASHBOARD_PERIOD_DAYS = 7
+
+
+def compute_dashboard() -> dict[str, Any]:
+    """Calculate the dashboard stats (this runs aggregate queries)."""
+    now = tz_now()
+    today = localdate(now)
+    since = now - datetime.timedelta(days=DASHBOARD_PERIOD_DAYS)
+    scopes = list(
+        Visitor.objects.values("scope")
+        .annotate(
+            valid=Count("id", filter=valid_q()),
+            expired=Count("id", filter=Q(is_active=True, expires_at__lt=Now())),
+            inactive=Count("id", filter=Q(is_active=False)),
+            expiring_today=Count("id", filter=valid_q() & Q(expires_at__date=today)),
+        )
+        .order_by("scope")
+    )
+    self_service = Visitor.objects.filter(
+        **{"context__self-service": True}, created_at__gte=since
+    ).aggregate(
+        created=Count("id"),
+        # self-service passes are created with a placeholder email, which is
+        # replaced when the visitor activates the pass (and blanked if the
+        # pass is anonymised).
+        activated=Count(
+            "id", filter=~Q(email__in=[Visitor.DEFAULT_SELF_SERVICE_EMAIL, ""])
+        ),
+    )
+    visits = list(
+        VisitorDailyStats.objects.for_period(start=localdate(since)).visits_by_scope()
+    )
+    return {
+        "computed_at": now,
+        "period_days": DASHBOARD_PERIOD_DAYS,
+        "scopes": scopes,
+        "self_service": self_service,
+        "visits": visits,
+    }
+
+
+def refresh_dashboard() -> dict[str, Any]:
+    """Recalculate the dashboard stats and store them in the cache."""
+    stats = compute_dashboard()
+    # stored without a timeout - stale stats are served while they are
+    # refreshed (see get_dashboard)
+    cache.set(DASHBOARD_CACHE_KEY, stats, None)
+    return stats
+
+
+def _refresh_in_background() -> None:
+    try:
+        refresh_dashboard()
+    finally:
+        cache.delete(DASHBOARD_REFRESH_LOCK_KEY)
+        connections.close_all()
+
+
+def is_stale(stats: dict[str, Any]) -> bool:
+    """Return True if the stats are older than VISITOR_DASHBOARD_CACHE_TIMEOUT."""
+    age = tz_now() - stats["computed_at"]
+    return age > datetime.timedelta(seconds=VISITOR_DASHBOARD_CACHE_TIMEOUT)
+
+
+def get_dashboard() -> dict[str, Any]:
+    """
+    Return the stored dashboard stats.
+
+    If the stats are older than VISITOR_DASHBOARD_CACHE_TIMEOUT they are
+    still returned, and refreshed in a background thread (one at a time),
+    so the page does not wait for the aggregate queries. Only if there are
+    no stored stats at all are they calculated within the request.
+
+    """
+    if (stats := cache.get(DASHBOARD_CACHE_KEY)) is None:
+        return refresh_dashboard()
+    if is_stale(stats) and cache.add(
+        DASHBOARD_REFRESH_LOCK_KEY, True, DASHBOARD_REFRESH_LOCK_TIMEOUT
+    ):
+        threading.Thread(target=_refresh_in_background, daemon=True).start()
+    return stats
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import fnmatch
 import functools
 import logging
-from typing import Any, Callable
+import re
+from typing import Any, Callable, Iterable
 
 from django.conf import settings
 from django.http import HttpRequest, HttpResponse
@@ -10,9 +12,9 @@ from django.http.response import HttpResponseRedirect
 from django.urls import reverse
 from django.utils.translation import gettext as _
 
+from . import metrics, profiling
 from .exceptions import VisitorAccessDenied
 from .models import Visitor, VisitorLog
-from .settings import VISITOR_SESSION_EXPIRY
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +25,52 @@ SCOPE_ANY = "*"
 BypassFunc = Callable[[HttpRequest], bool]
 
 
+class ScopeMatcher:
+    """
+    Match visitor scopes against a set of scope names and glob patterns.
+
+    Patterns (containing any of "*?[") use fnmatch syntax - e.g.
+    "reference:*". Exact names are stored in a set, and the patterns are
+    compiled into a single regex, so the cost of a match does not depend
+    on the number of scopes. SCOPE_ANY matches everything.
+
+    """
+
+    def __init__(self, scopes: str | Iterable[str]) -> None:
+        self.scopes = [scopes] if isinstance(scopes, str) else list(scopes)
+        if not self.scopes or not all(self.scopes):
+            raise ValueError("Decorator scope cannot be empty.")
+        self.match_any = SCOPE_ANY in self.scopes
+        self.exact = frozenset(s for s in self.scopes if not _is_pattern(s))
+        patterns = [fnmatch.translate(s) for s in self.scopes if _is_pattern(s)]
+        self.regex = re.compile("|".join(patterns)) if patterns else None
+
+    def __str__(self) -> str:
+        return ",".join(self.scopes)
+
+    def __call__(self, visitor_scopes: Iterable[str]) -> bool:
+        """Return True if any of the visitor scopes match."""
+        if self.match_any:
+            return True
+        return any(
+            scope in self.exact or (self.regex and self.regex.match(scope))
+            for scope in visitor_scopes
+        )
+
+    @property
+    def default_scope(self) -> str:
+        """Return the first exact scope - used for self-service passes."""
+        return next((s for s in self.scopes if s in self.exact), "")
+
+
+def _is_pattern(scope: str) -> bool:
+    return scope != SCOPE_ANY and any(c in scope for c in "*?[")
+
+
 def is_visitor(user: settings.AUTH_USER_MODEL) -> bool:
     """Shortcut function for use with user_passes_test decorator."""
-    return user.is_visitor
+    # is_visitor is not set on excluded paths (see VISITOR_EXCLUDED_PATHS)
+    return getattr(user, "is_visitor", False)
 
 
 def is_staff(user: settings.AUTH_USER_MODEL) -> bool:
@@ -53,17 +98,19 @@ def _get_request_arg(*args: Any) -> HttpRequest | None:
 
 def user_is_visitor(  # noqa: C901
     view_func: Callable | None = None,
-    scope: str = "",
+    scope: str | Iterable[str] = "",
     bypass_func: BypassFunc | None = None,
     log_visit: bool = True,
     self_service: bool = False,
-    self_service_session_expiry: int | None = VISITOR_SESSION_EXPIRY,
+    self_service_session_expiry: int | None = None,
 ) -> Callable:
     """
     Decorate view functions that supports Visitor access.
 
-    The 'scope' param is mapped to the request.visitor.scope attribute - if
-    the scope is SCOPE_ANY then this is ignored.
+    The 'scope' param is mapped to the request.visitor.scopes attribute - if
+    the scope is SCOPE_ANY then this is ignored. It can be a single scope,
+    or a list of scopes, and can include glob-style patterns such as
+    "reference:*" - the visitor must have at least one matching scope.
 
     The 'bypass_func' is a callable that can be used to provide exceptions
     to the scope - e.g. allowing authenticate users, or staff, to bypass the
@@ -71,16 +118,21 @@ def user_is_visitor(  # noqa: C901
     scope allowed).
 
     The 'log_visit' arg can be used to override the default logging - if this
-    is too noisy, for instance.
+    is too noisy, for instance. Visits are otherwise logged according to the
+    visitor's scope policy (see VISITOR_SCOPES).
 
     If 'self_service' is True, then instead of a straight PermissionDenied error
     we raise VisitorAccessDenied, passing along the scope. This is then picked
     up in the middleware, and the user redirected to a page where they can
     enter their details and effectively invite themselves. Caveat emptor.
+    The self-service pass is created with the first exact (non-pattern)
+    scope, and 'self_service_session_expiry' (which defaults to the scope
+    policy).
 
     """
-    if not scope:
-        raise ValueError("Decorator scope cannot be empty.")
+    matcher = ScopeMatcher(scope)
+    if self_service and not matcher.default_scope:
+        raise ValueError("Self-service requires an exact (non-pattern) scope.")
 
     if view_func is None:
         return functools.partial(
@@ -103,39 +155,48 @@ def user_is_visitor(  # noqa: C901
             raise ValueError("Request argument missing.")
 
         # Allow custom rules to bypass the visitor checks
-        if bypass_func and bypass_func(request):
+        with profiling.section("user_is_visitor"):
+            bypass = bool(bypass_func and bypass_func(request))
+            is_valid = bypass or is_valid_request(request, matcher)
+        if bypass:
             return view_func(*args, **kwargs)
 
-        if not is_valid_request(request, scope):
+        if not is_valid:
             if self_service:
-                return redirect_to_self_service(
-                    request,
-                    scope,
-                    self_service_session_expiry,
-                )
-            raise VisitorAccessDenied(_("Visitor access denied"), scope)
+                metrics.SELF_SERVICE_REDIRECTS.inc(scope=str(matcher))
+                with profiling.section("user_is_visitor"):
+                    return redirect_to_self_service(
+                        request,
+                        matcher.default_scope,
+                        self_service_session_expiry,
+                    )
+            metrics.ACCESS_DENIED.inc(scope=str(matcher))
+            raise VisitorAccessDenied(_("Visitor access denied"), str(matcher))
 
         response = view_func(*args, **kwargs)
-        if log_visit:
-            VisitorLog.objects.create_log(request, response.status_code)
+        if log_visit and request.visitor.scope_config.should_log():
+            with profiling.section("user_is_visitor"):
+                VisitorLog.objects.create_log(request, response.status_code)
         return response
 
     return inner
 
 
-def is_valid_request(request: HttpRequest, scope: str) -> bool:
-    """Return True if the request matches the scope."""
-    if not request.user.is_visitor:
+def is_valid_request(
+    request: HttpRequest, scope: str | Iterable[str] | ScopeMatcher
+) -> bool:
+    """Return True if the request matches the scope(s)."""
+    # is_visitor is not set on requests excluded from the middleware
+    if not getattr(request.user, "is_visitor", False):
         return False
-    if scope == SCOPE_ANY:
-        return True
-    return request.visitor.scope == scope
+    matcher = scope if isinstance(scope, ScopeMatcher) else ScopeMatcher(scope)
+    return matcher(request.visitor.scopes)
 
 
 def redirect_to_self_service(
     request: HttpRequest,
     scope: str,
-    session_expiry: int | None = VISITOR_SESSION_EXPIRY,
+    session_expiry: int | None = None,
 ) -> HttpResponseRedirect:
     """Create inactive Visitor token and redirect to enable self-service."""
     # create an inactive token for the time being. This will be used by
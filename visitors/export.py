@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import json
+from typing import Any, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.db.models.query import QuerySet
+
+from .models import VisitorLog
+
+# default number of rows fetched per query
+EXPORT_CHUNK_SIZE = 1000
+
+# columns included in the export, in order
+EXPORT_FIELDS = (
+    "id",
+    "timestamp",
+    "visitor_uuid",
+    "visitor_email",
+    "scope",
+    "session_key",
+    "http_method",
+    "request_uri",
+    "query_string",
+    "remote_addr",
+    "http_user_agent",
+    "http_referer",
+    "status_code",
+)
+
+
+class Echo:
+    """Pseudo-buffer that returns the value written, for use with csv.writer."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def filter_logs(
+    queryset: QuerySet | None = None,
+    scope: str = "",
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    visitor_uuid: str = "",
+) -> QuerySet:
+    """Return VisitorLog queryset filtered by the export options."""
+    qs = VisitorLog.objects.all() if queryset is None else queryset
+    if scope:
+        qs = qs.filter(visitor__scope=scope)
+    if since:
+        qs = qs.filter(timestamp__gte=since)
+    if until:
+        qs = qs.filter(timestamp__lt=until)
+    if visitor_uuid:
+        qs = qs.filter(visitor__uuid=visitor_uuid)
+    return qs
+
+
+def iter_logs(
+    queryset: QuerySet, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[dict[str, Any]]:
+    """
+    Yield VisitorLog rows as dicts, in id order, using keyset pagination.
+
+    Each chunk is fetched with `WHERE id > {last id}` rather than an OFFSET,
+    so each query is an index range scan, and only a single chunk is held
+    in memory at any one time, regardless of the size of the table.
+
+    """
+    qs = queryset.order_by("id").values(
+        "id",
+        "timestamp",
+        "session_key",
+        "http_method",
+        "request_uri",
+        "query_string",
+        "remote_addr",
+        "http_user_agent",
+        "http_referer",
+        "status_code",
+        scope=F("visitor__scope"),
+        visitor_uuid=F("visitor__uuid"),
+        visitor_email=F("visitor__email"),
+        interned_user_agent_value=F("interned_user_agent__value"),
+        interned_referer_value=F("interned_referer__value"),
+    )
+    last_id = 0
+    while chunk := list(qs.filter(id__gt=last_id)[:chunk_size]):
+        for row in chunk:
+            # logs may be stored with interned user-agent / referer values
+            row["http_user_agent"] = (
+                row.pop("interned_user_agent_value") or row["http_user_agent"]
+            )
+            row["http_referer"] = (
+                row.pop("interned_referer_value") or row["http_referer"]
+            )
+            yield row
+        last_id = chunk[-1]["id"]
+
+
+def iter_csv(rows: Iterator[dict[str, Any]]) -> Iterator[str]:
+    """Yield rows as lines of CSV, starting with the header."""
+    writer = csv.DictWriter(Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_jsonl(rows: Iterator[dict[str, Any]]) -> Iterator[str]:
+    """Yield rows as lines of JSON."""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+EXPORT_FORMATS = {"csv": iter_csv, "jsonl": iter_jsonl}
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import datetime
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils.timezone import now as tz_now
+
+from visitors.models import ANONYMISE_BATCH_SIZE, Visitor
+
+
+class Command(BaseCommand):
+    help = "Erase the personal data of visitor passes and their logs."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--email",
+            dest="emails",
+            action="append",
+            default=[],
+            help="Anonymise passes for this email (can be repeated).",
+        )
+        parser.add_argument("--scope", default="", help="Anonymise passes by scope.")
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Anonymise passes created more than this many days ago.",
+        )
+        parser.add_argument("--batch-size", type=int, default=ANONYMISE_BATCH_SIZE)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not (options["emails"] or options["scope"] or options["days"] is not None):
+            raise CommandError("Select passes with --email, --scope and/or --days")
+        visitors = Visitor.objects.all()
+        if options["emails"]:
+            visitors = visitors.for_email(*options["emails"])
+        if options["scope"]:
+            visitors = visitors.filter(scope=options["scope"])
+        if options["days"] is not None:
+            cutoff = tz_now() - datetime.timedelta(days=options["days"])
+            visitors = visitors.filter(created_at__lt=cutoff)
+        total_visitors = total_logs = 0
+        for count, log_count in visitors.iter_anonymise(options["batch_size"]):
+            total_visitors += count
+            total_logs += log_count
+            self.stdout.write(
+                f"Anonymised {total_visitors} visitor passes, {total_logs} logs"
+            )
+        self.stdout.write(
+            f"Done - {total_visitors} visitor passes, {total_logs} logs anonymised"
+        )
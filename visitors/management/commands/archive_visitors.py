@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import datetime
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils.timezone import now as tz_now
+
+from visitors.archive import ARCHIVE_BATCH_SIZE, archive_visitors
+from visitors.models import Visitor
+from visitors.settings import VISITOR_ARCHIVE_PATH
+
+
+class Command(BaseCommand):
+    help = "Move expired visitor passes and their logs into archive files."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--path",
+            default=VISITOR_ARCHIVE_PATH,
+            help="Archive directory (defaults to VISITOR_ARCHIVE_PATH).",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=0,
+            help="Only archive passes that expired more than this many days ago.",
+        )
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not options["path"]:
+            raise CommandError("No archive path - set VISITOR_ARCHIVE_PATH or --path")
+        cutoff = tz_now() - datetime.timedelta(days=options["days"])
+        expired = Visitor.objects.filter(expires_at__lt=cutoff)
+        total = 0
+        for count in archive_visitors(
+            expired, options["path"], batch_size=options["batch_size"]
+        ):
+            total += count
+            self.stdout.write(f"Archived {total} visitor passes")
+        self.stdout.write(f"Done - {total} visitor passes archived")
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import datetime
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils.timezone import is_naive, make_aware
+
+from visitors.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, filter_logs, iter_logs
+
+
+def _date(value: str) -> datetime.datetime:
+    try:
+        timestamp = datetime.datetime.fromisoformat(value)
+    except ValueError as ex:
+        raise CommandError(f"Invalid date: {value}") from ex
+    if is_naive(timestamp):
+        return make_aware(timestamp)
+    return timestamp
+
+
+class Command(BaseCommand):
+    help = "Stream VisitorLog records out as CSV or JSON Lines."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+        parser.add_argument("--scope", default="", help="Filter by visitor scope.")
+        parser.add_argument("--visitor", default="", help="Filter by visitor uuid.")
+        parser.add_argument(
+            "--since", type=_date, help="Include logs from this date (ISO format)."
+        )
+        parser.add_argument(
+            "--until", type=_date, help="Include logs before this date (ISO format)."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help="Number of rows fetched per query.",
+        )
+        parser.add_argument(
+            "-o", "--output", help="File to write to (defaults to stdout)."
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        logs = filter_logs(
+            scope=options["scope"],
+            since=options["since"],
+            until=options["until"],
+            visitor_uuid=options["visitor"],
+        )
+        lines = EXPORT_FORMATS[options["format"]](
+            iter_logs(logs, chunk_size=options["chunk_size"])
+        )
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(options["output"], "w", newline="") as output:
+            output.writelines(lines)
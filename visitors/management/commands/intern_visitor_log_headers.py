@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from visitors.models import INTERN_BATCH_SIZE, VisitorLog
+
+
+class Command(BaseCommand):
+    help = "Move existing VisitorLog user-agent / referer values into lookup tables."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--batch-size", type=int, default=INTERN_BATCH_SIZE)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        total = 0
+        for count in VisitorLog.objects.iter_intern_headers(options["batch_size"]):
+            total += count
+            self.stdout.write(f"Converted {total} logs")
+        self.stdout.write(f"Done - {total} logs converted")
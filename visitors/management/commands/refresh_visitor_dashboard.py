@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from visitors.dashboard import refresh_dashboard
+
+
+class Command(BaseCommand):
+    help = "Recalculate the (cached) visitor pass admin dashboard stats."
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        stats = refresh_dashboard()
+        self.stdout.write(f"Dashboard stats updated at {stats['computed_at']}")
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from visitors.export import EXPORT_CHUNK_SIZE, filter_logs, iter_logs
+from visitors.management.commands.export_visitor_logs import _date
+from visitors.models import VisitorLog
+from visitors.replay import replay, summarise
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay VisitorLog requests through the Django test client and report "
+        "latency and query counts per scope. NB this makes real requests, "
+        "which will themselves be logged - run it against a copy of the data."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--scope", default="", help="Filter by visitor scope.")
+        parser.add_argument(
+            "--since", type=_date, help="Replay logs from this date (ISO format)."
+        )
+        parser.add_argument(
+            "--until", type=_date, help="Replay logs before this date (ISO format)."
+        )
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=0,
+            help=(
+                "Pacing relative to the original traffic - 1 is real time, "
+                "10 is ten times faster, 0 (default) is as fast as possible."
+            ),
+        )
+        parser.add_argument(
+            "--host",
+            default="",
+            help=(
+                "Host header to send - defaults to the first ALLOWED_HOSTS "
+                "entry (or localhost)."
+            ),
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help="Number of rows fetched per query.",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Output the summary as JSON."
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        logs = filter_logs(
+            scope=options["scope"], since=options["since"], until=options["until"]
+        )
+        # don't replay the logs created by the replay itself
+        last_id = VisitorLog.objects.order_by("-id").values_list("id", flat=True)
+        logs = logs.filter(id__lte=last_id.first() or 0)
+        summary = summarise(
+            replay(
+                iter_logs(logs, chunk_size=options["chunk_size"]),
+                speed=options["speed"],
+                host=options["host"],
+            )
+        )
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        for scope, row in summary.items():
+            self.stdout.write(
+                f"{scope or '-':<24} {row['requests']:>8} requests  "
+                f"p50={row['p50_ms']}ms p90={row['p90_ms']}ms "
+                f"p99={row['p99_ms']}ms queries={row['mean_queries']} "
+                f"status mismatches={row['status_mismatches']}"
+            )
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import datetime
+import random
+import uuid
+from typing import Any, Iterator
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+from django.utils.timezone import now as tz_now
+
+from visitors.models import Visitor, VisitorLog
+
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2) AppleWebKit/605.1.15 Safari/17.2",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) Mobile/15E148",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+)
+
+# (status_code, weight)
+STATUS_CODES = ((200, 90), (302, 5), (403, 3), (404, 1), (500, 1))
+
+
+def parse_scopes(value: str) -> dict[str, float]:
+    """Parse "foo:3,bar:1" into {"foo": 3.0, "bar": 1.0}."""
+    scopes = {}
+    for item in value.split(","):
+        scope, _, weight = item.partition(":")
+        try:
+            scopes[scope.strip()] = float(weight or 1)
+        except ValueError as ex:
+            raise CommandError(f"Invalid scope weight: {item}") from ex
+    return scopes
+
+
+class Command(BaseCommand):
+    help = "Generate (large volumes of) synthetic Visitor and VisitorLog data."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--visitors", type=int, default=1000)
+        parser.add_argument(
+            "--scopes",
+            type=parse_scopes,
+            default="reference:5,collaborate:3,review:2",
+            help="Comma-separated scope:weight pairs (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Spread pass creation over this many days (default: 365).",
+        )
+        parser.add_argument(
+            "--expiry-days",
+            type=int,
+            default=30,
+            help="Max days between pass creation and expiry (default: 30).",
+        )
+        parser.add_argument(
+            "--self-service-ratio",
+            type=float,
+            default=0.2,
+            help="Fraction of self-service passes (default: 0.2).",
+        )
+        parser.add_argument(
+            "--visits-per-pass",
+            type=float,
+            default=5,
+            help="Mean number of VisitorLog records per pass (default: 5).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def visitors(self, rng: random.Random, options: dict) -> Iterator[Visitor]:
+        now = tz_now()
+        scopes, weights = zip(*options["scopes"].items())
+        for i in range(options["visitors"]):
+            created_at = now - datetime.timedelta(
+                seconds=rng.uniform(0, options["days"] * 86400)
+            )
+            expires_at = created_at + datetime.timedelta(
+                seconds=rng.uniform(0, options["expiry_days"] * 86400)
+            )
+            visitor = Visitor(
+                uuid=uuid.UUID(int=rng.getrandbits(128), version=4),
+                first_name="Visitor",
+                last_name=str(i),
+                email=f"visitor{i}@example.org",
+                scope=rng.choices(scopes, weights)[0],
+                created_at=created_at,
+                expires_at=expires_at,
+            )
+            if rng.random() < options["self_service_ratio"]:
+                visitor.context = {"self-service": True, "redirect_to": "/"}
+                # a quarter of self-service passes are never activated
+                if rng.random() < 0.25:
+                    visitor.email = Visitor.DEFAULT_SELF_SERVICE_EMAIL
+                    visitor.is_active = False
+            yield visitor
+
+    def logs(
+        self, rng: random.Random, visitor: Visitor, mean: float
+    ) -> Iterator[VisitorLog]:
+        now = tz_now()
+        end = min(visitor.expires_at or now, now)
+        span = max((end - visitor.created_at).total_seconds(), 0)
+        session_key = uuid.UUID(int=rng.getrandbits(128)).hex
+        codes, weights = zip(*STATUS_CODES)
+        for _ in range(rng.randint(0, round(mean * 2))):
+            # most visits come from the same session / device
+            if rng.random() < 0.1:
+                session_key = uuid.UUID(int=rng.getrandbits(128)).hex
+            yield VisitorLog(
+                visitor=visitor,
+                session_key=session_key,
+                http_method=rng.choice(("GET", "GET", "GET", "POST")),
+                request_uri=f"/{visitor.scope}/",
+                remote_addr=f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.1",
+                http_user_agent=rng.choice(USER_AGENTS),
+                http_referer="",
+                status_code=rng.choices(codes, weights)[0],
+                timestamp=visitor.created_at
+                + datetime.timedelta(seconds=rng.uniform(0, span)),
+            )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rng = random.Random(options["seed"])  # noqa: S311
+        batch_size = options["batch_size"]
+        visitors = self.visitors(rng, options)
+        total_visitors = total_logs = 0
+        while batch := [v for _, v in zip(range(batch_size), visitors)]:
+            with transaction.atomic():
+                Visitor.objects.bulk_create(batch)
+                logs: list[VisitorLog] = []
+                for visitor in batch:
+                    logs.extend(self.logs(rng, visitor, options["visits_per_pass"]))
+                    if len(logs) >= batch_size:
+                        VisitorLog.objects.bulk_create(logs)
+                        total_logs += len(logs)
+                        logs = []
+                VisitorLog.objects.bulk_create(logs)
+            total_logs += len(logs)
+            total_visitors += len(batch)
+            self.stdout.write(
+                f"Created {total_visitors} visitors, {total_logs} visitor logs"
+            )
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import datetime
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from visitors.models import VisitorDailyStats
+
+
+class Command(BaseCommand):
+    help = "Update the VisitorDailyStats rollup from new VisitorLog records."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--rebuild-day",
+            dest="days",
+            action="append",
+            default=[],
+            metavar="YYYY-MM-DD",
+            help="Force a full rebuild of the given day (can be repeated).",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        for day in options["days"]:
+            date = datetime.date.fromisoformat(day)
+            count = VisitorDailyStats.objects.rebuild_day(date)
+            self.stdout.write(f"Rebuilt {date} ({count} rows)")
+        watermark = VisitorDailyStats.objects.watermark()
+        days = VisitorDailyStats.objects.update_from_logs()
+        self.stdout.write(
+            f"Updated {len(days)} day(s) from VisitorLog id > {watermark}"
+        )
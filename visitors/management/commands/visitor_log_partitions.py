@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils.timezone import now as tz_now
+
+from visitors import partitions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming, and drop expired, monthly VisitorLog partitions."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--create-ahead",
+            type=int,
+            default=1,
+            help="Number of future months to create partitions for (default: 1).",
+        )
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=0,
+            help=(
+                "Number of months (including the current month) to keep - "
+                "older partitions are dropped. Default (0) keeps everything."
+            ),
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        this_month = partitions.month_start(tz_now())
+        for i in range(options["create_ahead"] + 1):
+            table = partitions.create_partition(partitions.add_months(this_month, i))
+            self.stdout.write(f"Partition ready: {table}")
+        if options["keep"] > 0:
+            cutoff = partitions.add_months(this_month, 1 - options["keep"])
+            for table in partitions.drop_partitions_before(cutoff):
+                self.stdout.write(f"Dropped partition: {table}")
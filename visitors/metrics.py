@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import bisect
+import contextlib
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from typing import IO, Iterator
+
+from .settings import VISITOR_METRICS_DIR, VISITOR_METRICS_ENABLED
+
+# default histogram buckets (seconds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# for typing - the label values of a single time series
+LabelValues = tuple[str, ...]
+
+# for typing - the stored values of a metric, keyed by (labels, suffix)
+Samples = dict[tuple[LabelValues, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names: tuple[str, ...], values: LabelValues, **extra: str) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _key(name: str, labels: LabelValues, suffix: str = "") -> str:
+    return json.dumps([name, labels, suffix])
+
+
+class InMemoryStore:
+    """Store metric values in a dict (single process)."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, key: str, amount: float) -> None:
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def read(self) -> dict[str, float]:
+        return dict(self.values)
+
+
+def _read_entries(data: bytes | mmap.mmap) -> Iterator[tuple[str, int, float]]:
+    """Yield (key, value position, value) from an MmapStore file."""
+    (used,) = struct.unpack_from("i", data, 0)
+    pos = MmapStore.HEADER_SIZE
+    while pos < used:
+        (length,) = struct.unpack_from("i", data, pos)
+        key = bytes(data[pos + 4 : pos + 4 + length]).decode()
+        value_pos = pos + MmapStore.entry_offset(length)
+        (value,) = struct.unpack_from("d", data, value_pos)
+        yield key, value_pos, value
+        pos = value_pos + 8
+
+
+class MmapStore:
+    """
+    Store metric values in a per-process memory-mapped file.
+
+    Each process writes only to its own file ({directory}/metrics-{pid}.db),
+    so the hot path never has to coordinate with other processes; values are
+    merged (summed) across all files in the directory when they are read.
+
+    File layout: an 8-byte header containing the number of bytes used, then a
+    sequence of entries - a 4-byte key length, the (utf-8) key padded to an
+    8-byte boundary, and an 8-byte float value. New entries are written in
+    full before the header is updated, so readers never see a partial entry.
+
+    """
+
+    HEADER_SIZE = 8
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.pid: int | None = None
+        self.file: IO[bytes] | None = None
+        self.mmap: mmap.mmap | None = None
+        self.positions: dict[str, int] = {}
+        self.used = self.HEADER_SIZE
+
+    @staticmethod
+    def entry_offset(length: int) -> int:
+        """Return the offset of the value from the start of an entry."""
+        return 4 + length + (-(4 + length) % 8)
+
+    def _open(self) -> mmap.mmap:
+        # opened lazily, and reopened after a fork, so that each process
+        # gets its own file.
+        self.pid = os.getpid()
+        path = os.path.join(self.directory, f"metrics-{self.pid}.db")
+        self.file = open(path, "a+b")
+        size = max(os.fstat(self.file.fileno()).st_size, self.INITIAL_SIZE)
+        self.file.truncate(size)
+        self.mmap = mmap.mmap(self.file.fileno(), size)
+        (used,) = struct.unpack_from("i", self.mmap, 0)
+        self.used = used or self.HEADER_SIZE
+        self.positions = {key: pos for key, pos, _ in _read_entries(self.mmap)}
+        return self.mmap
+
+    def _grow(self, size: int) -> mmap.mmap:
+        if not (self.mmap and self.file):
+            raise ValueError("Metrics file is not open")
+        self.mmap.close()
+        self.file.truncate(size)
+        self.mmap = mmap.mmap(self.file.fileno(), size)
+        return self.mmap
+
+    def _allocate(self, data: mmap.mmap, key: str) -> tuple[mmap.mmap, int]:
+        encoded = key.encode()
+        offset = self.entry_offset(len(encoded))
+        if self.used + offset + 8 > len(data):
+            data = self._grow(max(len(data) * 2, self.used + offset + 8))
+        struct.pack_into(
+            f"i{offset - 4}sd", data, self.used, len(encoded), encoded, 0.0
+        )
+        position = self.used + offset
+        self.used = position + 8
+        struct.pack_into("i", data, 0, self.used)
+        self.positions[key] = position
+        return data, position
+
+    def inc(self, key: str, amount: float) -> None:
+        with self.lock:
+            data = self.mmap
+            if data is None or self.pid != os.getpid():
+                data = self._open()
+            if (position := self.positions.get(key)) is None:
+                data, position = self._allocate(data, key)
+            (value,) = struct.unpack_from("d", data, position)
+            struct.pack_into("d", data, position, value + amount)
+
+    def read(self) -> dict[str, float]:
+        values: dict[str, float] = defaultdict(float)
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.db")):
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < self.HEADER_SIZE:
+                continue
+            for key, _, value in _read_entries(data):
+                values[key] += value
+        return dict(values)
+
+
+class Metric:
+    """Base class for a named metric with (optional) labels."""
+
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        store: InMemoryStore | MmapStore | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.store = store or InMemoryStore()
+
+    def _labelvalues(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _inc(self, labels: LabelValues, suffix: str, amount: float) -> None:
+        self.store.inc(_key(self.name, labels, suffix), amount)
+
+    def samples(self, values: Samples) -> Iterator[str]:
+        raise NotImplementedError
+
+    def collect(self) -> Samples:
+        """Return the current values of this metric (from all processes)."""
+        values: Samples = {}
+        for key, value in self.store.read().items():
+            name, labels, suffix = json.loads(key)
+            if name == self.name:
+                values[(tuple(labels), suffix)] = value
+        return values
+
+    def render(self, values: Samples | None = None) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(self.collect() if values is None else values),
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self._inc(self._labelvalues(labels), "", amount)
+
+    def get(self, **labels: str) -> float:
+        """Return the current value for the given labels."""
+        return self.collect().get((self._labelvalues(labels), ""), 0)
+
+    def samples(self, values: Samples) -> Iterator[str]:
+        for (labels, _), value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram(Metric):
+    """Distribution of observed values (e.g. latency) in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        store: InMemoryStore | MmapStore | None = None,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames, store)
+        self.buckets = tuple(sorted(buckets))
+        self.bounds = [*(str(b) for b in self.buckets), "+Inf"]
+
+    def observe(self, value: float, **labels: str) -> None:
+        labelvalues = self._labelvalues(labels)
+        bound = self.bounds[bisect.bisect_left(self.buckets, value)]
+        self._inc(labelvalues, bound, 1)
+        self._inc(labelvalues, "sum", value)
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the enclosed block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self, values: Samples) -> Iterator[str]:
+        for labels in sorted({labels for labels, _ in values}):
+            cumulative = 0.0
+            for bound in self.bounds:
+                cumulative += values.get((labels, bound), 0)
+                labelstr = _labels(self.labelnames, labels, le=bound)
+                yield f"{self.name}_bucket{labelstr} {cumulative}"
+            total = values.get((labels, "sum"), 0)
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class NullMetric:
+    """Metric that does nothing - used when metrics are disabled."""
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        pass
+
+    def observe(self, value: float, **labels: str) -> None:
+        pass
+
+    def time(self, **labels: str) -> contextlib.nullcontext:
+        return contextlib.nullcontext()
+
+
+NULL_METRIC = NullMetric()
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics, rendered in the Prometheus text format.
+
+    Values are held in memory, unless a directory is passed, in which case
+    they are written to memory-mapped files (one per process) in that
+    directory, and aggregated across all processes when rendered.
+
+    """
+
+    def __init__(self, enabled: bool = True, directory: str | None = None) -> None:
+        self.enabled = enabled
+        self.store = MmapStore(directory) if directory else InMemoryStore()
+        self.metrics: dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric | NullMetric:
+        if not self.enabled:
+            return NULL_METRIC
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: tuple = ()
+    ) -> Counter | NullMetric:
+        return self._register(  # type: ignore
+            Counter(name, documentation, labelnames, store=self.store)
+        )
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: tuple = ()
+    ) -> Histogram | NullMetric:
+        return self._register(  # type: ignore
+            Histogram(name, documentation, labelnames, store=self.store)
+        )
+
+    def render(self) -> str:
+        # read the store once, rather than once per metric
+        values: dict[str, Samples] = defaultdict(dict)
+        for key, value in self.store.read().items():
+            name, labels, suffix = json.loads(key)
+            values[name][(tuple(labels), suffix)] = value
+        return "".join(m.render(values[m.name]) for m in self.metrics.values())
+
+
+registry = MetricsRegistry(
+    enabled=VISITOR_METRICS_ENABLED, directory=VISITOR_METRICS_DIR
+)
+
+TOKEN_LOOKUPS = registry.counter(
+    "visitors_token_lookups_total",
+    "Visitor token lookups by VisitorRequestMiddleware, by result.",
+    ("result",),
+)
+TOKEN_LOOKUP_SECONDS = registry.histogram(
+    "visitors_token_lookup_seconds",
+    "Time taken to look up visitor tokens in VisitorRequestMiddleware.",
+)
+SESSION_RESOLUTIONS = registry.counter(
+    "visitors_session_resolutions_total",
+    "Visitor resolutions by VisitorSessionMiddleware, by result.",
+    ("result",),
+)
+SESSION_CLEARS = registry.counter(
+    "visitors_session_clears_total",
+    "Visitor uuids cleared from the session by VisitorSessionMiddleware.",
+)
+ACCESS_DENIED = registry.counter(
+    "visitors_access_denied_total",
+    "Requests denied by the user_is_visitor decorator, by scope.",
+    ("scope",),
+)
+SELF_SERVICE_REDIRECTS = registry.counter(
+    "visitors_self_service_redirects_total",
+    "Requests redirected to self-service by the user_is_visitor decorator.",
+    ("scope",),
+)
+LOG_WRITES = registry.counter(
+    "visitors_log_writes_total", "Visitor log records written."
+)
+LOG_WRITE_SECONDS = registry.histogram(
+    "visitors_log_write_seconds", "Time taken to write visitor log records."
+)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 import logging
+import random
+import re
+import time
 from typing import Callable
 
 from django.conf import settings
@@ -8,41 +11,100 @@ from django.core.exceptions import MiddlewareNotUsed, ValidationError
 from django.http.request import HttpRequest
 from django.http.response import HttpResponse, HttpResponseBadRequest
 
-from . import session
+from . import metrics, profiling, session
+from .authentication import authenticate_token, get_header_token
 from .models import InvalidVisitorPass, Visitor
-from .settings import VISITOR_QUERYSTRING_KEY
+from .settings import (
+    VISITOR_EXCLUDED_PATH_PATTERNS,
+    VISITOR_EXCLUDED_PATHS,
+    VISITOR_PROFILING_SAMPLE_RATE,
+    VISITOR_QUERYSTRING_KEY,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def excluded_path_matcher(
+    prefixes: list[str], patterns: list[str]
+) -> Callable[[str], bool]:
+    """
+    Return a function that returns True if a path is excluded.
+
+    The prefixes and patterns are compiled into a single regex, so that
+    each request is checked with one match call, however many exclusions
+    are configured.
+
+    """
+    alternatives = [re.escape(p) for p in prefixes] + [f"(?:{p})" for p in patterns]
+    if not alternatives:
+        return lambda path: False
+    regex = re.compile("|".join(alternatives))
+    return lambda path: regex.match(path) is not None
+
+
 class VisitorRequestMiddleware:
     """Extract visitor token from incoming request."""
 
     def __init__(self, get_response: Callable):
         self.get_response = get_response
+        self.is_excluded = excluded_path_matcher(
+            VISITOR_EXCLUDED_PATHS, VISITOR_EXCLUDED_PATH_PATTERNS
+        )
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.is_excluded(request.path):
+            # skip all visitor work - including the lazy request.user
+            request.visitor = None
+            return self.get_response(request)
+        with profiling.section("VisitorRequestMiddleware"):
+            response = self.process_request(request)
+        return response or self.get_response(request)
+
+    def process_request(self, request: HttpRequest) -> HttpResponse | None:
+        """Set request.visitor from token - returns a response on error."""
         request.visitor = None
         request.user.is_visitor = False
+        if header_token := get_header_token(request):
+            return self.process_header_token(request, header_token)
         visitor_uuid = request.GET.get(VISITOR_QUERYSTRING_KEY)
         if not visitor_uuid:
-            return self.get_response(request)
+            return None
         try:
-            visitor = Visitor.objects.get(uuid=visitor_uuid)
+            with metrics.TOKEN_LOOKUP_SECONDS.time():
+                visitor = Visitor.objects.get(uuid=visitor_uuid)
             visitor.validate()
         except Visitor.DoesNotExist:
+            metrics.TOKEN_LOOKUPS.inc(result="miss")
             logger.debug("Visitor pass does not exist: %s", visitor_uuid)
-            return self.get_response(request)
+            return None
         except InvalidVisitorPass as ex:
+            metrics.TOKEN_LOOKUPS.inc(result="invalid")
             logger.debug("Invalid access request: %s", ex)
-            return self.get_response(request)
+            return None
         except ValidationError as ex:
+            metrics.TOKEN_LOOKUPS.inc(result="malformed")
             logger.debug("Malformed visitor token: %s", ex)
             return HttpResponseBadRequest("Malformed visitor token.")
         else:
+            metrics.TOKEN_LOOKUPS.inc(result="hit")
             request.visitor = visitor
             request.user.is_visitor = True
-        return self.get_response(request)
+        return None
+
+    def process_header_token(
+        self, request: HttpRequest, token: str
+    ) -> HttpResponse | None:
+        """Set request.visitor from "Authorization: Visitor <token>" header."""
+        try:
+            visitor = authenticate_token(token)
+        except ValidationError as ex:
+            metrics.TOKEN_LOOKUPS.inc(result="malformed")
+            logger.debug("Malformed visitor token: %s", ex)
+            return HttpResponseBadRequest("Malformed visitor token.")
+        if visitor:
+            request.visitor = visitor
+            request.user.is_visitor = True
+        return None
 
 
 class VisitorSessionMiddleware:
@@ -50,8 +112,19 @@ class VisitorSessionMiddleware:
 
     def __init__(self, get_response: Callable):
         self.get_response = get_response
+        self.is_excluded = excluded_path_matcher(
+            VISITOR_EXCLUDED_PATHS, VISITOR_EXCLUDED_PATH_PATTERNS
+        )
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.is_excluded(request.path):
+            request.visitor = None
+            return self.get_response(request)
+        with profiling.section("VisitorSessionMiddleware"):
+            self.process_request(request)
+        return self.get_response(request)
+
+    def process_request(self, request: HttpRequest) -> None:
         """
         Update request.user if any visitor vars are found in session.
 
@@ -65,17 +138,22 @@ class VisitorSessionMiddleware:
         Subsequent requests will then get the data out of the session.
 
         """
+        # Requests authenticated by header (API clients) don't use the session
+        if get_header_token(request):
+            return
+
         # This will only be true directly after VisitorRequestMiddleware
         # has set the values. All subsequent requests in the session will
         # start with is_visitor=False and pick up the visitor info from
         # the session.
         if request.visitor:
+            metrics.SESSION_RESOLUTIONS.inc(result="stashed")
             session.stash_visitor_uuid(request)
-            return self.get_response(request)
+            return
 
         # We don't have a visitor object, but there may be one in the session
         if not (visitor_uuid := session.get_visitor_uuid(request)):
-            return self.get_response(request)
+            return
 
         try:
             visitor = Visitor.objects.get(
@@ -83,13 +161,44 @@ class VisitorSessionMiddleware:
                 is_active=True,
             )
         except Visitor.DoesNotExist:
+            metrics.SESSION_RESOLUTIONS.inc(result="miss")
+            metrics.SESSION_CLEARS.inc()
             session.clear_visitor_uuid(request)
-            return self.get_response(request)
         else:
+            metrics.SESSION_RESOLUTIONS.inc(result="hit")
             request.visitor = visitor
             request.user.is_visitor = True
 
-        return self.get_response(request)
+
+class VisitorProfilingMiddleware:
+    """
+    Profile the visitor layer for a sample of requests.
+
+    This should be the first visitor middleware in MIDDLEWARE. For the
+    sampled requests (see VISITOR_PROFILING_SAMPLE_RATE) the time spent in
+    each visitor middleware and the decorator, along with the number and
+    duration of their SQL queries, is recorded in an in-memory ring buffer
+    that can be viewed in the admin site.
+
+    """
+
+    def __init__(self, get_response: Callable):
+        if not VISITOR_PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed("VisitorProfilingMiddleware disabled")
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if random.random() >= VISITOR_PROFILING_SAMPLE_RATE:  # noqa: S311
+            return self.get_response(request)
+        profile = profiling.RequestProfile(method=request.method, path=request.path)
+        token = profiling.current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            profile.total_time = time.perf_counter() - start
+            profiling.current_profile.reset(token)
+            profiling.profiles.append(profile)
 
 
 class VisitorDebugMiddleware:
@@ -101,8 +210,10 @@ class VisitorDebugMiddleware:
         self.get_response = get_response
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        logger.debug("request.user.is_visitor: %s", request.user.is_visitor)
-        if request.user.is_visitor:
+        # is_visitor is not set on excluded paths (see VISITOR_EXCLUDED_PATHS)
+        is_visitor = getattr(request.user, "is_visitor", False)
+        logger.debug("request.user.is_visitor: %s", is_visitor)
+        if is_visitor:
             logger.debug("request.visitor: %s", request.visitor)
             logger.debug(
                 "request.visitor.session_expiry: %s",
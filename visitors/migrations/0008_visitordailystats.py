@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0007_visitor_session_expiry"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="visitorlog",
+            name="timestamp",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+        migrations.CreateModel(
+            name="VisitorDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("scope", models.CharField(max_length=100)),
+                (
+                    "status_class",
+                    models.PositiveSmallIntegerField(
+                        help_text="HTTP status code class - e.g. 2 for 2xx responses."
+                    ),
+                ),
+                ("visit_count", models.PositiveIntegerField(default=0)),
+                ("distinct_sessions", models.PositiveIntegerField(default=0)),
+                ("distinct_ips", models.PositiveIntegerField(default=0)),
+                (
+                    "last_log_id",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Id of the most recent VisitorLog included in the row.",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily visitor stats",
+                "verbose_name_plural": "Daily visitor stats",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "scope", "status_class"),
+                        name="unique_visitor_daily_stats",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0008_visitordailystats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="visitor",
+            name="fingerprints",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Fingerprints of the distinct sessions, IPs and user-agents seen.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="visitor",
+            name="shared_suspected",
+            field=models.BooleanField(
+                db_index=True,
+                default=False,
+                help_text="Set when the pass appears to have been shared.",
+            ),
+        ),
+    ]
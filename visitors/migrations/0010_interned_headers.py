@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0009_visitor_sharing"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Referer",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hash", models.CharField(max_length=32, unique=True)),
+                ("value", models.TextField()),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="UserAgent",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hash", models.CharField(max_length=32, unique=True)),
+                ("value", models.TextField()),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.AlterField(
+            model_name="visitorlog",
+            name="http_referer",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name="visitorlog",
+            name="http_user_agent",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="visitorlog",
+            name="interned_referer",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="visitors.referer",
+            ),
+        ),
+        migrations.AddField(
+            model_name="visitorlog",
+            name="interned_user_agent",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="visitors.useragent",
+            ),
+        ),
+    ]
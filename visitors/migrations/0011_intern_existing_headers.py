@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# NB existing logs are not converted when migrating forwards, as that would
+# depend on VISITOR_LOG_INTERN_HEADERS at the time the migration runs - use
+# the intern_visitor_log_headers management command instead (which can be
+# re-run, e.g. after enabling the setting).
+
+BATCH_SIZE = 1000
+
+
+def restore_headers(apps, schema_editor):
+    """Copy interned user-agent / referer values back onto VisitorLog."""
+    VisitorLog = apps.get_model("visitors", "VisitorLog")
+    last_id = 0
+    while True:
+        batch = list(
+            VisitorLog.objects.filter(id__gt=last_id)
+            .exclude(interned_user_agent=None, interned_referer=None)
+            .select_related("interned_user_agent", "interned_referer")
+            .order_by("id")[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        for log in batch:
+            if log.interned_user_agent:
+                log.http_user_agent = log.interned_user_agent.value
+            if log.interned_referer:
+                log.http_referer = log.interned_referer.value
+            log.interned_user_agent = None
+            log.interned_referer = None
+        VisitorLog.objects.bulk_update(
+            batch,
+            [
+                "interned_user_agent",
+                "interned_referer",
+                "http_user_agent",
+                "http_referer",
+            ],
+        )
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0010_interned_headers"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_headers),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0011_intern_existing_headers"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="visitor",
+            name="created_at",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0012_visitor_created_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="visitor",
+            name="extra_scopes",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="Additional scopes the visitor pass can be used for.",
+            ),
+        ),
+        migrations.CreateModel(
+            name="VisitorScope",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scope", models.CharField(db_index=True, max_length=100)),
+                (
+                    "visitor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scope_index",
+                        to="visitors.visitor",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("visitor", "scope"), name="unique_visitor_scope"
+                    )
+                ],
+            },
+        ),
+    ]
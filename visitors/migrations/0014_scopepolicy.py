@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0013_visitor_extra_scopes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScopePolicy",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scope", models.CharField(max_length=100, unique=True)),
+                (
+                    "token_expiry",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Seconds for which new tokens are valid.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "session_expiry",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Session expiry (seconds) for new visitor passes.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "log_mode",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("all", "Log all visits"),
+                            ("sampled", "Log a sample of visits"),
+                            ("none", "Do not log visits"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "log_sample_rate",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Fraction (0.0 - 1.0) of visits logged, if sampled.",
+                        null=True,
+                    ),
+                ),
+                ("last_updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Scope policies",
+            },
+        ),
+        migrations.AlterField(
+            model_name="visitor",
+            name="expires_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="After this time the link can no longer be used - defaults to the scope token expiry (or VISITOR_TOKEN_EXPIRY).",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:20
+
+import logging
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Case, Count, Q, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def deactivate_duplicates(apps, schema_editor):
+    """
+    Keep only one active pass per (lower(email), scope).
+
+    The most recent unexpired pass is kept (or the most recent pass, if they
+    have all expired). This may revoke passes that are still in use - they
+    were valid before the constraint - so the number deactivated, and their
+    ids, are logged.
+
+    """
+    Visitor = apps.get_model("visitors", "Visitor")
+    now = timezone.now()
+    unexpired = Q(expires_at__isnull=True) | Q(expires_at__gte=now)
+    duplicates = (
+        Visitor.objects.filter(is_active=True)
+        .values(email_lower=Lower("email"), scope_=models.F("scope"))
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    revoked = []
+    revoked_unexpired = 0
+    for row in duplicates.iterator():
+        passes = list(
+            Visitor.objects.alias(email_lower=Lower("email"))
+            .filter(email_lower=row["email_lower"], scope=row["scope_"], is_active=True)
+            .annotate(
+                is_unexpired=Case(When(unexpired, then=Value(True)), default=False)
+            )
+            .order_by("-is_unexpired", "-id")
+            .values_list("id", "is_unexpired")
+        )
+        ids = [pk for pk, _ in passes[1:]]
+        Visitor.objects.filter(id__in=ids).update(is_active=False)
+        revoked.extend(ids)
+        revoked_unexpired += sum(is_unexpired for _, is_unexpired in passes[1:])
+    if revoked:
+        logger.warning(
+            "Deactivated %s duplicate active visitor passes (%s unexpired): %s",
+            len(revoked),
+            revoked_unexpired,
+            revoked,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0014_scopepolicy"),
+    ]
+
+    operations = [
+        migrations.RunPython(deactivate_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="visitor",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Lower("email"),
+                models.F("scope"),
+                condition=models.Q(("is_active", True)),
+                name="unique_active_visitor_email_scope",
+            ),
+        ),
+    ]
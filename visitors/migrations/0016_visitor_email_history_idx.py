@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:22
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0015_unique_active_visitor"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="visitor",
+            name="email",
+            field=models.EmailField(max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name="visitor",
+            index=models.Index(
+                django.db.models.functions.text.Lower("email"),
+                models.F("created_at"),
+                models.F("id"),
+                name="visitor_email_history_idx",
+            ),
+        ),
+    ]
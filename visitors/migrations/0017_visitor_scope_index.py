@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0016_visitor_email_history_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="visitor",
+            name="scope",
+            field=models.CharField(
+                db_index=True,
+                help_text="Used to map request to view function",
+                max_length=100,
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Admin search uses lower(email) LIKE 'prefix%' (see visitors.admin.search),
+# which on PostgreSQL can only use a btree index built with a pattern ops
+# operator class. The scope prefix search is already covered by the
+# varchar_pattern_ops "_like" index that Django adds for db_index=True char
+# fields. Other databases either don't support operator classes or can't use
+# an index for LIKE, so this is a no-op there.
+INDEX_NAME = "visitor_email_prefix_idx"
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    table = schema_editor.quote_name(
+        apps.get_model("visitors", "Visitor")._meta.db_table
+    )
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} "
+        f'ON {table} (LOWER("email") varchar_pattern_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("visitors", "0017_visitor_scope_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,38 +1,323 @@
 from __future__ import annotations
 
+import copy
 import datetime
+import hashlib
+import logging
 import uuid
-from typing import Any
+from typing import Any, Iterator
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
-from django.db import models
-from django.db.models.deletion import CASCADE
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import (
+    BooleanField,
+    Count,
+    ExpressionWrapper,
+    F,
+    Max,
+    Q,
+    Sum,
+)
+from django.db.models.deletion import CASCADE, PROTECT
+from django.db.models.functions import Lower, Now, TruncDate
 from django.http.request import HttpRequest
-from django.utils.timezone import now as tz_now
+from django.utils.timezone import make_aware, now as tz_now
 from django.utils.translation import gettext_lazy as _lazy
 
+from . import metrics, profiling
 from .exceptions import InvalidVisitorPass
+from .scopes import LOG_ALL, LOG_NONE, LOG_SAMPLED, ScopeConfig, scope_registry
 from .settings import (
+    VISITOR_LOG_INTERN_CACHE_SIZE,
+    VISITOR_LOG_INTERN_HEADERS,
     VISITOR_QUERYSTRING_KEY,
     VISITOR_SESSION_EXPIRY,
+    VISITOR_SHARING_THRESHOLDS,
+    VISITOR_TOKEN_CACHE_TIMEOUT,
     VISITOR_TOKEN_EXPIRY,
 )
+from .signals import visitor_link_shared
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(value: str) -> str:
+    """Return a short, non-reversible fingerprint of a request value."""
+    return hashlib.blake2b(value.encode(), digest_size=4).hexdigest()
+
+
+def value_hash(value: str) -> str:
+    """Return the hash used to deduplicate interned values."""
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+# default number of rows updated per query by VisitorQuerySet.anonymise
+ANONYMISE_BATCH_SIZE = 1000
+
+# default number of logs converted per batch by VisitorLog.objects.iter_intern_headers
+INTERN_BATCH_SIZE = 1000
+
+# number of attempts to record fingerprints when there are concurrent updates
+FINGERPRINT_UPDATE_RETRIES = 3
+
+
+def token_cache_key(visitor_uuid: uuid.UUID) -> str:
+    """Return the cache key used by VisitorManager.get_cached."""
+    return f"visitors:token:{visitor_uuid}"
+
+
+def valid_q() -> Q:
+    """Return the Q object used to filter valid visitor passes (see is_valid)."""
+    return Q(is_active=True) & (Q(expires_at__isnull=True) | Q(expires_at__gte=Now()))
+
+
+class VisitorQuerySet(models.QuerySet):
+    def _clear_token_cache(self) -> None:
+        # remove the selected passes from the token cache (see get_cached)
+        if VISITOR_TOKEN_CACHE_TIMEOUT:
+            uuids = self.values_list("uuid", flat=True)
+            cache.delete_many([token_cache_key(u) for u in uuids])
+
+    def update(self, **kwargs: Any) -> int:
+        """Update the passes, and remove them from the token cache."""
+        # NB the rows are selected before the update changes them
+        self._clear_token_cache()
+        return super().update(**kwargs)
+
+    def delete(self) -> tuple[int, dict[str, int]]:
+        """Delete the passes, and remove them from the token cache."""
+        self._clear_token_cache()
+        return super().delete()
+
+    def valid(self) -> VisitorQuerySet:
+        """Return visitor passes that are active and not yet expired."""
+        return self.filter(valid_q())
+
+    def with_validity(self) -> VisitorQuerySet:
+        """Annotate visitor passes with validity (`is_valid_now`) in the db."""
+        return self.annotate(
+            is_valid_now=ExpressionWrapper(valid_q(), output_field=BooleanField())
+        )
+
+    def for_email(self, *emails: str) -> VisitorQuerySet:
+        """Return passes for one or more emails (case-insensitive, indexed)."""
+        return self.alias(email_lower=Lower("email")).filter(
+            email_lower__in=[e.lower() for e in emails]
+        )
+
+    def history_for_email(
+        self,
+        email: str,
+        after: tuple[datetime.datetime, int] | None = None,
+        limit: int = 20,
+    ) -> VisitorQuerySet:
+        """
+        Return a page of passes for an email, most recent first.
+
+        Pages use keyset pagination on (created_at, id) - pass the values
+        from the last pass of a page as `after` to get the next page, e.g.
+        `after=(page[-1].created_at, page[-1].id)`. Each page is a range
+        scan of the (lower(email), created_at, id) index, however deep.
+
+        """
+        qs = self.for_email(email)
+        if after:
+            created_at, pk = after
+            qs = qs.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        return qs.order_by("-created_at", "-id")[:limit]
+
+    def with_scope(self, scope: str) -> VisitorQuerySet:
+        """
+        Return visitor passes that have the scope, as primary or extra scope.
+
+        Both conditions are index lookups - extra scopes are indexed in the
+        VisitorScope table.
+
+        """
+        return self.filter(
+            Q(scope=scope)
+            | Q(pk__in=VisitorScope.objects.filter(scope=scope).values("visitor"))
+        )
+
+    def iter_anonymise(
+        self, batch_size: int = ANONYMISE_BATCH_SIZE
+    ) -> Iterator[tuple[int, int]]:
+        """
+        Erase the personal data of the selected passes, and their logs.
+
+        Names, emails, context and fingerprints are blanked (and the pass
+        deactivated), as are the session key, IP address, user-agent,
+        referer and querystring of each log - in the VisitorLog table, and
+        in any monthly partitions (see PartitionedDatabaseBackend). Visitors
+        (and then their logs) are processed in primary key batches, each
+        with set-based UPDATEs, so memory use is constant. NB logs stored
+        outside the database (see VISITOR_LOG_BACKEND) and archives are not
+        affected.
+
+        Yields the number of (visitors, logs) anonymised in each batch.
+
+        """
+        from .partitions import partitioned_logs
+
+        erased = {
+            "session_key": "",
+            "remote_addr": "",
+            "http_user_agent": "",
+            "interned_user_agent_id": None,
+            "http_referer": "",
+            "interned_referer_id": None,
+            "query_string": "",
+        }
+        partitions = list(partitioned_logs())
+        qs = self.order_by("pk")
+        last_pk = 0
+        while pks := list(
+            qs.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size]
+        ):
+            logs = VisitorLog.objects.filter(visitor_id__in=pks).order_by("pk")
+            log_count = 0
+            last_log_pk = 0
+            while log_pks := list(
+                logs.filter(pk__gt=last_log_pk).values_list("pk", flat=True)[
+                    :batch_size
+                ]
+            ):
+                log_count += VisitorLog.objects.filter(pk__in=log_pks).update(**erased)
+                last_log_pk = log_pks[-1]
+            for partition in partitions:
+                log_count += partition.filter(visitor_id__in=pks).update(**erased)
+            count = Visitor.objects.filter(pk__in=pks).update(
+                first_name="",
+                last_name="",
+                email="",
+                context=None,
+                fingerprints={},
+                is_active=False,
+            )
+            last_pk = pks[-1]
+            yield count, log_count
+
+    def anonymise(self, batch_size: int = ANONYMISE_BATCH_SIZE) -> tuple[int, int]:
+        """Anonymise the selected passes and logs - return the counts."""
+        visitors = logs = 0
+        for visitor_count, log_count in self.iter_anonymise(batch_size):
+            visitors += visitor_count
+            logs += log_count
+        return visitors, logs
+
+    def suspected_shared(self) -> VisitorQuerySet:
+        """Return visitor passes that have been flagged as possibly shared."""
+        return self.filter(shared_suspected=True)
+
+
+class VisitorManager(models.Manager.from_queryset(VisitorQuerySet)):  # type: ignore
+    def _active_for(self, emails: list[str], scope: str) -> VisitorQuerySet:
+        # filter on lower(email), so the unique constraint index can be used
+        return self.for_email(*emails).filter(scope=scope, is_active=True)
+
+    def get_or_issue(
+        self, email: str, scope: str, **defaults: Any
+    ) -> tuple[Visitor, bool]:
+        """
+        Return (visitor, created) - the existing valid pass, or a new one.
 
+        There can only be one active pass per (case-insensitive) email and
+        scope. If the existing active pass has expired it is deactivated
+        and replaced. Any defaults are used when creating a new pass. If a
+        concurrent request issues the pass first, that one is returned.
+
+        """
+        existing = self._active_for([email], scope).first()
+        if existing and existing.is_valid:
+            return existing, False
+        try:
+            with transaction.atomic():
+                if existing:
+                    existing.deactivate()
+                return self.create(email=email, scope=scope, **defaults), True
+        except IntegrityError:
+            return self._active_for([email], scope).get(), False
+
+    def bulk_get_or_issue(
+        self, emails: list[str], scope: str, **defaults: Any
+    ) -> dict[str, Visitor]:
+        """
+        Return valid passes for many emails, keyed by lower-cased email.
+
+        Existing passes are fetched in a single query, expired passes are
+        deactivated in a single UPDATE, and new passes are created with
+        bulk_create. If a concurrent request issues any of the same passes,
+        this falls back to get_or_issue for each email.
+
+        """
+        visitors = {}
+        expired = []
+        for visitor in self._active_for(emails, scope):
+            if visitor.is_valid:
+                visitors[visitor.email.lower()] = visitor
+            else:
+                expired.append(visitor.pk)
+        missing = {e.lower(): e for e in emails if e.lower() not in visitors}
+        new = [self.model(email=e, scope=scope, **defaults) for e in missing.values()]
+        try:
+            with transaction.atomic():
+                self.filter(pk__in=expired).update(is_active=False)
+                self.bulk_create(new)
+                for visitor in new:
+                    if visitor.extra_scopes:
+                        visitor.update_scope_index()
+        except IntegrityError:
+            new = [self.get_or_issue(e, scope, **defaults)[0] for e in missing.values()]
+        visitors.update((v.email.lower(), v) for v in new)
+        return visitors
+
+    def get_cached(self, visitor_uuid: str | uuid.UUID) -> Visitor:
+        """
+        Return Visitor by uuid, from the cache if possible.
+
+        Raises DoesNotExist, or ValidationError if the uuid is malformed, in
+        the same way as get(). Visitors are cached for
+        VISITOR_TOKEN_CACHE_TIMEOUT seconds (default: 0, not cached), and
+        removed from the cache when saved, updated or deleted (including
+        queryset updates and deletes). NB SQL run outside the ORM, or a
+        cache that is not shared between processes, is not cleared, so a
+        revoked pass can be used until its cache entry expires.
+
+        """
+        value = Visitor._meta.get_field("uuid").to_python(visitor_uuid)
+        if not VISITOR_TOKEN_CACHE_TIMEOUT:
+            return self.get(uuid=value)
+        key = token_cache_key(value)
+        visitor = cache.get(key)
+        profiling.record_cache(hit=visitor is not None)
+        if visitor is None:
+            visitor = self.get(uuid=value)
+            cache.set(key, visitor, VISITOR_TOKEN_CACHE_TIMEOUT)
+        return visitor
 
-class VisitorManager(models.Manager):
     def create_temp_visitor(
         self,
         scope: str,
         redirect_to: str,
-        session_expiry: int | None = VISITOR_SESSION_EXPIRY,
+        session_expiry: int | None = None,
     ) -> Visitor:
-        """Create empty Visitor object for self-service."""
+        """
+        Create empty Visitor object for self-service.
+
+        If session_expiry is None the scope policy (or VISITOR_SESSION_EXPIRY)
+        is used.
+
+        """
+        kwargs = {} if session_expiry is None else {"session_expiry": session_expiry}
         return self.create(
             email=Visitor.DEFAULT_SELF_SERVICE_EMAIL,
             scope=scope,
             is_active=False,
             context={"self-service": True, "redirect_to": redirect_to},
-            session_expiry=session_expiry,
+            **kwargs,
         )
 
 
@@ -45,11 +330,18 @@ class Visitor(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     first_name = models.CharField(max_length=150, blank=True)
     last_name = models.CharField(max_length=150, blank=True)
-    email = models.EmailField(db_index=True)
+    email = models.EmailField()
     scope = models.CharField(
-        max_length=100, help_text=_lazy("Used to map request to view function")
+        max_length=100,
+        db_index=True,
+        help_text=_lazy("Used to map request to view function"),
+    )
+    extra_scopes = models.JSONField(
+        default=list,
+        blank=True,
+        help_text=_lazy("Additional scopes the visitor pass can be used for."),
     )
-    created_at = models.DateTimeField(default=tz_now)
+    created_at = models.DateTimeField(default=tz_now, db_index=True)
     context = models.JSONField(
         null=True,
         blank=True,
@@ -61,7 +353,7 @@ class Visitor(models.Model):
         null=True,
         help_text=_lazy(
             "After this time the link can no longer be used - "
-            "defaults to VISITOR_TOKEN_EXPIRY."
+            "defaults to the scope token expiry (or VISITOR_TOKEN_EXPIRY)."
         ),
     )
     is_active = models.BooleanField(
@@ -74,12 +366,43 @@ class Visitor(models.Model):
         default=VISITOR_SESSION_EXPIRY,
         help_text=_lazy("Time in seconds after which visitor session should expire."),
     )
+    fingerprints = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text=_lazy(
+            "Fingerprints of the distinct sessions, IPs and user-agents seen."
+        ),
+    )
+    shared_suspected = models.BooleanField(
+        default=False,
+        db_index=True,
+        help_text=_lazy("Set when the pass appears to have been shared."),
+    )
 
     objects = VisitorManager()
 
     class Meta:
         verbose_name = "Visitor pass"
         verbose_name_plural = "Visitor passes"
+        constraints = [
+            # at most one active pass per person (email) and scope - see
+            # VisitorManager.get_or_issue
+            models.UniqueConstraint(
+                Lower("email"),
+                "scope",
+                condition=Q(is_active=True),
+                name="unique_active_visitor_email_scope",
+            )
+        ]
+        indexes = [
+            # case-insensitive email lookups, and history (see for_email)
+            models.Index(
+                Lower("email"),
+                F("created_at"),
+                F("id"),
+                name="visitor_email_history_idx",
+            )
+        ]
 
     def __str__(self) -> str:
         return f"Visitor pass {self.id} (scope='{self.scope}')"
@@ -93,7 +416,67 @@ class Visitor(models.Model):
     def __init__(self, *args: Any, **kwargs: Any):
         super().__init__(*args, **kwargs)
         if not self.expires_at:
-            self.expires_at = self.created_at + self.DEFAULT_TOKEN_EXPIRY
+            self.expires_at = self.created_at + self.token_expiry
+        # new objects (not loaded from the db) use the scope policy defaults
+        if not args and "session_expiry" not in kwargs:
+            self.session_expiry = self.scope_config.session_expiry
+        # used to determine whether the VisitorScope index needs updating
+        self._saved_extra_scopes: list[str] | None = []
+
+    @classmethod
+    def from_db(cls, db: str | None, field_names: Any, values: Any) -> Visitor:
+        instance = super().from_db(db, field_names, values)
+        # copy, so that in-place changes to the list are detected
+        extra_scopes = instance._extra_scopes
+        instance._saved_extra_scopes = None if extra_scopes is None else [*extra_scopes]
+        return instance
+
+    @property
+    def _extra_scopes(self) -> list[str] | None:
+        # None if the field is deferred
+        return self.__dict__.get("extra_scopes")
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        update_fields = kwargs.get("update_fields")
+        if self._extra_scopes in (None, self._saved_extra_scopes) or (
+            update_fields is not None and "extra_scopes" not in update_fields
+        ):
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self.update_scope_index()
+            self._saved_extra_scopes = list(self.extra_scopes)
+        if VISITOR_TOKEN_CACHE_TIMEOUT:
+            cache.delete(token_cache_key(self.uuid))
+
+    def delete(self, *args: Any, **kwargs: Any) -> tuple[int, dict[str, int]]:
+        if VISITOR_TOKEN_CACHE_TIMEOUT:
+            cache.delete(token_cache_key(self.uuid))
+        return super().delete(*args, **kwargs)
+
+    def update_scope_index(self) -> None:
+        """Replace the VisitorScope rows for this visitor's extra scopes."""
+        VisitorScope.objects.filter(visitor=self).delete()
+        VisitorScope.objects.bulk_create(
+            VisitorScope(visitor=self, scope=scope)
+            for scope in dict.fromkeys(self.extra_scopes)
+        )
+
+    @property
+    def scope_config(self) -> ScopeConfig:
+        """Return the token, session and logging policy for the scope."""
+        return scope_registry.get(self.scope)
+
+    @property
+    def token_expiry(self) -> datetime.timedelta:
+        """Return the time for which new / reactivated tokens are valid."""
+        return datetime.timedelta(seconds=self.scope_config.token_expiry)
+
+    @property
+    def scopes(self) -> list[str]:
+        """Return all scopes - the primary scope, followed by any extras."""
+        return [self.scope, *self.extra_scopes]
 
     @property
     def full_name(self) -> str:
@@ -140,6 +523,7 @@ class Visitor(models.Model):
             "full_name": self.full_name,
             "email": self.email,
             "scope": self.scope,
+            "extra_scopes": self.extra_scopes,
             "context": self.context,
         }
 
@@ -152,40 +536,311 @@ class Visitor(models.Model):
         parts[4] = urlencode(query)
         return urlunparse(parts)
 
+    def _merge_fingerprints(self, values: dict[str, str]) -> dict | None:
+        """Return fingerprints with the new values added, or None if unchanged."""
+        fingerprints = copy.deepcopy(self.fingerprints or {})
+        updated = False
+        for kind, value in values.items():
+            threshold = VISITOR_SHARING_THRESHOLDS.get(kind)
+            if not (value and threshold):
+                continue
+            known = fingerprints.setdefault(kind, [])
+            digest = fingerprint(value)
+            if digest in known or len(known) >= threshold:
+                continue
+            known.append(digest)
+            updated = True
+        return fingerprints if updated else None
+
+    def record_fingerprints(self, **values: str) -> bool:
+        """
+        Record request fingerprints and flag the pass if it looks shared.
+
+        The kwargs are the values to record, keyed by kind ("session",
+        "ip", "user_agent") - see VISITOR_SHARING_THRESHOLDS. The list of
+        fingerprints stored for each kind is capped at its threshold, and
+        the object is only updated if a new fingerprint is seen, so logging
+        repeat visits does not cause any additional writes.
+
+        The update is conditional on the stored fingerprints being those
+        that were read, so that concurrent requests (e.g. for a shared link,
+        across several workers) do not overwrite each other. If the row has
+        changed it is re-read and the update retried, up to
+        FINGERPRINT_UPDATE_RETRIES times.
+
+        Returns True if the pass has just been flagged as shared, in which
+        case the `visitor_link_shared` signal is also sent.
+
+        """
+        for _ in range(FINGERPRINT_UPDATE_RETRIES):
+            if (fingerprints := self._merge_fingerprints(values)) is None:
+                return False
+            flagged = not self.shared_suspected and any(
+                threshold and len(fingerprints.get(kind, [])) >= threshold
+                for kind, threshold in VISITOR_SHARING_THRESHOLDS.items()
+            )
+            updated = Visitor.objects.filter(
+                pk=self.pk,
+                fingerprints=self.fingerprints or {},
+                shared_suspected=self.shared_suspected,
+            ).update(
+                fingerprints=fingerprints,
+                shared_suspected=self.shared_suspected or flagged,
+            )
+            if updated:
+                break
+            # another request has updated the fingerprints - re-read them
+            self.refresh_from_db(fields=["fingerprints", "shared_suspected"])
+        else:
+            logger.warning("Unable to record fingerprints for visitor: %s", self)
+            return False
+        self.fingerprints = fingerprints
+        self.shared_suspected = self.shared_suspected or flagged
+        if flagged:
+            visitor_link_shared.send(sender=self.__class__, visitor=self)
+        return flagged
+
     def deactivate(self) -> None:
         """Deactivate the token so it can no longer be used."""
         self.is_active = False
-        self.save()
+        self.save(update_fields=["is_active", "last_updated_at"])
 
     def reactivate(self) -> None:
-        """Reactivate the token so it can be reused."""
+        """
+        Reactivate the token so it can be reused.
+
+        Raises IntegrityError if there is already another active pass for
+        the same (case-insensitive) email and scope.
+
+        """
         self.is_active = True
-        self.expires_at = tz_now() + self.DEFAULT_TOKEN_EXPIRY
-        self.save()
+        self.expires_at = tz_now() + self.token_expiry
+        self.save(update_fields=["is_active", "expires_at", "last_updated_at"])
+
+    def activate(self, **fields: Any) -> bool:
+        """
+        Activate an inactive, unexpired pass, setting any fields passed in.
+
+        This is a single conditional UPDATE (WHERE is_active = false and not
+        expired), so that if two requests try to activate the same pass
+        (e.g. a double submit of the self-service form) only one succeeds.
+        Returns True if this call activated the pass.
+
+        """
+        values = {
+            **fields,
+            "is_active": True,
+            "expires_at": tz_now() + self.token_expiry,
+            "last_updated_at": tz_now(),
+        }
+        updated = (
+            Visitor.objects.filter(pk=self.pk, is_active=False)
+            .filter(Q(expires_at__isnull=True) | Q(expires_at__gte=Now()))
+            .update(**values)
+        )
+        if not updated:
+            return False
+        for field, value in values.items():
+            setattr(self, field, value)
+        return True
+
+
+class VisitorScope(models.Model):
+    """
+    Index of the extra scopes of each visitor pass.
+
+    This is maintained from Visitor.extra_scopes when the Visitor is saved,
+    so that finding passes by scope (Visitor.objects.with_scope) is an
+    index lookup. The request-time scope checks use Visitor.extra_scopes,
+    and do not query this table.
+
+    """
+
+    visitor = models.ForeignKey(Visitor, on_delete=CASCADE, related_name="scope_index")
+    scope = models.CharField(max_length=100, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["visitor", "scope"], name="unique_visitor_scope"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"Visitor pass {self.visitor_id} scope '{self.scope}'"
+
+
+class InternedValueManager(models.Manager):
+    # maps model label => {value hash: object id} for values known to be
+    # committed. Keyed by model as managers are shared by subclasses.
+    _caches: dict[str, dict[str, int]] = {}
+
+    @property
+    def _cache(self) -> dict[str, int]:
+        return self._caches.setdefault(self.model._meta.label, {})
+
+    def _cache_id(self, key: str, pk: int) -> None:
+        if len(self._cache) >= VISITOR_LOG_INTERN_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = pk
+
+    def clear_cache(self) -> None:
+        """Clear the in-process cache of known values."""
+        self._cache.clear()
+
+    def intern(self, value: str) -> int | None:
+        """
+        Return the id of the object that stores value, creating it if required.
+
+        Ids are cached in-process, so that in the common case (a value that
+        has been seen before) this does not touch the database. Ids are only
+        cached once the transaction that read / created them has committed,
+        so that a rollback can never leave a dangling id in the cache.
+
+        Returns None for an empty value.
+
+        """
+        if not value:
+            return None
+        key = value_hash(value)
+        if (pk := self._cache.get(key)) is not None:
+            profiling.record_cache(hit=True)
+            return pk
+        profiling.record_cache(hit=False)
+        obj, _ = self.get_or_create(hash=key, defaults={"value": value})
+        transaction.on_commit(lambda: self._cache_id(key, obj.pk))
+        return obj.pk
+
+
+class InternedValue(models.Model):
+    """Base class for deduplicated text values."""
+
+    hash = models.CharField(max_length=32, unique=True)
+    value = models.TextField()
+
+    objects = InternedValueManager()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class UserAgent(InternedValue):
+    """Distinct HTTP_USER_AGENT value stored by VisitorLog."""
+
+
+class Referer(InternedValue):
+    """Distinct HTTP_REFERER value stored by VisitorLog."""
 
 
 class VisitorLogManager(models.Manager):
-    def create_log(self, request: HttpRequest, status_code: int) -> VisitorLog:
-        """Extract values from HttpRequest and store locally."""
-        return self.create(
-            visitor=request.visitor,
-            session_key=request.session.session_key or "",
-            http_method=request.method,
-            request_uri=request.path,
-            query_string=request.META.get("QUERY_STRING", ""),
-            http_user_agent=request.META.get("HTTP_USER_AGENT", ""),
+    def build_record(self, request: HttpRequest, status_code: int) -> dict[str, Any]:
+        """Extract the values to be logged from HttpRequest."""
+        return {
+            "visitor_id": request.visitor.id,
+            "visitor_uuid": str(request.visitor.uuid),
+            "session_key": request.session.session_key or "",
+            "http_method": request.method,
+            "request_uri": request.path,
+            "query_string": request.META.get("QUERY_STRING", ""),
+            "http_user_agent": request.META.get("HTTP_USER_AGENT", ""),
             # we care about the domain more than the URL itself, so truncating
             # doesn't lose much useful information
-            http_referer=request.META.get("HTTP_REFERER", ""),
+            "http_referer": request.META.get("HTTP_REFERER", ""),
             # X-Forwarded-For is used by convention when passing through
             # load balancers etc., as the REMOTE_ADDR is rewritten in transit
-            remote_addr=(
+            "remote_addr": (
                 request.META.get("HTTP_X_FORWARDED_FOR")
                 if "HTTP_X_FORWARDED_FOR" in request.META
                 else request.META.get("REMOTE_ADDR")
             ),
-            status_code=status_code,
+            "status_code": status_code,
+            "timestamp": tz_now(),
+        }
+
+    def from_record(self, record: dict[str, Any]) -> VisitorLog:
+        """Return an unsaved VisitorLog object from a log record."""
+        fields = {k: v for k, v in record.items() if k != "visitor_uuid"}
+        if VISITOR_LOG_INTERN_HEADERS:
+            fields["interned_user_agent_id"] = UserAgent.objects.intern(
+                fields.pop("http_user_agent")
+            )
+            fields["interned_referer_id"] = Referer.objects.intern(
+                fields.pop("http_referer")
+            )
+        return self.model(**fields)
+
+    def iter_intern_headers(self, batch_size: int = INTERN_BATCH_SIZE) -> Iterator[int]:
+        """
+        Move existing user-agent / referer text into the lookup tables.
+
+        Converts logs stored before VISITOR_LOG_INTERN_HEADERS was enabled,
+        in primary key batches (each in its own transaction). Converted logs
+        have blank header text, and are skipped, so this can be interrupted
+        and re-run.
+
+        Yields the number of logs converted in each batch.
+
+        """
+        qs = (
+            self.exclude(http_user_agent="", http_referer="")
+            .order_by("pk")
+            .only(
+                "pk",
+                "http_user_agent",
+                "interned_user_agent",
+                "http_referer",
+                "interned_referer",
+            )
         )
+        last_pk = 0
+        while batch := list(qs.filter(pk__gt=last_pk)[:batch_size]):
+            with transaction.atomic():
+                for log in batch:
+                    if log.http_user_agent:
+                        log.interned_user_agent_id = UserAgent.objects.intern(
+                            log.http_user_agent
+                        )
+                    if log.http_referer:
+                        log.interned_referer_id = Referer.objects.intern(
+                            log.http_referer
+                        )
+                    log.http_user_agent = ""
+                    log.http_referer = ""
+                self.bulk_update(
+                    batch,
+                    [
+                        "interned_user_agent",
+                        "interned_referer",
+                        "http_user_agent",
+                        "http_referer",
+                    ],
+                )
+            last_pk = batch[-1].pk
+            yield len(batch)
+
+    def create_log(self, request: HttpRequest, status_code: int) -> VisitorLog | None:
+        """
+        Extract values from HttpRequest and write to the log backend.
+
+        Returns the VisitorLog object if the backend stores logs in the
+        database (the default), else None. See VISITOR_LOG_BACKEND.
+
+        """
+        from .backends import get_log_backend
+
+        record = self.build_record(request, status_code)
+        with metrics.LOG_WRITE_SECONDS.time():
+            log = get_log_backend().write_one(record)
+        metrics.LOG_WRITES.inc()
+        request.visitor.record_fingerprints(
+            session=record["session_key"],
+            ip=record["remote_addr"] or "",
+            user_agent=record["http_user_agent"],
+        )
+        return log
 
 
 class VisitorLog(models.Model):
@@ -197,9 +852,229 @@ class VisitorLog(models.Model):
     request_uri = models.URLField()
     remote_addr = models.CharField(max_length=100)
     query_string = models.TextField(blank=True)
-    http_user_agent = models.TextField()
-    http_referer = models.TextField()
+    http_user_agent = models.TextField(blank=True)
+    http_referer = models.TextField(blank=True)
+    interned_user_agent = models.ForeignKey(
+        UserAgent, null=True, blank=True, related_name="+", on_delete=PROTECT
+    )
+    interned_referer = models.ForeignKey(
+        Referer, null=True, blank=True, related_name="+", on_delete=PROTECT
+    )
     status_code = models.PositiveIntegerField("HTTP Response", default=0)
-    timestamp = models.DateTimeField(default=tz_now)
+    timestamp = models.DateTimeField(default=tz_now, db_index=True)
 
     objects = VisitorLogManager()
+
+    @property
+    def user_agent(self) -> str:
+        """Return the user-agent, whichever way it is stored."""
+        if self.interned_user_agent_id:
+            return self.interned_user_agent.value
+        return self.http_user_agent
+
+    @property
+    def referer(self) -> str:
+        """Return the referer, whichever way it is stored."""
+        if self.interned_referer_id:
+            return self.interned_referer.value
+        return self.http_referer
+
+
+class VisitorDailyStatsQuerySet(models.QuerySet):
+    def for_period(
+        self, start: datetime.date | None = None, end: datetime.date | None = None
+    ) -> VisitorDailyStatsQuerySet:
+        """Filter stats to the inclusive date range [start, end]."""
+        qs = self
+        if start:
+            qs = qs.filter(date__gte=start)
+        if end:
+            qs = qs.filter(date__lte=end)
+        return qs
+
+    def visits_by_scope(self) -> models.QuerySet:
+        """Return total visits per scope."""
+        return (
+            self.values("scope").annotate(visits=Sum("visit_count")).order_by("scope")
+        )
+
+    def visits_by_day(self) -> models.QuerySet:
+        """Return total visits per day."""
+        return self.values("date").annotate(visits=Sum("visit_count")).order_by("date")
+
+    def status_distribution(self) -> models.QuerySet:
+        """Return total visits per HTTP status class (2 => 2xx, etc.)."""
+        return (
+            self.values("status_class")
+            .annotate(visits=Sum("visit_count"))
+            .order_by("status_class")
+        )
+
+
+class VisitorDailyStatsManager(models.Manager.from_queryset(VisitorDailyStatsQuerySet)):  # type: ignore
+    def watermark(self) -> int:
+        """Return the id of the last VisitorLog included in the stats."""
+        return self.aggregate(watermark=Max("last_log_id"))["watermark"] or 0
+
+    def rebuild_day(self, date: datetime.date) -> int:
+        """
+        Recalculate all stats for a single day from VisitorLog.
+
+        Counts are recalculated in full for the day (rather than being
+        added to) so that the distinct session / IP counts remain exact.
+        Returns the number of stats rows written.
+
+        """
+        start = make_aware(datetime.datetime.combine(date, datetime.time.min))
+        end = start + datetime.timedelta(days=1)
+        rows = (
+            VisitorLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+            .annotate(status_class=F("status_code") / 100)
+            .values("visitor__scope", "status_class")
+            .annotate(
+                visit_count=Count("id"),
+                distinct_sessions=Count(
+                    "session_key", distinct=True, filter=~Q(session_key="")
+                ),
+                distinct_ips=Count("remote_addr", distinct=True),
+                last_log_id=Max("id"),
+            )
+            .order_by()
+        )
+        stats = [
+            VisitorDailyStats(
+                date=date,
+                scope=row["visitor__scope"],
+                status_class=row["status_class"],
+                visit_count=row["visit_count"],
+                distinct_sessions=row["distinct_sessions"],
+                distinct_ips=row["distinct_ips"],
+                last_log_id=row["last_log_id"],
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            self.filter(date=date).delete()
+            self.bulk_create(stats)
+        return len(stats)
+
+    def update_from_logs(self) -> list[datetime.date]:
+        """
+        Bring the stats up to date with VisitorLog.
+
+        Only the days that have new VisitorLog rows (i.e. with an id
+        above the current watermark) are rebuilt, so the cost of each
+        run is proportional to the amount of new traffic, not the size
+        of the log table. Returns the list of days that were rebuilt.
+
+        """
+        days = sorted(
+            set(
+                VisitorLog.objects.filter(id__gt=self.watermark())
+                .annotate(date=TruncDate("timestamp"))
+                .values_list("date", flat=True)
+                .distinct()
+            )
+        )
+        for date in days:
+            self.rebuild_day(date)
+        return days
+
+
+class VisitorDailyStats(models.Model):
+    """Daily rollup of VisitorLog records, by scope and HTTP status class."""
+
+    date = models.DateField()
+    scope = models.CharField(max_length=100)
+    status_class = models.PositiveSmallIntegerField(
+        help_text=_lazy("HTTP status code class - e.g. 2 for 2xx responses.")
+    )
+    visit_count = models.PositiveIntegerField(default=0)
+    distinct_sessions = models.PositiveIntegerField(default=0)
+    distinct_ips = models.PositiveIntegerField(default=0)
+    last_log_id = models.PositiveIntegerField(
+        default=0,
+        help_text=_lazy("Id of the most recent VisitorLog included in the row."),
+    )
+
+    objects = VisitorDailyStatsManager()
+
+    class Meta:
+        verbose_name = "Daily visitor stats"
+        verbose_name_plural = "Daily visitor stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "scope", "status_class"],
+                name="unique_visitor_daily_stats",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"Visitor stats for {self.date} (scope='{self.scope}')"
+
+
+class ScopePolicy(models.Model):
+    """
+    Per-scope overrides of the token / session expiry and logging settings.
+
+    These are merged over the VISITOR_SCOPES setting by the scope registry
+    (visitors.scopes.scope_registry) - empty fields inherit the setting.
+    Saving or deleting a policy invalidates the registry in all processes
+    that share the default cache, once the transaction commits.
+
+    """
+
+    LOG_ALL = LOG_ALL
+    LOG_SAMPLED = LOG_SAMPLED
+    LOG_NONE = LOG_NONE
+    LOG_MODE_CHOICES = (
+        (LOG_ALL, "Log all visits"),
+        (LOG_SAMPLED, "Log a sample of visits"),
+        (LOG_NONE, "Do not log visits"),
+    )
+
+    scope = models.CharField(max_length=100, unique=True)
+    token_expiry = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text=_lazy("Seconds for which new tokens are valid."),
+    )
+    session_expiry = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text=_lazy("Session expiry (seconds) for new visitor passes."),
+    )
+    log_mode = models.CharField(max_length=10, blank=True, choices=LOG_MODE_CHOICES)
+    log_sample_rate = models.FloatField(
+        null=True,
+        blank=True,
+        help_text=_lazy("Fraction (0.0 - 1.0) of visits logged, if sampled."),
+    )
+    last_updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Scope policies"
+
+    def __str__(self) -> str:
+        return f"Scope policy '{self.scope}'"
+
+    # NB the registry is invalidated once the transaction commits - otherwise
+    # another process could reload the old policies under the new version.
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        super().save(*args, **kwargs)
+        transaction.on_commit(scope_registry.invalidate)
+
+    def delete(self, *args: Any, **kwargs: Any) -> tuple[int, dict[str, int]]:
+        deleted = super().delete(*args, **kwargs)
+        transaction.on_commit(scope_registry.invalidate)
+        return deleted
+
+    def overrides(self) -> dict[str, Any]:
+        """Return the fields that have been set, for the scope registry."""
+        values = {
+            "token_expiry": self.token_expiry,
+            "session_expiry": self.session_expiry,
+            "log_mode": self.log_mode,
+            "log_sample_rate": self.log_sample_rate,
+        }
+        return {k: v for k, v in values.items() if v not in (None, "")}
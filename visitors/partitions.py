@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import datetime
+import functools
+import re
+from typing import Any, Iterator
+
+from django.apps.registry import Apps
+from django.db import connection, models
+from django.db.models.query import QuerySet
+
+from .models import VisitorLog
+
+# registry used for the partition models, so that they are not picked up
+# by the project apps registry (e.g. makemigrations).
+partition_apps = Apps()
+
+PARTITION_PREFIX = f"{VisitorLog._meta.db_table}_"
+PARTITION_REGEX = re.compile(rf"^{PARTITION_PREFIX}(\d{{4}})(\d{{2}})$")
+
+
+def month_start(timestamp: datetime.datetime | datetime.date) -> datetime.date:
+    """Return the first day of the (UTC) month containing timestamp."""
+    if isinstance(timestamp, datetime.datetime) and timestamp.tzinfo:
+        timestamp = timestamp.astimezone(datetime.UTC)
+    return datetime.date(timestamp.year, timestamp.month, 1)
+
+
+def add_months(date: datetime.date, months: int) -> datetime.date:
+    """Return the first day of the month `months` after date."""
+    year, month = divmod(date.month - 1 + months, 12)
+    return datetime.date(date.year + year, month + 1, 1)
+
+
+def partition_table(timestamp: datetime.datetime | datetime.date) -> str:
+    """Return the name of the table that stores logs for timestamp."""
+    return f"{PARTITION_PREFIX}{month_start(timestamp):%Y%m}"
+
+
+def _partition_field(field: models.Field) -> models.Field:
+    # relations are stored as plain ids - partitions may outlive the rows
+    # they refer to, and are dropped wholesale, so FK constraints only get
+    # in the way.
+    if field.is_relation:
+        return models.IntegerField(null=field.null, db_index=field.name == "visitor")
+    return field.clone()
+
+
+@functools.cache
+def get_partition_model(table: str) -> type[models.Model]:
+    """Return an (unmanaged) model class for a VisitorLog partition table."""
+    attrs: dict[str, Any] = {
+        field.attname: _partition_field(field)
+        for field in VisitorLog._meta.concrete_fields
+    }
+    attrs["__module__"] = __name__
+    attrs["Meta"] = type(
+        "Meta",
+        (),
+        {
+            "app_label": VisitorLog._meta.app_label,
+            "apps": partition_apps,
+            "db_table": table,
+            "managed": False,
+        },
+    )
+    return type(f"VisitorLog_{table[len(PARTITION_PREFIX) :]}", (models.Model,), attrs)
+
+
+def existing_partitions() -> dict[datetime.date, str]:
+    """Return all partition tables in the database, keyed by month."""
+    partitions = {}
+    for table in connection.introspection.table_names():
+        if match := PARTITION_REGEX.match(table):
+            year, month = match.groups()
+            partitions[datetime.date(int(year), int(month), 1)] = table
+    return dict(sorted(partitions.items()))
+
+
+def create_partition(timestamp: datetime.datetime | datetime.date) -> str:
+    """
+    Create the partition table for timestamp (if it does not exist).
+
+    NB this uses the schema editor, which cannot be used inside a
+    transaction on SQLite.
+
+    """
+    table = partition_table(timestamp)
+    if table not in connection.introspection.table_names():
+        with connection.schema_editor() as editor:
+            editor.create_model(get_partition_model(table))
+    return table
+
+
+def drop_partitions_before(date: datetime.date) -> list[str]:
+    """Drop all partition tables for months before that of date."""
+    dropped = []
+    cutoff = month_start(date)
+    for month, table in existing_partitions().items():
+        if month >= cutoff:
+            break
+        with connection.schema_editor() as editor:
+            editor.delete_model(get_partition_model(table))
+        dropped.append(table)
+    return dropped
+
+
+def partitioned_logs(
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+) -> Iterator[QuerySet]:
+    """
+    Yield a queryset for each partition that overlaps [since, until).
+
+    Only partitions for months within the range are queried, so the cost
+    of a bounded query is independent of the total amount of data held.
+
+    """
+    for month, table in existing_partitions().items():
+        if since and month < month_start(since):
+            continue
+        if until and month > month_start(until):
+            break
+        qs = get_partition_model(table).objects.all()
+        if since:
+            qs = qs.filter(timestamp__gte=since)
+        if until:
+            qs = qs.filter(timestamp__lt=until)
+        yield qs
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import dataclasses
+import datetime
+import time
+from collections import deque
+from typing import Any, Callable, Iterator
+
+from django.db import connection
+from django.utils.timezone import now as tz_now
+
+from .settings import VISITOR_PROFILING_BUFFER_SIZE
+
+
+@dataclasses.dataclass
+class RequestProfile:
+    """Timings for the visitor layer within a single request."""
+
+    method: str
+    path: str
+    timestamp: datetime.datetime = dataclasses.field(default_factory=tz_now)
+    # total request time (seconds) - including the view
+    total_time: float = 0.0
+    # time spent in each visitor component (seconds), keyed by name
+    sections: dict[str, float] = dataclasses.field(default_factory=dict)
+    query_count: int = 0
+    query_time: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    @property
+    def visitor_time(self) -> float:
+        """Return the total time spent in the visitor layer."""
+        return sum(self.sections.values())
+
+
+# the profile for the current request - None if the request is not sampled
+current_profile: contextvars.ContextVar[RequestProfile | None] = contextvars.ContextVar(
+    "visitor_profile", default=None
+)
+
+# most recent request profiles - oldest are discarded once full
+profiles: deque[RequestProfile] = deque(maxlen=VISITOR_PROFILING_BUFFER_SIZE)
+
+
+def _query_counter(profile: RequestProfile) -> Callable:
+    def wrapper(execute: Callable, *args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return execute(*args)
+        finally:
+            profile.query_count += 1
+            profile.query_time += time.perf_counter() - start
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def _profile_section(profile: RequestProfile, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(_query_counter(profile)):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        profile.sections[name] = profile.sections.get(name, 0.0) + elapsed
+
+
+def section(name: str) -> contextlib.AbstractContextManager:
+    """
+    Time the enclosed block, and count its SQL queries, if profiling.
+
+    This is a no-op (beyond a context variable lookup) if the current
+    request is not being profiled.
+
+    """
+    if (profile := current_profile.get()) is None:
+        return contextlib.nullcontext()
+    return _profile_section(profile, name)
+
+
+def record_cache(hit: bool) -> None:
+    """Record a visitor-layer cache hit / miss against the current profile."""
+    if (profile := current_profile.get()) is None:
+        return
+    if hit:
+        profile.cache_hits += 1
+    else:
+        profile.cache_misses += 1
+
+
+# sortable columns, mapped to the attribute used to sort them
+SORT_KEYS: dict[str, Callable[[RequestProfile], Any]] = {
+    "timestamp": lambda p: p.timestamp,
+    "total": lambda p: p.total_time,
+    "visitor": lambda p: p.visitor_time,
+    "queries": lambda p: p.query_count,
+    "query_time": lambda p: p.query_time,
+}
+
+
+def slowest(order_by: str = "total") -> list[RequestProfile]:
+    """Return the buffered profiles, sorted (descending) by column."""
+    key = SORT_KEYS.get(order_by, SORT_KEYS["total"])
+    return sorted(list(profiles), key=key, reverse=True)
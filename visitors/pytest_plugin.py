@@ -0,0 +1,22 @@
+# Pytest fixtures for asserting visitor query budgets. Enable in your
+# conftest.py with `pytest_plugins = ["visitors.pytest_plugin"]`.
+from __future__ import annotations
+
+from typing import Callable
+
+import pytest
+
+from .testing import query_budget
+
+
+@pytest.fixture
+def visitor_query_budget() -> Callable:
+    """
+    Return the query_budget context manager.
+
+        def test_view(visitor_query_budget):
+            with visitor_query_budget("first_token_request"):
+                ...
+
+    """
+    return query_budget
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import statistics
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator
+from urllib.parse import parse_qs, urlencode
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .settings import VISITOR_QUERYSTRING_KEY
+
+# maximum number of replayed sessions (test clients) held at any one time
+REPLAY_MAX_SESSIONS = 1000
+
+
+@dataclass
+class ReplayResult:
+    log_id: int
+    scope: str
+    status_code: int
+    original_status_code: int
+    seconds: float
+    queries: int
+
+
+class SessionClients:
+    """
+    Map original session keys to test clients.
+
+    Replayed requests share a session in the same way the original requests
+    did. Only the most recently used REPLAY_MAX_SESSIONS clients are kept, so
+    memory use is bounded however long the replay.
+
+    """
+
+    def __init__(self, max_size: int = REPLAY_MAX_SESSIONS) -> None:
+        self.max_size = max_size
+        self.clients: OrderedDict[str, Client] = OrderedDict()
+
+    def get(self, session_key: str) -> tuple[Client, bool]:
+        """Return (client, created) for the session key."""
+        if client := self.clients.get(session_key):
+            self.clients.move_to_end(session_key)
+            return client, False
+        client = self.clients[session_key] = Client()
+        if len(self.clients) > self.max_size:
+            self.clients.popitem(last=False)
+        return client, True
+
+
+def replay_path(row: dict[str, Any], new_session: bool) -> str:
+    """
+    Return the path (and querystring) to request for a log row.
+
+    The first request replayed in a session carries the visitor token, even
+    if the original was made within an existing session, so that the
+    middleware can stash the visitor in the new session.
+
+    """
+    query = parse_qs(row["query_string"], keep_blank_values=True)
+    if new_session and row["visitor_uuid"]:
+        query.setdefault(VISITOR_QUERYSTRING_KEY, [str(row["visitor_uuid"])])
+    if not query:
+        return row["request_uri"]
+    return f"{row['request_uri']}?{urlencode(query, doseq=True)}"
+
+
+def default_host() -> str:
+    """
+    Return a host name that passes ALLOWED_HOSTS validation.
+
+    The test client sends "Host: testserver" by default, which is only
+    allowed when running under the test runner.
+
+    """
+    for host in settings.ALLOWED_HOSTS:
+        if host == "*":
+            break
+        # ".example.com" matches example.com and its subdomains
+        return host.lstrip(".")
+    # localhost is allowed if ALLOWED_HOSTS is empty and DEBUG is on
+    return "localhost"
+
+
+def replay(
+    rows: Iterable[dict[str, Any]],
+    speed: float = 0,
+    using: str = "default",
+    sleep: Callable[[float], None] = time.sleep,
+    host: str = "",
+) -> Iterator[ReplayResult]:
+    """
+    Re-issue logged requests through the Django test client.
+
+    Rows are dicts as yielded by `visitors.export.iter_logs`. If speed is 0
+    requests are replayed back-to-back; otherwise the original gaps between
+    requests are reproduced, accelerated by the speed factor (so speed=1
+    is the original pacing, and speed=10 is ten times faster). Requests are
+    sent with the given Host header (default: see `default_host`).
+
+    """
+    host = host or default_host()
+    clients = SessionClients()
+    first_timestamp = None
+    start = time.monotonic()
+    for row in rows:
+        if speed:
+            first_timestamp = first_timestamp or row["timestamp"]
+            due = (row["timestamp"] - first_timestamp).total_seconds() / speed
+            if (delay := due - (time.monotonic() - start)) > 0:
+                sleep(delay)
+        client, created = clients.get(row["session_key"])
+        path = replay_path(row, created)
+        with CaptureQueriesContext(connections[using]) as context:
+            t0 = time.perf_counter()
+            response = client.generic(
+                row["http_method"],
+                path,
+                HTTP_USER_AGENT=row["http_user_agent"],
+                HTTP_REFERER=row["http_referer"],
+                REMOTE_ADDR=row["remote_addr"] or "127.0.0.1",
+                HTTP_HOST=host,
+            )
+            seconds = time.perf_counter() - t0
+        yield ReplayResult(
+            log_id=row["id"],
+            scope=row["scope"] or "",
+            status_code=response.status_code,
+            original_status_code=row["status_code"],
+            seconds=seconds,
+            queries=len(context),
+        )
+
+
+def summarise(results: Iterable[ReplayResult]) -> dict[str, dict[str, float]]:
+    """Return request count, latency percentiles and mean queries per scope."""
+    timings: dict[str, list[float]] = defaultdict(list)
+    queries: dict[str, int] = defaultdict(int)
+    mismatches: dict[str, int] = defaultdict(int)
+    for result in results:
+        timings[result.scope].append(result.seconds)
+        queries[result.scope] += result.queries
+        mismatches[result.scope] += result.status_code != result.original_status_code
+    summary = {}
+    for scope, values in sorted(timings.items()):
+        # quantiles needs at least two data points
+        quantiles = statistics.quantiles(
+            values * 2 if len(values) == 1 else values, n=100
+        )
+        summary[scope] = {
+            "requests": len(values),
+            "p50_ms": round(quantiles[49] * 1000, 4),
+            "p90_ms": round(quantiles[89] * 1000, 4),
+            "p99_ms": round(quantiles[98] * 1000, 4),
+            "mean_queries": round(queries[scope] / len(values), 2),
+            "status_mismatches": mismatches[scope],
+        }
+    return summary
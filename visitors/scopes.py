@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import dataclasses
+import random
+import time
+from typing import Any
+
+from django.core.cache import cache
+
+from .settings import (
+    VISITOR_SCOPE_REGISTRY_CHECK_INTERVAL,
+    VISITOR_SCOPES,
+    VISITOR_SESSION_EXPIRY,
+    VISITOR_TOKEN_EXPIRY,
+)
+
+# cache key of the registry version, shared by all processes
+SCOPE_REGISTRY_VERSION_KEY = "visitors:scopes:version"
+
+LOG_ALL = "all"
+LOG_SAMPLED = "sampled"
+LOG_NONE = "none"
+
+
+@dataclasses.dataclass(frozen=True)
+class ScopeConfig:
+    """The token, session and logging policy for a scope."""
+
+    scope: str
+    token_expiry: int = VISITOR_TOKEN_EXPIRY
+    session_expiry: int | None = VISITOR_SESSION_EXPIRY
+    log_mode: str = LOG_ALL
+    log_sample_rate: float = 1.0
+
+    def should_log(self) -> bool:
+        """Return True if a visit in this scope should be logged."""
+        if self.log_mode == LOG_NONE:
+            return False
+        if self.log_mode == LOG_SAMPLED:
+            return random.random() < self.log_sample_rate  # noqa: S311
+        return True
+
+
+class ScopeRegistry:
+    """
+    In-process cache of per-scope policies.
+
+    Policies are defined in the VISITOR_SCOPES setting, and overridden by
+    ScopePolicy objects. They are loaded on first use, and reloaded only
+    when the registry version (stored in the default cache, and bumped by
+    invalidate()) changes. The version is checked at most once every
+    `check_interval` seconds, so looking up a scope does not normally
+    touch the database or the cache.
+
+    Scopes without a policy use the global settings.
+
+    """
+
+    def __init__(self, definitions: dict[str, dict[str, Any]], check_interval: float):
+        self.definitions = definitions
+        self.check_interval = check_interval
+        self.configs: dict[str, ScopeConfig] | None = None
+        self.version: int | None = None
+        self.checked_at = 0.0
+
+    def get(self, scope: str) -> ScopeConfig:
+        """Return the policy for a scope."""
+        configs = self.configs
+        if configs is None or time.monotonic() - self.checked_at > self.check_interval:
+            configs = self.refresh()
+        return configs.get(scope) or ScopeConfig(scope=scope)
+
+    def refresh(self) -> dict[str, ScopeConfig]:
+        """Reload the policies if the version has changed."""
+        version = cache.get(SCOPE_REGISTRY_VERSION_KEY, 0)
+        if self.configs is None or version != self.version:
+            self.configs = self.load()
+            self.version = version
+        self.checked_at = time.monotonic()
+        return self.configs
+
+    def load(self) -> dict[str, ScopeConfig]:
+        """Return policies from settings, merged with ScopePolicy objects."""
+        from .models import ScopePolicy
+
+        configs = {
+            scope: ScopeConfig(scope=scope, **options)
+            for scope, options in self.definitions.items()
+        }
+        for policy in ScopePolicy.objects.all():
+            config = configs.get(policy.scope) or ScopeConfig(scope=policy.scope)
+            configs[policy.scope] = dataclasses.replace(config, **policy.overrides())
+        return configs
+
+    def invalidate(self) -> None:
+        """Force all processes to reload the policies."""
+        try:
+            cache.incr(SCOPE_REGISTRY_VERSION_KEY)
+        except ValueError:
+            cache.set(SCOPE_REGISTRY_VERSION_KEY, 1, None)
+        self.configs = None
+
+
+scope_registry = ScopeRegistry(VISITOR_SCOPES, VISITOR_SCOPE_REGISTRY_CHECK_INTERVAL)
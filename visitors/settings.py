@@ -31,3 +31,97 @@ VISITOR_SESSION_EXPIRY: int | None = _setting("VISITOR_SESSION_EXPIRY", 0)
 # is stashed in the session the visitor will remain a visitor until the session
 # expires. This value is used by the VisitorRequestMiddleware.
 VISITOR_TOKEN_EXPIRY: int = _setting("VISITOR_TOKEN_EXPIRY", 300)
+
+# Number of seconds for which a Visitor looked up from an `Authorization:
+# Visitor <token>` header is cached (using the default Django cache), so that
+# API requests do not each require a database query. Visitors are removed from
+# the cache when saved, updated or deleted via the ORM - but if the cache is
+# not shared between processes a revoked pass can still be used elsewhere
+# until it expires. Defaults to 0 (caching disabled).
+VISITOR_TOKEN_CACHE_TIMEOUT: int = _setting("VISITOR_TOKEN_CACHE_TIMEOUT", 0)
+
+# Thresholds used to flag a visitor pass as possibly being shared. Each time a
+# visit is logged we record a short fingerprint of the session, IP address and
+# user-agent against the Visitor, and if the number of distinct values of any
+# kind reaches its threshold the pass is marked as `shared_suspected`. Set a
+# value to 0 to ignore that kind.
+VISITOR_SHARING_THRESHOLDS: dict[str, int] = _setting(
+    "VISITOR_SHARING_THRESHOLDS",
+    {"session": 3, "ip": 3, "user_agent": 3},
+)
+
+# If True, VisitorLog user-agent and referer values are stored once in separate
+# lookup tables, and each log row stores a foreign key to them instead of the
+# full text. This significantly reduces the size of the VisitorLog table, as
+# these values are long, and highly repetitive.
+VISITOR_LOG_INTERN_HEADERS: bool = _setting("VISITOR_LOG_INTERN_HEADERS", False)
+
+# Max number of interned values (per table) whose ids are cached in-process,
+# so that logging a known user-agent / referer does not require a lookup.
+VISITOR_LOG_INTERN_CACHE_SIZE: int = _setting("VISITOR_LOG_INTERN_CACHE_SIZE", 1000)
+
+# Dotted path to the class used to store VisitorLog records, and the kwargs
+# used to initialise it. The default stores logs in the database; see
+# visitors.backends for the alternatives (JSON Lines file, stdlib logging).
+VISITOR_LOG_BACKEND: str = _setting(
+    "VISITOR_LOG_BACKEND", "visitors.backends.DatabaseBackend"
+)
+VISITOR_LOG_BACKEND_OPTIONS: dict = _setting("VISITOR_LOG_BACKEND_OPTIONS", {})
+
+# Directory used by the `archive_visitors` command to store archived (expired)
+# visitor passes and their logs.
+VISITOR_ARCHIVE_PATH: str | None = _setting("VISITOR_ARCHIVE_PATH", None)
+
+# Number of seconds after which the admin dashboard stats are refreshed. Stale
+# stats are shown while they are recalculated in the background. The stats can
+# be recalculated on demand with the `refresh_visitor_dashboard` command.
+VISITOR_DASHBOARD_CACHE_TIMEOUT: int = _setting("VISITOR_DASHBOARD_CACHE_TIMEOUT", 300)
+
+# If True, the visitor middleware, decorator and logging record metrics
+# (counts and timings) that can be exposed in the Prometheus text format with
+# the `visitors.views.metrics_view` view. If False (the default) all metrics are
+# no-ops.
+VISITOR_METRICS_ENABLED: bool = _setting("VISITOR_METRICS_ENABLED", False)
+
+# If set, metric values are written to memory-mapped files (one per process) in
+# this directory, and aggregated across all processes by the metrics view. Use
+# this with multi-process servers (e.g. gunicorn), and clear out the directory
+# when the server is (re)started.
+VISITOR_METRICS_DIR: str | None = _setting("VISITOR_METRICS_DIR", None)
+
+# Fraction (0.0 - 1.0) of requests profiled by VisitorProfilingMiddleware. The
+# default (0.0) disables the middleware altogether.
+VISITOR_PROFILING_SAMPLE_RATE: float = _setting("VISITOR_PROFILING_SAMPLE_RATE", 0.0)
+
+# Number of recent request profiles kept (per process) for the admin view.
+VISITOR_PROFILING_BUFFER_SIZE: int = _setting("VISITOR_PROFILING_BUFFER_SIZE", 100)
+
+# Requests whose path starts with one of these prefixes, or matches one of these
+# regular expressions (using re.match, so anchored at the start of the path),
+# bypass the visitor middleware altogether - no querystring parsing or session
+# access - and have `request.visitor` set to None. Use this for static files,
+# health checks, APIs etc. that never serve visitors.
+VISITOR_EXCLUDED_PATHS: list[str] = _setting("VISITOR_EXCLUDED_PATHS", [])
+VISITOR_EXCLUDED_PATH_PATTERNS: list[str] = _setting(
+    "VISITOR_EXCLUDED_PATH_PATTERNS", []
+)
+
+# Number of seconds between checks that the visitor pass on an open WebSocket
+# connection is still valid (see visitors.asgi.VisitorWebSocketMiddleware). Set
+# to 0 to only check when the connection is opened.
+VISITOR_WEBSOCKET_REVALIDATE_INTERVAL: int = _setting(
+    "VISITOR_WEBSOCKET_REVALIDATE_INTERVAL", 60
+)
+
+# Per-scope policies, keyed by scope. Each can set `token_expiry` and
+# `session_expiry` (seconds) for new visitor passes, and `log_mode` ("all",
+# "sampled" or "none") and `log_sample_rate` (0.0 - 1.0) for the visits logged
+# by the `user_is_visitor` decorator. These can be overridden in the admin site
+# (ScopePolicy). Scopes without a policy use the global settings.
+VISITOR_SCOPES: dict[str, dict] = _setting("VISITOR_SCOPES", {})
+
+# Max number of seconds between checks (of the default cache) for changes to the
+# ScopePolicy objects made in other processes.
+VISITOR_SCOPE_REGISTRY_CHECK_INTERVAL: int = _setting(
+    "VISITOR_SCOPE_REGISTRY_CHECK_INTERVAL", 10
+)
@@ -4,3 +4,13 @@ from django.dispatch import Signal
 # be used to send the email with the token
 # kwargs: visitor
 self_service_visitor_created = Signal()
+
+# sent when a user requests a self-service pass for an email that already
+# has a valid pass for the scope - can be used to remind the owner of the
+# existing pass (it is never shown to the requester)
+# kwargs: visitor (the existing pass)
+self_service_visitor_exists = Signal()
+
+# sent when a visitor pass is first flagged as possibly being shared
+# kwargs: visitor
+visitor_link_shared = Signal()
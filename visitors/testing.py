@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import contextlib
+from typing import Iterator
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+# Maximum number of queries for each of the main visitor code paths. These
+# are the performance contracts enforced by the test suite - if a change
+# needs to raise one of them, that should be a deliberate decision.
+QUERY_BUDGETS: dict[str, int] = {
+    # no token, nothing in the session
+    "anonymous_request": 0,
+    # token on the querystring: the Visitor lookup
+    "first_token_request": 1,
+    # visitor uuid stashed in the session: the Visitor lookup
+    "session_request": 1,
+    # "Authorization: Visitor <token>" header: the Visitor lookup, which (if
+    # VISITOR_TOKEN_CACHE_TIMEOUT is set) is then cached, so that subsequent
+    # requests run no queries at all
+    "header_token_request": 1,
+    # decorated view: the log INSERT, plus a Visitor UPDATE if the request
+    # has a new fingerprint (see Visitor.record_fingerprints)
+    "decorated_view_logged": 2,
+    # self-service: the Visitor lookup
+    "self_service_get": 1,
+    # self-service: the Visitor lookup, and the conditional activation UPDATE
+    "self_service_post": 2,
+}
+
+
+# SQL statements that are not counted against a budget
+TRANSACTION_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextlib.contextmanager
+def query_budget(
+    budget: int | str, using: str = "default"
+) -> Iterator[CaptureQueriesContext]:
+    """
+    Fail if the enclosed block runs more queries than the budget allows.
+
+    The budget is either a number of queries, or the name of one of the
+    QUERY_BUDGETS. Savepoint statements are not counted. The error lists
+    the SQL of every query counted.
+
+    """
+    name = budget if isinstance(budget, str) else "query budget"
+    limit = QUERY_BUDGETS[budget] if isinstance(budget, str) else budget
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    # savepoints depend on the caller's transaction (e.g. the test case), so
+    # are not counted
+    captured = [
+        query
+        for query in context.captured_queries
+        if not query["sql"].startswith(TRANSACTION_STATEMENTS)
+    ]
+    if len(captured) > limit:
+        queries = "\n".join(
+            f"{i}. {query['sql']}" for i, query in enumerate(captured, start=1)
+        )
+        raise QueryBudgetExceeded(
+            f"{name}: {len(captured)} queries executed, budget is {limit}:\n{queries}"
+        )
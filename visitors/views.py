@@ -4,6 +4,7 @@ import uuid
 from typing import Any
 
 from django import forms
+from django.db import IntegrityError, transaction
 from django.http import Http404, HttpRequest, HttpResponse
 from django.http.response import HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
@@ -12,9 +13,10 @@ from django.views import View
 
 from visitors.exceptions import InvalidVisitorPass
 
+from . import metrics
 from .forms import SelfServiceForm
 from .models import Visitor
-from .signals import self_service_visitor_created
+from .signals import self_service_visitor_created, self_service_visitor_exists
 
 
 class SelfServiceBase(View):
@@ -102,6 +104,52 @@ class SelfServiceRequest(SelfServiceBase):
             raise InvalidVisitorPass("Visitor pass has expired")
         return self.visitor
 
+    def get_existing_pass(self, visitor: Visitor, email: str) -> Visitor | None:
+        """Return the active pass for the email and the visitor's scope."""
+        return (
+            Visitor.objects.for_email(email)
+            .filter(scope=visitor.scope, is_active=True)
+            .first()
+        )
+
+    def activate_visitor(self, visitor: Visitor, **fields: Any) -> bool:
+        """
+        Activate the pass, returning True if this request activated it.
+
+        If the email already has a valid pass for the scope this pass is not
+        activated, and `self_service_visitor_exists` is sent so that the
+        owner of the existing pass can be notified - the existing pass is
+        never revealed to the requester. An expired pass is replaced.
+
+        """
+
+        def activate() -> bool:
+            with transaction.atomic():
+                if not visitor.activate(**fields):
+                    # another request (e.g. a double submit) got there first
+                    raise InvalidVisitorPass(
+                        "Visitor pass has already been activated, or has expired"
+                    )
+            return True
+
+        try:
+            return activate()
+        except IntegrityError:
+            # the email already has an active pass for this scope
+            existing = self.get_existing_pass(visitor, fields["email"])
+        if not (existing and existing.is_valid):
+            try:
+                with transaction.atomic():
+                    if existing:
+                        existing.deactivate()
+                    return activate()
+            except IntegrityError:
+                # another request issued a new pass first
+                existing = self.get_existing_pass(visitor, fields["email"])
+        if existing:
+            self_service_visitor_exists.send(sender=self.__class__, visitor=existing)
+        return False
+
     def get(self, request: HttpRequest, visitor_uuid: uuid.UUID) -> HttpResponse:
         """Render the initial form."""
         _ = self.validate_visitor()
@@ -118,18 +166,28 @@ class SelfServiceRequest(SelfServiceBase):
         details from the form. Once that is done the visitor pass is
         active and can be sent to the user. This view fires the
         `self_service_visitor_created` signal - you should use this to
-        send out the notification.
+        send out the notification. The pass is activated with a single
+        conditional UPDATE, so the signal is only sent once, even if the
+        form is submitted twice concurrently.
+
+        If the email already has a valid pass for the scope, the requester
+        is redirected to the same success page, but the pass is not
+        activated - see `activate_visitor`.
 
         """
         visitor = self.validate_visitor()
         form = self.get_form_class()(request.POST)
         if form.is_valid():
-            visitor.first_name = form.cleaned_data["first_name"]
-            visitor.last_name = form.cleaned_data["last_name"]
-            visitor.email = form.cleaned_data["email"]
-            visitor.reactivate()
-            # hook into this to send the email notification to the user.
-            self_service_visitor_created.send(sender=self.__class__, visitor=visitor)
+            fields = {
+                "first_name": form.cleaned_data["first_name"],
+                "last_name": form.cleaned_data["last_name"],
+                "email": form.cleaned_data["email"],
+            }
+            if self.activate_visitor(visitor, **fields):
+                # hook into this to send the email notification to the user.
+                self_service_visitor_created.send(
+                    sender=self.__class__, visitor=visitor
+                )
             return HttpResponseRedirect(self.get_redirect_url())
         template = self.get_template_name()
         context = self.get_context_data(form=form)
@@ -147,3 +205,12 @@ class SelfServiceSuccess(SelfServiceBase):
             template_name=self.get_template_name(),
             context=self.get_context_data(),
         )
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """Return visitor metrics in the Prometheus text format."""
+    if not metrics.registry.enabled:
+        raise Http404("Visitor metrics are disabled.")
+    return HttpResponse(
+        metrics.registry.render(), content_type="text/plain; version=0.0.4"
+    )